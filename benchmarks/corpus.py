@@ -0,0 +1,50 @@
+"""Детерминированный генератор синтетических заметок для нагрузочных
+тестов: при одинаковых параметрах и seed выдаётся одна и та же
+последовательность заметок.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, NamedTuple
+
+from domain.entities import Note
+
+WORDS = (
+    "заметка", "список", "покупки", "идея", "встреча", "проект", "отчёт",
+    "план", "задача", "книга", "ссылка", "рецепт", "звонок", "письмо",
+    "python", "данные", "индекс", "журнал", "время", "неделя", "утро",
+    "вечер", "молоко", "хлеб", "сыр", "кофе", "чай", "поездка", "отпуск",
+    "ремонт", "машина", "врач", "спорт", "музыка", "кино", "подарок",
+)
+
+
+class CorpusSpec(NamedTuple):
+    """Параметры корпуса. Длины заголовков (в словах) и текста
+    (в строках и словах на строку) распределены равномерно
+    в заданных пределах, время создания - равномерно на интервале
+    spread_days от start, время изменения отстоит от создания
+    не более чем на max_edit_delay_days."""
+    title_words: tuple[int, int] = (1, 6)
+    body_lines: tuple[int, int] = (1, 20)
+    line_words: tuple[int, int] = (3, 12)
+    start: datetime = datetime(2020, 1, 1)
+    spread_days: int = 3 * 365
+    max_edit_delay_days: int = 30
+
+
+def generate_notes(count: int, seed: int = 0,
+                   spec: CorpusSpec = CorpusSpec()) -> Iterator[Note]:
+    rnd = random.Random(seed)
+    spread_s = spec.spread_days * 24 * 3600
+    edit_delay_s = spec.max_edit_delay_days * 24 * 3600
+
+    def words(bounds: tuple[int, int]) -> str:
+        return ' '.join(rnd.choices(WORDS, k=rnd.randint(*bounds)))
+
+    for _ in range(count):
+        creation_date = spec.start + timedelta(seconds=rnd.randrange(spread_s),
+                                               microseconds=rnd.randrange(1_000_000))
+        last_change_date = creation_date + timedelta(seconds=rnd.randrange(edit_delay_s + 1))
+        title = words(spec.title_words).capitalize()
+        body = '\n'.join(words(spec.line_words)
+                         for _ in range(rnd.randint(*spec.body_lines)))
+        yield Note(None, creation_date, last_change_date, title, body)
@@ -0,0 +1,250 @@
+"""Нагрузочный тест HTTP-сервиса (client.http_server): число запросов
+в секунду и задержки при нескольких одновременных соединениях keep-alive.
+
+Запуск из корня проекта:
+    python -m benchmarks.http_load [--url http://127.0.0.1:8080]
+        [--size 10000] [--engine files] [--connections 8] [--duration 10]
+        [--mix get=6,get-304=2,list=1,title=1] [--output http-load.json]
+
+Без --url сервер запускается в отдельном процессе на временной
+директории, заполненной синтетическим корпусом (см. benchmarks.corpus)
+из --size заметок. Каждое соединение - отдельный поток, выполняющий
+запросы подряд; вид очередного запроса выбирается случайно с весами
+из --mix:
+* get - заметка по случайному id;
+* get-304 - повторный запрос заметки с If-None-Match (ожидается 304);
+* list - первая страница заметок, упорядоченных по времени изменения;
+* title - первая страница поиска по заголовку;
+* dates - первая страница выборки по диапазону дат;
+* add - добавление заметки.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.corpus import generate_notes
+from benchmarks.suite import POPULATE_BATCH_SIZE, summarize
+from domain.repository import STORAGE_ENGINES, NotesRepository
+
+DEFAULT_SIZE = 10000
+DEFAULT_CONNECTIONS = 8
+DEFAULT_DURATION_S = 10.0
+DEFAULT_MIX = "get=6,get-304=2,list=1,title=1"
+
+
+class Target(NamedTuple):
+    host: str
+    port: int
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    headers: dict[str, str]
+    body: Optional[bytes] = None
+
+
+class Worker:
+    """Одно соединение keep-alive, выполняющее запросы до истечения deadline."""
+
+    def __init__(self, target: Target, ids: list[int], mix: list[tuple[str, int]],
+                 deadline: float, seed: int) -> None:
+        self.__target = target
+        self.__ids = ids
+        self.__kinds = [kind for kind, _ in mix]
+        self.__weights = [weight for _, weight in mix]
+        self.__deadline = deadline
+        self.__rnd = random.Random(seed)
+        self.__etags: dict[int, str] = {}
+        self.latencies: dict[str, list[float]] = {kind: [] for kind in self.__kinds}
+        self.statuses: dict[int, int] = {}
+        self.errors = 0
+
+    def __make_request(self, kind: str) -> Request:
+        if kind == 'get':
+            return Request('GET', f"/notes/{self.__rnd.choice(self.__ids)}", {})
+        if kind == 'get-304':
+            if self.__etags:
+                note_id, etag = self.__rnd.choice(list(self.__etags.items()))
+                return Request('GET', f"/notes/{note_id}", {'If-None-Match': etag})
+            return Request('GET', f"/notes/{self.__rnd.choice(self.__ids)}", {})
+        if kind == 'list':
+            return Request('GET', "/notes?sort=last_change_date&reverse=1&limit=20", {})
+        if kind == 'title':
+            return Request('GET', "/notes/by-title?q=%D0%BF%D0%BE%D0%BA%D1%83%D0%BF&limit=20", {})
+        if kind == 'dates':
+            return Request('GET', "/notes/by-date?from=2021-01-01&to=2021-01-31&limit=20", {})
+        if kind == 'add':
+            body = json.dumps({'title': "Нагрузка", 'body': "текст"}).encode()
+            return Request('POST', "/notes", {'Content-Type': 'application/json'}, body)
+        raise ValueError(kind)
+
+    def run(self):
+        connection = http.client.HTTPConnection(*self.__target)
+        try:
+            while time.perf_counter() < self.__deadline:
+                kind = self.__rnd.choices(self.__kinds, self.__weights)[0]
+                request = self.__make_request(kind)
+                started = time.perf_counter()
+                try:
+                    connection.request(request.method, request.path, request.body,
+                                       request.headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    self.errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection(*self.__target)
+                    continue
+                self.latencies[kind].append(time.perf_counter() - started)
+                self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+                etag = response.getheader('ETag')
+                if kind.startswith('get') and etag and response.status == 200:
+                    self.__etags[int(request.path.rsplit('/', 1)[1])] = etag
+        finally:
+            connection.close()
+
+
+def parse_mix(raw: str) -> list[tuple[str, int]]:
+    mix = []
+    for item in raw.split(','):
+        kind, _, weight = item.partition('=')
+        mix.append((kind.strip(), int(weight or 1)))
+    return mix
+
+
+def fetch_ids(target: Target) -> list[int]:
+    """id заметок сервера (постранично, без текста)."""
+    connection = http.client.HTTPConnection(*target)
+    ids: list[int] = []
+    path: Optional[str] = "/notes?limit=1000&body=0"
+    try:
+        while path is not None:
+            connection.request('GET', path)
+            page = json.loads(connection.getresponse().read())
+            ids.extend(item['id'] for item in page['items'])
+            path = page['next']
+    finally:
+        connection.close()
+    return ids
+
+
+def run_load(target: Target, mix: list[tuple[str, int]], connections: int,
+             duration_s: float, seed: int) -> dict:
+    ids = fetch_ids(target)
+    if not ids:
+        raise SystemExit("На сервере нет заметок")
+    deadline = time.perf_counter() + duration_s
+    workers = [Worker(target, ids, mix, deadline, seed + i) for i in range(connections)]
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    statuses: dict[int, int] = {}
+    by_kind: dict[str, list[float]] = {}
+    for worker in workers:
+        for status, count in worker.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+        for kind, latencies in worker.latencies.items():
+            by_kind.setdefault(kind, []).extend(latencies)
+    total = sum(statuses.values())
+    return {
+        'requests': total,
+        'errors': sum(worker.errors for worker in workers),
+        'duration_s': elapsed,
+        'requests_per_s': total / elapsed,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'latency': {kind: summarize(latencies)
+                    for kind, latencies in by_kind.items() if latencies},
+    }
+
+
+# local server
+
+def populate(path: str, engine: str, size: int, seed: int):
+    repo = NotesRepository(path, engine)
+    notes = generate_notes(size, seed)
+    while batch := [note for _, note in zip(range(POPULATE_BATCH_SIZE), notes)]:
+        repo.add_many(batch)
+    repo.close()
+
+
+def serve(path: str, engine: str, ports: multiprocessing.Queue):
+    from client.http_server import make_server
+    repo = NotesRepository(path, engine)
+    server = make_server(repo, port=0)
+    ports.put(server.server_address[1])
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        repo.close()
+
+
+def with_local_server(engine: str, size: int, seed: int,
+                      run: Callable[[Target], dict]) -> dict:
+    with tempfile.TemporaryDirectory(prefix="notes-http-") as path:
+        print(f"Заполнение хранилища {engine}: {size} заметок...", file=sys.stderr)
+        populate(path, engine, size, seed)
+        ports: multiprocessing.Queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=serve, args=(path, engine, ports), daemon=True)
+        process.start()
+        try:
+            return run(Target('127.0.0.1', ports.get(timeout=60)))
+        finally:
+            process.terminate()
+            process.join()
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.http_load",
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help="адрес запущенного сервера (по умолчанию"
+                                      " запускается локальный сервер)")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE)
+    parser.add_argument('--engine', choices=STORAGE_ENGINES.keys(), default='files')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION_S)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="файл для результатов в формате JSON")
+    args = parser.parse_args(argv)
+
+    def run(target: Target) -> dict:
+        print(f"Нагрузка на {target.host}:{target.port}: {args.connections} соединений,"
+              f" {args.duration} с...", file=sys.stderr)
+        return run_load(target, args.mix, args.connections, args.duration, args.seed)
+
+    if args.url:
+        url = urlsplit(args.url)
+        result = run(Target(url.hostname or '127.0.0.1', url.port or 80))
+    else:
+        result = with_local_server(args.engine, args.size, args.seed, run)
+
+    result['meta'] = {'url': args.url, 'engine': None if args.url else args.engine,
+                      'size': None if args.url else args.size,
+                      'connections': args.connections, 'mix': dict(args.mix)}
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    print(f"{result['requests_per_s']:.1f} запросов/с ({result['requests']} запросов,"
+          f" ошибок: {result['errors']})", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as file:
+            file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Сравнение последовательного и параллельного (пул потоков
+и пул процессов) полного просмотра файловой БД (QueryableNotes.queryAll)
+на свежем экземпляре, т.е. без построенного каталога.
+
+Запуск из корня проекта:
+    python -m benchmarks.scan_benchmark [число_заметок] [число_потоков] [задержка_мс]
+        [--drop-caches]
+
+Задержка (по умолчанию 0) добавляется к каждому открытию файла
+и имитирует сетевое хранилище или медленный диск, где просмотр
+ограничен задержкой, а не процессором.
+
+Все варианты измеряются в одинаковых условиях: перед замерами файлы
+один раз прочитываются (прогрев страничного кэша ОС), а с --drop-caches
+(при наличии прав) кэш вместо этого сбрасывается перед каждым вариантом.
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from benchmarks.suite import drop_os_caches
+from domain.entities import Note
+from domain.fsdb import ENCODING, QueryableNotes, encode_note, note_path
+
+DEFAULT_COUNT = 20000
+DEFAULT_WORKERS = 8
+
+
+def populate(path: str, count: int):
+    base = datetime(2023, 1, 1)
+    for id in range(1, count + 1):
+        dt = base + timedelta(minutes=id)
+        note = Note(None, dt, dt, f"Заметка {id}", f"Текст заметки {id}\n" * 20)
+        entry_path = note_path(pathlib.Path(path), id)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        with entry_path.open('w', encoding=ENCODING) as file:
+            json.dump(note, file, ensure_ascii=False, indent=2, default=encode_note)
+
+
+def measure(path: str, workers: int, ordered: bool = True, processes: int = 0) -> float:
+    notes_table = QueryableNotes(path)
+    started = time.perf_counter()
+    count = sum(1 for _ in notes_table.queryAll(workers=workers, ordered=ordered,
+                                                processes=processes))
+    elapsed = time.perf_counter() - started
+    assert count > 0
+    return elapsed
+
+
+def emulate_latency(latency_s: float):
+    path_open = pathlib.Path.open
+
+    def slow_open(self, *args, **kwargs):
+        time.sleep(latency_s)
+        return path_open(self, *args, **kwargs)
+
+    pathlib.Path.open = slow_open
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scan_benchmark",
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('count', type=int, nargs='?', default=DEFAULT_COUNT,
+                        help="число заметок")
+    parser.add_argument('workers', type=int, nargs='?', default=DEFAULT_WORKERS,
+                        help="число потоков")
+    parser.add_argument('latency_ms', type=float, nargs='?', default=0,
+                        help="задержка открытия файла, мс")
+    parser.add_argument('--drop-caches', action='store_true',
+                        help="сбрасывать страничный кэш ОС перед каждым вариантом")
+    args = parser.parse_args(argv)
+    if args.count < 1 or args.workers < 1 or args.latency_ms < 0:
+        parser.error("число заметок и потоков должно быть положительным,"
+                     " задержка - неотрицательной")
+
+    drop_caches = args.drop_caches and drop_os_caches()
+    if args.drop_caches and not drop_caches:
+        print("Сброс страничного кэша недоступен (нужны права root),"
+              " варианты измеряются после прогрева.", file=sys.stderr)
+
+    count, workers, latency_ms = args.count, args.workers, args.latency_ms
+    with tempfile.TemporaryDirectory() as path:
+        populate(path, count)
+        processes = os.cpu_count() or 1
+
+        def prepare():
+            if drop_caches:
+                drop_os_caches()
+
+        if not drop_caches:
+            # прогрев: все варианты читают файлы из страничного кэша
+            measure(path, 0)
+        prepare()
+        process_pool = measure(path, 0, processes=processes)
+        if latency_ms:
+            emulate_latency(latency_ms / 1000)
+        prepare()
+        serial = measure(path, 0)
+        prepare()
+        parallel_ordered = measure(path, workers, ordered=True)
+        prepare()
+        parallel_unordered = measure(path, workers, ordered=False)
+
+    cache = "cold (caches dropped)" if drop_caches else "warm"
+    print(f"notes: {count}, workers: {workers}, latency: {latency_ms} ms, page cache: {cache}")
+    print(f"serial:               {serial:.3f} s")
+    print(f"parallel (ordered):   {parallel_ordered:.3f} s"
+          f"  x{serial / parallel_ordered:.2f}")
+    print(f"parallel (unordered): {parallel_unordered:.3f} s"
+          f"  x{serial / parallel_unordered:.2f}")
+    print(f"process pool ({processes} processes, no latency): {process_pool:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
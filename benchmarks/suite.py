@@ -0,0 +1,281 @@
+"""Нагрузочные тесты хранилищ и запросов NotesRepository
+на синтетическом корпусе (см. benchmarks.corpus).
+
+Запуск из корня проекта:
+    python -m benchmarks.suite [--sizes 1000 10000 100000]
+        [--engines files log sqlite] [--repeat 5] [--seed 0]
+        [--output benchmark-results.json] [--drop-caches]
+
+Для каждого механизма хранения и размера корпуса каждая операция
+измеряется в двух режимах:
+* cold - на только что созданном экземпляре NotesRepository (каталог,
+  индексы и кэши ещё не построены; с --drop-caches, при наличии прав,
+  сбрасывается и страничный кэш ОС);
+* warm - на том же экземпляре после предварительного выполнения.
+Результаты (время каждого запуска и сводная статистика) записываются
+в JSON, пригодный для сравнения прогонов между собой.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as daytime, timedelta
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from benchmarks.corpus import CorpusSpec, generate_notes
+from domain.repository import STORAGE_ENGINES, AttributeKind, NotesRepository
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+DEFAULT_OUTPUT = "benchmark-results.json"
+POPULATE_BATCH_SIZE = 1000
+# число одиночных вызовов в операциях по id (get, add, delete)
+SAMPLE_SIZE = 100
+QUERY_PAGE_SIZE = 20
+DROP_CACHES_PATH = "/proc/sys/vm/drop_caches"
+
+
+class Context(NamedTuple):
+    """Параметры запросов, общие для всех прогонов одного корпуса."""
+    ids: list[int]
+    date_from: date
+    date_to: date
+    title_sample: str
+    body_query: str
+
+
+class Operation(NamedTuple):
+    name: str
+    # выполняет операцию и возвращает число обработанных заметок
+    run: Callable[[NotesRepository, Context], int]
+
+
+def consume(notes: Iterable) -> int:
+    return sum(1 for _ in notes)
+
+
+def consume_bodies(notes: Iterable) -> int:
+    return sum(1 for note in notes if note.body is not None)
+
+
+READ_OPERATIONS = (
+    Operation("get_note_by_id",
+              lambda repo, ctx: sum(repo.get_note_by_id(id) is not None for id in ctx.ids)),
+    Operation("get_all_notes",
+              lambda repo, ctx: consume(repo.get_all_notes())),
+    Operation("get_all_notes+body",
+              lambda repo, ctx: consume_bodies(repo.get_all_notes())),
+    Operation("query(first page)",
+              lambda repo, ctx: consume(repo.query('last_change_date', True, QUERY_PAGE_SIZE))),
+    Operation("query(title, first page)",
+              lambda repo, ctx: consume(repo.query('title', False, QUERY_PAGE_SIZE))),
+    Operation("get_notes_by_title",
+              lambda repo, ctx: consume(repo.get_notes_by_title(ctx.title_sample))),
+    Operation("get_notes_by_date_range",
+              lambda repo, ctx: consume(repo.get_notes_by_date_range(
+                  ctx.date_from, ctx.date_to, AttributeKind.CREATION))),
+    Operation("get_notes_by_date_range(change)",
+              lambda repo, ctx: consume(repo.get_notes_by_date_range(
+                  ctx.date_from, ctx.date_to, AttributeKind.LAST_CHANGE))),
+    Operation("get_notes_by_daytime_range",
+              lambda repo, ctx: consume(repo.get_notes_by_daytime_range(
+                  daytime(22), daytime(2), AttributeKind.CREATION))),
+    Operation("search_body",
+              lambda repo, ctx: consume(repo.search_body(ctx.body_query))),
+)
+
+
+def summarize(timings: list[float]) -> dict:
+    ordered = sorted(timings)
+    return {
+        'runs': len(ordered),
+        'total_s': sum(ordered),
+        'mean_s': statistics.fmean(ordered),
+        'min_s': ordered[0],
+        'p50_s': ordered[len(ordered) // 2],
+        'p95_s': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max_s': ordered[-1],
+    }
+
+
+def timed(fn: Callable[[], int]) -> tuple[float, int]:
+    started = time.perf_counter()
+    count = fn()
+    return time.perf_counter() - started, count
+
+
+def drop_os_caches() -> bool:
+    """Сбрасывает страничный кэш ОС (нужны права root). Возвращает
+    False, если это невозможно."""
+    try:
+        os.sync()
+        with open(DROP_CACHES_PATH, 'w') as file:
+            file.write('3\n')
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class Suite:
+
+    def __init__(self, repeat: int, seed: int, drop_caches: bool,
+                 spec: CorpusSpec = CorpusSpec()) -> None:
+        self.__repeat = repeat
+        self.__seed = seed
+        self.__drop_caches = drop_caches
+        self.__spec = spec
+        self.results: list[dict] = []
+
+    def __record(self, engine: str, size: int, operation: str, cache: str,
+                 timings: list[float], count: int):
+        self.results.append({
+            'engine': engine, 'size': size, 'operation': operation,
+            'cache': cache, 'notes': count, 'timings_s': timings,
+            **summarize(timings),
+        })
+        stats = self.results[-1]
+        print(f"{engine:7} {size:>7} {cache:4} {operation:34}"
+              f" mean {stats['mean_s'] * 1000:10.3f} ms  p95 {stats['p95_s'] * 1000:10.3f} ms"
+              f"  ({count} notes)", file=sys.stderr)
+
+    def __cold_repo(self, path: str, engine: str) -> NotesRepository:
+        if self.__drop_caches:
+            drop_os_caches()
+        return NotesRepository(path, engine)
+
+    def run(self, engine: str, size: int):
+        with tempfile.TemporaryDirectory(prefix="notes-bench-") as path:
+            ctx = self.__populate(path, engine, size)
+            for operation in READ_OPERATIONS:
+                self.__measure(path, engine, size, operation, ctx)
+            self.__measure_writes(path, engine, size)
+
+    def __populate(self, path: str, engine: str, size: int) -> Context:
+        repo = NotesRepository(path, engine)
+        notes = generate_notes(size, self.__seed, self.__spec)
+        timings = []
+        ids: list[int] = []
+        while batch := [note for _, note in zip(range(POPULATE_BATCH_SIZE), notes)]:
+            elapsed, _ = timed(lambda: len(repo.add_many(batch)))
+            timings.append(elapsed)
+            ids.extend(note.id for note in batch if note.id is not None)
+        self.__record(engine, size, "add_many(populate)", "cold", timings, size)
+        repo.close()
+
+        rnd = random.Random(self.__seed)
+        start = self.__spec.start.date()
+        date_from = start + timedelta(days=rnd.randrange(self.__spec.spread_days - 30))
+        return Context(ids=rnd.sample(ids, min(SAMPLE_SIZE, len(ids))),
+                       date_from=date_from,
+                       date_to=date_from + timedelta(days=30),
+                       title_sample="покуп",
+                       body_query="кофе утро")
+
+    def __measure(self, path: str, engine: str, size: int,
+                  operation: Operation, ctx: Context):
+        cold_timings = []
+        count = 0
+        for _ in range(self.__repeat):
+            repo = self.__cold_repo(path, engine)
+            elapsed, count = timed(lambda: operation.run(repo, ctx))
+            cold_timings.append(elapsed)
+            repo.close()
+        self.__record(engine, size, operation.name, "cold", cold_timings, count)
+
+        repo = NotesRepository(path, engine)
+        operation.run(repo, ctx)
+        warm_timings = []
+        for _ in range(self.__repeat):
+            elapsed, count = timed(lambda: operation.run(repo, ctx))
+            warm_timings.append(elapsed)
+        repo.close()
+        self.__record(engine, size, operation.name, "warm", warm_timings, count)
+
+    def __measure_writes(self, path: str, engine: str, size: int):
+        """add_note и delete_note: добавленные заметки затем удаляются,
+        поэтому размер корпуса не меняется. В режиме warm индексы
+        репозитория уже построены и обновляются при каждом вызове."""
+        for cache in ("cold", "warm"):
+            repo = self.__cold_repo(path, engine)
+            if cache == "warm":
+                consume(repo.get_notes_by_title("warm-up"))
+            notes = list(generate_notes(SAMPLE_SIZE, self.__seed + 1, self.__spec))
+            add_timings = []
+            for note in notes:
+                elapsed, _ = timed(lambda: int(repo.add_note(note) is not None))
+                add_timings.append(elapsed)
+            self.__record(engine, size, "add_note", cache, add_timings, len(notes))
+
+            if cache == "cold":
+                repo.close()
+                repo = self.__cold_repo(path, engine)
+            delete_timings = []
+            for note in notes:
+                assert note.id is not None
+                elapsed, _ = timed(lambda: int(repo.delete_note(note.id)))
+                delete_timings.append(elapsed)
+            self.__record(engine, size, "delete_note", cache, delete_timings, len(notes))
+            repo.close()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--engines', nargs='+', choices=STORAGE_ENGINES.keys(),
+                        default=list(STORAGE_ENGINES.keys()))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--drop-caches', action='store_true',
+                        help="сбрасывать страничный кэш ОС перед холодными запусками")
+    args = parser.parse_args(argv)
+
+    drop_caches = args.drop_caches and drop_os_caches()
+    if args.drop_caches and not drop_caches:
+        print("Сброс страничного кэша недоступен (нужны права root),"
+              " холодные запуски измеряются без него.", file=sys.stderr)
+
+    suite = Suite(args.repeat, args.seed, drop_caches)
+    started = datetime.now()
+    for size in args.sizes:
+        for engine in args.engines:
+            suite.run(engine, size)
+
+    report = {
+        'meta': {
+            'started': started.isoformat(timespec='seconds'),
+            'duration_s': (datetime.now() - started).total_seconds(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'os_caches_dropped': drop_caches,
+            'corpus': {k: str(v) if isinstance(v, datetime) else v
+                       for k, v in CorpusSpec()._asdict().items()},
+        },
+        'results': suite.results,
+    }
+    with open(args.output, 'w', encoding='UTF-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
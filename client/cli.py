@@ -0,0 +1,332 @@
+"""Неинтерактивный режим: подкоманды командной строки, которые
+обращаются к NotesRepository напрямую и выводят заметки в формате
+JSON Lines (по одной заметке в строке, по мере выборки).
+
+Модуль импортирует только то, что нужно для разбора аргументов
+и доступа к хранилищу (без меню и консольного представления),
+поэтому одиночный запрос из сценария оболочки выполняется быстро.
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+from datetime import date, datetime, time
+from typing import Iterable, Optional
+
+from domain import transfer
+from domain.entities import SORT_KEYS, Note, NoteConflictError
+from domain.fsdb import MIGRATION_BATCH_SIZE
+from domain.repository import AttributeKind, NotesRepository
+from domain.transfer import note_to_dict
+
+KINDS = {
+    'creation': AttributeKind.CREATION,
+    'change': AttributeKind.LAST_CHANGE,
+}
+# признак чтения текста заметки из стандартного ввода
+STDIN_ARG = '-'
+
+EXIT_OK = 0
+EXIT_NOT_FOUND = 1
+EXIT_FAILURE = 2
+
+
+def write_json_line(obj):
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False))
+    sys.stdout.write('\n')
+
+
+def write_notes(notes: Iterable[Note], with_body: bool = True) -> int:
+    """Выводит заметки по мере выборки; текст заметки (загружаемый
+    лениво) не читается, если with_body=False."""
+    count = 0
+    for note in notes:
+        write_json_line(note_to_dict(note, with_body))
+        count += 1
+    return count
+
+
+def read_body(arg: Optional[str]) -> Optional[str]:
+    if arg == STDIN_ARG:
+        return sys.stdin.read().rstrip('\n')
+    return arg
+
+
+# commands
+
+def cmd_add(repo: NotesRepository, args) -> int:
+    dt = datetime.now()
+    note = repo.add_note(Note(None, dt, dt, args.title, read_body(args.body) or ''))
+    if note is None:
+        return EXIT_FAILURE
+    write_json_line(note_to_dict(note))
+    return EXIT_OK
+
+
+def cmd_get(repo: NotesRepository, args) -> int:
+    exit_code = EXIT_OK
+    for note_id in args.ids:
+        note = repo.get_note_by_id(note_id)
+        if note is None:
+            print(f"Заметка {note_id} не найдена.", file=sys.stderr)
+            exit_code = EXIT_NOT_FOUND
+            continue
+        write_json_line(note_to_dict(note, not args.no_body))
+    return exit_code
+
+
+def cmd_list(repo: NotesRepository, args) -> int:
+    write_notes(repo.query(args.sort, args.reverse, args.limit, args.offset),
+                not args.no_body)
+    return EXIT_OK
+
+
+def cmd_search_title(repo: NotesRepository, args) -> int:
+    count = write_notes(repo.get_notes_by_title(args.sample), not args.no_body)
+    return EXIT_OK if count else EXIT_NOT_FOUND
+
+
+def cmd_search_dates(repo: NotesRepository, args) -> int:
+    notes = repo.get_notes_by_date_range(args.date_from, args.date_to, KINDS[args.kind])
+    count = write_notes(notes, not args.no_body)
+    return EXIT_OK if count else EXIT_NOT_FOUND
+
+
+def cmd_search_daytime(repo: NotesRepository, args) -> int:
+    notes = repo.get_notes_by_daytime_range(args.time_from, args.time_to, KINDS[args.kind])
+    count = write_notes(notes, not args.no_body)
+    return EXIT_OK if count else EXIT_NOT_FOUND
+
+
+def cmd_update(repo: NotesRepository, args) -> int:
+    note = repo.get_note_by_id(args.id)
+    if note is None:
+        print(f"Заметка {args.id} не найдена.", file=sys.stderr)
+        return EXIT_NOT_FOUND
+
+    body = read_body(args.body)
+    if args.title is None and body is None:
+        write_json_line(note_to_dict(note))
+        return EXIT_OK
+
+    read_change_date = note.last_change_date
+    if args.title is not None:
+        note.title = args.title
+    if body is not None:
+        note.body = note.body + '\n' + body if args.append else body
+    note.last_change_date = datetime.now()
+    try:
+        if not repo.update_note(note, read_change_date):
+            return EXIT_FAILURE
+    except NoteConflictError:
+        print(f"Заметка {args.id} была изменена другим процессом,"
+              " изменения не сохранены.", file=sys.stderr)
+        return EXIT_FAILURE
+    write_json_line(note_to_dict(note))
+    return EXIT_OK
+
+
+def cmd_delete(repo: NotesRepository, args) -> int:
+    exit_code = EXIT_OK
+    for note_id, is_deleted in zip(args.ids, repo.delete_many(args.ids)):
+        write_json_line({'id': note_id, 'deleted': is_deleted})
+        if not is_deleted:
+            exit_code = EXIT_NOT_FOUND
+    return exit_code
+
+
+def cmd_export(repo: NotesRepository, args) -> int:
+    format = args.format or transfer.guess_format(args.file)
+    if args.file == STDIN_ARG:
+        transfer.export_notes(repo.get_all_notes(), sys.stdout, format)
+        return EXIT_OK
+
+    with open(args.file, 'w', encoding=transfer.ENCODING, newline='') as file:
+        count = transfer.export_notes(repo.get_all_notes(), file, format)
+    write_json_line({'exported': count})
+    return EXIT_OK
+
+
+def cmd_import(repo: NotesRepository, args) -> int:
+    format = args.format or transfer.guess_format(args.file)
+    if args.file == STDIN_ARG:
+        count = transfer.import_notes(repo, transfer.read_notes(sys.stdin, format),
+                                      args.batch_size)
+        write_json_line({'imported': count})
+        return EXIT_OK
+
+    progress = None
+    try:
+        file = open(args.file, 'r', encoding=transfer.ENCODING, newline='')
+        if not args.no_resume:
+            progress = transfer.ImportProgress(pathlib.Path(args.file))
+    except OSError as e:
+        print(f"Не удалось открыть файл '{args.file}': {e.strerror}.", file=sys.stderr)
+        return EXIT_FAILURE
+    if progress is not None and progress.load():
+        print(f"Импорт продолжается с записи {progress.done + 1}.", file=sys.stderr)
+    with file:
+        count = transfer.import_notes(repo, transfer.read_notes(file, format),
+                                      args.batch_size, progress)
+    write_json_line({'imported': count})
+    return EXIT_OK
+
+
+def cmd_migrate_layout(repo: NotesRepository, args) -> int:
+    count = repo.migrate_layout(args.batch_size, args.pause)
+    write_json_line({'migrated': count})
+    return EXIT_OK
+
+
+def cmd_serve(repo: NotesRepository, args) -> int:
+    from client import http_server
+    server = http_server.make_server(repo, args.host, args.port, args.access_log)
+    print(f"Сервер запущен: {server.url} (Ctrl+C - остановить)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return EXIT_OK
+
+
+# arguments
+
+def positive_int(raw: str) -> int:
+    value = int(raw)
+    if value < NotesRepository.NOTES_MIN_ID:
+        raise argparse.ArgumentTypeError(f"требуется целое число не меньше {NotesRepository.NOTES_MIN_ID}")
+    return value
+
+
+def non_negative_int(raw: str) -> int:
+    value = int(raw)
+    if value < 0:
+        raise argparse.ArgumentTypeError("требуется неотрицательное целое число")
+    return value
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Заметки: неинтерактивный режим. Результаты выводятся"
+                    " в формате JSON Lines. Без аргументов запускается меню.")
+    commands = parser.add_subparsers(dest='command', required=True, metavar="КОМАНДА")
+
+    def add_command(name: str, handler, help: str, listing: bool = False):
+        command = commands.add_parser(name, help=help, description=help)
+        command.set_defaults(handler=handler)
+        if listing:
+            command.add_argument('--no-body', action='store_true',
+                                 help="не выводить (и не читать) текст заметок")
+        return command
+
+    def add_kind(command):
+        command.add_argument('--kind', choices=KINDS.keys(), default='creation',
+                             help="атрибут: время создания (creation, по умолчанию)"
+                                  " или последнего изменения (change)")
+
+    command = add_command('add', cmd_add, "добавить заметку")
+    command.add_argument('title', help="заголовок")
+    command.add_argument('body', nargs='?', default='',
+                         help=f"текст ('{STDIN_ARG}' - читать из стандартного ввода)")
+
+    command = add_command('get', cmd_get, "вывести заметки по идентификаторам", listing=True)
+    command.add_argument('ids', type=positive_int, nargs='+', metavar='ID')
+
+    command = add_command('list', cmd_list, "вывести заметки в заданном порядке", listing=True)
+    command.add_argument('--sort', choices=SORT_KEYS, default='creation_date',
+                         help="атрибут сортировки (по умолчанию creation_date)")
+    command.add_argument('--reverse', action='store_true', help="в обратном порядке")
+    command.add_argument('--limit', type=non_negative_int, help="не более LIMIT заметок")
+    command.add_argument('--offset', type=non_negative_int, default=0,
+                         help="пропустить первые OFFSET заметок")
+
+    command = add_command('search-title', cmd_search_title,
+                          "поиск по вхождению текста в заголовок", listing=True)
+    command.add_argument('sample', help="текст заголовка частично или полностью")
+
+    command = add_command('search-dates', cmd_search_dates,
+                          "поиск по диапазону дат (ГГГГ-ММ-ДД)", listing=True)
+    command.add_argument('date_from', type=date.fromisoformat, metavar='FROM')
+    command.add_argument('date_to', type=date.fromisoformat, metavar='TO')
+    add_kind(command)
+
+    command = add_command('search-daytime', cmd_search_daytime,
+                          "поиск по диапазону времени суток (ЧЧ:ММ[:СС]);"
+                          " если TO < FROM, диапазон переходит через полночь", listing=True)
+    command.add_argument('time_from', type=time.fromisoformat, metavar='FROM')
+    command.add_argument('time_to', type=time.fromisoformat, metavar='TO')
+    add_kind(command)
+
+    command = add_command('update', cmd_update, "изменить заметку")
+    command.add_argument('id', type=positive_int, metavar='ID')
+    command.add_argument('--title', help="новый заголовок")
+    command.add_argument('--body',
+                         help=f"новый текст ('{STDIN_ARG}' - читать из стандартного ввода)")
+    command.add_argument('--append', action='store_true',
+                         help="добавить текст к имеющемуся вместо замены")
+
+    command = add_command('delete', cmd_delete, "удалить заметки")
+    command.add_argument('ids', type=positive_int, nargs='+', metavar='ID')
+
+    def add_format(command):
+        command.add_argument('--format', choices=transfer.FORMATS,
+                             help="jsonl или csv (с разделителем ';');"
+                                  " по умолчанию - по расширению файла")
+
+    command = add_command('export', cmd_export, "выгрузить все заметки в файл")
+    command.add_argument('file', nargs='?', default=STDIN_ARG, metavar='FILE',
+                         help=f"файл ('{STDIN_ARG}' - стандартный вывод, по умолчанию)")
+    add_format(command)
+
+    command = add_command('import', cmd_import,
+                          "загрузить заметки из файла (прерванный импорт"
+                          " при повторном запуске продолжается)")
+    command.add_argument('file', metavar='FILE',
+                         help=f"файл ('{STDIN_ARG}' - стандартный ввод, без возобновления)")
+    add_format(command)
+    command.add_argument('--batch-size', type=positive_int, default=transfer.IMPORT_BATCH_SIZE,
+                         help=f"заметок в пакете записи (по умолчанию {transfer.IMPORT_BATCH_SIZE})")
+    command.add_argument('--no-resume', action='store_true',
+                         help="начать импорт заново, не продолжая прерванный")
+
+    command = add_command('migrate-layout', cmd_migrate_layout,
+                          "перенести файлы заметок прежней плоской раскладки в шарды"
+                          " (можно выполнять, не останавливая работу с заметками)")
+    command.add_argument('--batch-size', type=positive_int, default=MIGRATION_BATCH_SIZE,
+                         help=f"заметок в пакете (по умолчанию {MIGRATION_BATCH_SIZE})")
+    command.add_argument('--pause', type=float, default=0, metavar='SECONDS',
+                         help="пауза между пакетами в секундах (по умолчанию 0)")
+
+    command = add_command('serve', cmd_serve,
+                          "запустить HTTP-сервис JSON (см. client.http_server)")
+    command.add_argument('--host', default='127.0.0.1',
+                         help="адрес (по умолчанию 127.0.0.1)")
+    command.add_argument('--port', type=non_negative_int, default=8080,
+                         help="порт (по умолчанию 8080)")
+    command.add_argument('--access-log', action='store_true',
+                         help="выводить журнал запросов в stderr")
+
+    return parser
+
+
+def run(argv: list[str], repo_factory) -> int:
+    """Выполняет подкоманду argv; repo_factory - создаёт репозиторий
+    (вызывается только после успешного разбора аргументов)."""
+    args = make_parser().parse_args(argv)
+    repo: NotesRepository = repo_factory()
+    try:
+        exit_code = args.handler(repo, args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # потребитель вывода завершился раньше (например, head):
+        # остаток вывода при завершении направляется в devnull
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        exit_code = EXIT_OK
+    finally:
+        repo.close()
+    return exit_code
@@ -1,6 +1,7 @@
 import os
+import shutil
 import sys
-from typing import AbstractSet, Callable, Optional
+from typing import AbstractSet, Callable, Iterable, Iterator, Optional
 
 PROMPT_ENTER = "\nНажмите Ввод чтобы продолжить..."
 PLEASE_REPEAT = "Пожалуйста попробуйте снова."
@@ -16,9 +17,132 @@ ERR_INT_MUST_BE_IN_RANGE = "Число должно быть в интервал
 ERR_INT_TOO_LOW = "Число не должно быть меньше {}! " + PLEASE_REPEAT
 ERR_INT_TOO_HIGH = "Число не должно быть больше {}! " + PLEASE_REPEAT
 
+# курсор в начало, очистка экрана и буфера прокрутки
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"
+
+# постраничный просмотр: строки экрана, занятые подвалом и подсказкой
+PAGER_RESERVED_LINES = 3
+PAGER_FALLBACK_SIZE = (80, 24)
+PAGER_CMD_NEXT = ('', 'n', 'т', '+')
+PAGER_CMD_PREV = ('p', 'з', '-')
+PAGER_CMD_QUIT = ('q', 'й', '0')
+PAGER_PAGE = "Страница {}"
+PAGER_PROMPT = "Ввод \u2014 далее, p(з) \u2014 назад, q(й) \u2014 закончить просмотр: "
+PAGER_PROMPT_LAST = "Ввод \u2014 закончить просмотр, p(з) \u2014 назад: "
+
+__vt_mode_enabled = False
+
+
+def __enable_vt_mode():
+    """Включает обработку управляющих последовательностей
+    в консоли Windows (в прочих терминалах она включена всегда)."""
+    global __vt_mode_enabled
+    if __vt_mode_enabled:
+        return
+    __vt_mode_enabled = True
+    if os.name != 'nt':
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+    except Exception:
+        pass
+
 
 def clear():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    """Очищает экран управляющей последовательностью
+    (без запуска дочернего процесса cls/clear)."""
+    __enable_vt_mode()
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
+
+
+def show_paged(items: Iterable, summary: Optional[Callable[[int], str]] = None):
+    """Постраничный просмотр: элементы (их строковые представления)
+    берутся из items лениво - ровно столько, сколько помещается
+    на экране, и каждая страница выводится одной записью.
+    Просмотренные страницы запоминаются для перехода назад.\n
+    summary - текст по количеству элементов, выводимый на последней
+    странице (когда items исчерпан)."""
+    pages = Pager(iter(items))
+    page_no = 0
+    while True:
+        page = pages.get(page_no)
+        is_last = pages.is_last(page_no)
+        footer = [PAGER_PAGE.format(page_no + 1)]
+        if is_last and summary is not None:
+            footer.append(summary(pages.count))
+        clear()
+        sys.stdout.write(page + '\n' + '\n'.join(footer) + '\n')
+        sys.stdout.flush()
+
+        command = safe_input(PAGER_PROMPT_LAST if is_last else PAGER_PROMPT).strip().lower()
+        if command in PAGER_CMD_PREV:
+            page_no = max(0, page_no - 1)
+        elif command in PAGER_CMD_QUIT or (is_last and command in PAGER_CMD_NEXT):
+            return
+        elif command in PAGER_CMD_NEXT:
+            page_no += 1
+
+
+class Pager:
+    """Разбивка потока элементов на страницы по высоте экрана.
+    Элементы преобразуются в текст только при построении очередной
+    страницы; элемент, который не поместился, переносится на следующую
+    (страница содержит хотя бы один элемент)."""
+
+    def __init__(self, items: Iterator) -> None:
+        self.__items = items
+        self.__pages: list[str] = []
+        self.__pending: Optional[str] = None
+        self.__is_exhausted = False
+        self.count = 0
+
+    def get(self, page_no: int) -> str:
+        while page_no >= len(self.__pages) and not self.__is_exhausted:
+            self.__render_next()
+        if not self.__pages:
+            return ''
+        return self.__pages[min(page_no, len(self.__pages) - 1)]
+
+    def is_last(self, page_no: int) -> bool:
+        if page_no + 1 < len(self.__pages):
+            return False
+        if self.__pending is None and not self.__is_exhausted:
+            self.__pending = self.__take()
+        return self.__pending is None
+
+    def __take(self) -> Optional[str]:
+        try:
+            item = next(self.__items)
+        except StopIteration:
+            self.__is_exhausted = True
+            return None
+        self.count += 1
+        return str(item)
+
+    def __render_next(self):
+        height = shutil.get_terminal_size(PAGER_FALLBACK_SIZE).lines - PAGER_RESERVED_LINES
+        texts: list[str] = []
+        used_lines = 0
+        while True:
+            text = self.__pending if self.__pending is not None else self.__take()
+            self.__pending = None
+            if text is None:
+                break
+            text_lines = text.count('\n') + 1
+            if texts and used_lines + text_lines > height:
+                self.__pending = text
+                break
+            texts.append(text)
+            used_lines += text_lines
+        if texts or not self.__pages:
+            self.__pages.append('\n'.join(texts))
 
 
 def safe_input(prompt=None) -> str:
@@ -1,9 +1,11 @@
 import re
 from datetime import date, datetime, time
-from typing import Optional
+from typing import Iterable, Optional, Sequence
 
-from client.view_models import MenuViewModel, NoteViewModel
-from domain.entities import Note
+from client.view_models import MenuViewModel, MetricsViewModel, NoteViewModel
+from domain import metrics
+from domain.columnar import NoteColumns
+from domain.entities import Note, NoteConflictError
 from domain.repository import AttributeKind, NotesRepository
 
 from . import console_view as view
@@ -26,6 +28,8 @@ MAIN_MENU = MenuModel(
         '6': MenuItem("Поиск по диапазону времени суток", lambda: __select_by_daytime_range()),
         '7': MenuItem("Редактировать", lambda: __edit()),
         '8': MenuItem("Удалить", lambda: __delete()),
+        '9': MenuItem("Поиск по тексту заметок", lambda: __select_by_body()),
+        '10': MenuItem("Статистика", lambda: __show_metrics()),
         ' ': None,
         CMD_EXIT: MenuItem("Завершить работу", None)
     })
@@ -33,12 +37,12 @@ MAIN_MENU = MenuModel(
 SORT_MENU = MenuModel(
     header="Просмотр заметок: Как сортировать?",
     items={
-        '1': MenuItem("По времени создания - от старых к новым", lambda ns: __show_all_sort_by_creation_recent_last(ns)),
-        '2': MenuItem("По времени создания - от новых к старым", lambda ns: __show_all_sort_by_creation_older_last(ns)),
-        '3': MenuItem("По времени последнего изменения - от давних к недавним", lambda ns: __show_all_sort_by_change_recent_last(ns)),
-        '4': MenuItem("По времени последнего изменения - от недавних к давним", lambda ns: __show_all_sort_by_change_older_last(ns)),
-        '5': MenuItem("По заголовку - А..Я", lambda ns: __show_all_sort_by_title_natural(ns)),
-        '6': MenuItem("По заголовку - Я..А", lambda ns: __show_all_sort_by_title_reverse(ns)),
+        '1': MenuItem("По времени создания - от старых к новым", lambda: __show_all_sort_by_creation_recent_last()),
+        '2': MenuItem("По времени создания - от новых к старым", lambda: __show_all_sort_by_creation_older_last()),
+        '3': MenuItem("По времени последнего изменения - от давних к недавним", lambda: __show_all_sort_by_change_recent_last()),
+        '4': MenuItem("По времени последнего изменения - от недавних к давним", lambda: __show_all_sort_by_change_older_last()),
+        '5': MenuItem("По заголовку - А..Я", lambda: __show_all_sort_by_title_natural()),
+        '6': MenuItem("По заголовку - Я..А", lambda: __show_all_sort_by_title_reverse()),
         ' ': None,
         CMD_GO_BACK: MenuItem("Вернуться в предыдущее меню", None),
         CMD_EXIT: MenuItem("Завершить работу", None)
@@ -143,52 +147,58 @@ def __add_new():
         do_repeat = view.ask_yes_no("Добавить ещё заметку (д/Н)(y/N)? ", False)
 
 
-def __show_all(notes: Optional[list[Note]] = None):
+def __show_all(notes: Optional[Sequence[Note]] = None):
     if notes:
-        for note in notes:
-            view.show(NoteViewModel(note))
-        view.show(f"\u2211 Найдено заметок: {len(notes)}")
-        view.show(SHORT_HR)
-        view.wait_to_proceed()
+        __show_notes(notes)
         return
 
-    notes = list(notes_repo.get_all_notes())
-    if not notes:
+    if next(notes_repo.query(limit=1), None) is None:
         view.show("Вы ещё не создали ни одной заметки. Список заметок пуст.")
         view.wait_to_proceed()
         return
 
-    __menu_lifecycle(SORT_MENU, notes)  # onetime=True)
+    __menu_lifecycle(SORT_MENU)  # onetime=True)
+
+
+def __show_notes(notes: Iterable[Note]):
+    # заметки отображаются постранично: представления строятся
+    # только для показываемых страниц
+    view.show_paged(map(NoteViewModel, notes),
+                    lambda count: f"\u2211 Найдено заметок: {count}")
 
 
-def __show_all_sort_by_creation_recent_last(notes: list[Note]):
-    notes.sort(key=lambda n: n.creation_date)
-    __show_all(notes)
+def __show_sorted(key: str, reverse=False):
+    # сортировка выполняется репозиторием (по индексу, без чтения текста)
+    __show_notes(notes_repo.query(key, reverse))
 
 
-def __show_all_sort_by_creation_older_last(notes: list[Note]):
-    notes.sort(key=lambda n: n.creation_date, reverse=True)
-    __show_all(notes)
+def __show_table_sorted(notes_table: NoteColumns, key: str, reverse=False,
+                        rows: Optional[Sequence[int]] = None):
+    __show_notes(notes_table.rows(notes_table.argsort(key, reverse, rows)))
 
 
-def __show_all_sort_by_change_recent_last(notes: list[Note]):
-    notes.sort(key=lambda n: n.last_change_date)
-    __show_all(notes)
+def __show_all_sort_by_creation_recent_last():
+    __show_sorted('creation_date')
 
 
-def __show_all_sort_by_change_older_last(notes: list[Note]):
-    notes.sort(key=lambda n: n.last_change_date, reverse=True)
-    __show_all(notes)
+def __show_all_sort_by_creation_older_last():
+    __show_sorted('creation_date', reverse=True)
 
 
-def __show_all_sort_by_title_natural(notes: list[Note]):
-    notes.sort(key=lambda n: n.title)
-    __show_all(notes)
+def __show_all_sort_by_change_recent_last():
+    __show_sorted('last_change_date')
 
 
-def __show_all_sort_by_title_reverse(notes: list[Note]):
-    notes.sort(key=lambda n: n.title, reverse=True)
-    __show_all(notes)
+def __show_all_sort_by_change_older_last():
+    __show_sorted('last_change_date', reverse=True)
+
+
+def __show_all_sort_by_title_natural():
+    __show_sorted('title')
+
+
+def __show_all_sort_by_title_reverse():
+    __show_sorted('title', reverse=True)
 
 
 def __select_by_id(header="ЗАМЕТКИ: Поиск по идентификатору", return_found=False) -> Optional[Note]:
@@ -245,9 +255,10 @@ def __select_by_title():
             view.wait_to_proceed()
             return
 
-        notes = list(notes_repo.get_notes_by_title(title_sample))
-        if notes:
-            __show_all_sort_by_creation_recent_last(notes)
+        notes_table = notes_repo.get_notes_table(
+            notes_repo.get_notes_by_title(title_sample))
+        if notes_table:
+            __show_table_sorted(notes_table, 'creation_date')
         else:
             view.show(
                 "Не найдено заметок, содержащих в заголовке заданный текст.")
@@ -256,6 +267,35 @@ def __select_by_title():
         do_repeat = view.ask_yes_no("Повторить поиск (Д/н)(Y/n)? ", True)
 
 
+def __select_by_body():
+    do_repeat = True
+
+    while do_repeat:
+        view.clear()
+        view.show("ЗАМЕТКИ: Поиск по тексту")
+        view.show()
+
+        query = view.ask_string("Введите слова для поиска в тексте заметок"
+                                " (пустой Ввод чтобы отменить):\n")
+        view.show(SHORT_HR)
+
+        if not query:
+            view.show("Поиск отменён.")
+            view.wait_to_proceed()
+            return
+
+        # заметки выдаются в порядке убывания релевантности
+        notes = list(notes_repo.search_body(query))
+        if notes:
+            __show_all(notes)
+        else:
+            view.show(
+                "Не найдено заметок, содержащих в тексте все заданные слова.")
+
+        view.show(SHORT_HR)
+        do_repeat = view.ask_yes_no("Повторить поиск (Д/н)(Y/n)? ", True)
+
+
 def __select_by_date_range():
 
     def check_date_str_validity(date_str: str):
@@ -320,13 +360,13 @@ def __select_by_date_range():
 
         view.show(f"\nЗадан диапазон {first_date}\u2014{second_date}.\n")
 
-        notes = list(notes_repo.get_notes_by_date_range(
-            first_date, second_date, attribute_kind))
-        if notes:
-            if attribute_kind == AttributeKind.CREATION:
-                __show_all_sort_by_creation_recent_last(notes)
-            else:
-                __show_all_sort_by_change_recent_last(notes)
+        # выборка по диапазону и сортировка выполняются по столбцам таблицы
+        # заметок (векторно при наличии NumPy), текст заметок не читается
+        notes_table = notes_repo.get_notes_table()
+        rows = notes_table.select_date_range(
+            attribute_kind.attribute_name, first_date, second_date)
+        if rows:
+            __show_table_sorted(notes_table, attribute_kind.attribute_name, rows=rows)
         else:
             view.show(
                 f"Не найдено заметок в указанном диапазоне дат {first_date}\u2014{second_date}.")
@@ -394,18 +434,16 @@ def __select_by_daytime_range():
 
         first_time = time.fromisoformat(first_time_str)
         second_time = time.fromisoformat(second_time_str)
-        if second_time < first_time:
-            first_time, second_time = second_time, first_time
 
-        view.show(f"\nЗадан диапазон {first_time}\u2014{second_time}.\n")
+        view.show(f"\nЗадан диапазон {first_time}\u2014{second_time}"
+                  f"{' (через полночь)' if second_time < first_time else ''}.\n")
 
-        notes = list(notes_repo.get_notes_by_daytime_range(
-            first_time, second_time, attribute_kind))
-        if notes:
-            if attribute_kind == AttributeKind.CREATION:
-                __show_all_sort_by_creation_recent_last(notes)
-            else:
-                __show_all_sort_by_change_recent_last(notes)
+        # см. __select_by_date_range
+        notes_table = notes_repo.get_notes_table()
+        rows = notes_table.select_daytime_range(
+            attribute_kind.attribute_name, first_time, second_time)
+        if rows:
+            __show_table_sorted(notes_table, attribute_kind.attribute_name, rows=rows)
         else:
             view.show(
                 f"Не найдено заметок в указанном диапазоне времени дня {first_time}\u2014{second_time}.")
@@ -414,10 +452,31 @@ def __select_by_daytime_range():
         do_repeat = view.ask_yes_no("Повторить поиск (Д/н)(Y/n)? ", True)
 
 
+def __show_metrics():
+    view.clear()
+    view.show("ЗАМЕТКИ: Статистика")
+    view.show()
+
+    if not metrics.enabled:
+        view.show("Сбор статистики выключен. Включите его параметром \"metrics\""
+                  f" файла настроек или переменной окружения {metrics.ENV_VAR}=1.")
+    else:
+        view.show(MetricsViewModel(metrics.snapshot()))
+
+    cache = NoteViewModel.cache
+    view.show(f"Кэш представлений заметок: {len(cache)} записей,"
+              f" попаданий {cache.hits}, промахов {cache.misses}")
+    view.show(SHORT_HR)
+    view.wait_to_proceed()
+
+
 def __edit(note: Optional[Note] = None):
     if note and note.id is not None:
 
         if view.ask_yes_no(f"Редактировать заметку {note.id} (Д/н)(Y/n)? ", True):
+            # время изменения прочитанной заметки: при сохранении
+            # проверяется, что её не изменили в другом окне или процессе
+            read_change_date = note.last_change_date
 
             title = view.ask_string(
                 "Введите заголовок заметки (пустой Ввод чтобы оставить без изменений):\n")
@@ -448,7 +507,15 @@ def __edit(note: Optional[Note] = None):
             view.show(NoteViewModel(note))
 
             if view.ask_yes_no("Сохранить изменения (Д/н)(Y/n)? ", True):
-                if notes_repo.update_note(note):
+                try:
+                    is_updated = notes_repo.update_note(note, read_change_date)
+                except NoteConflictError:
+                    is_updated = None
+                NoteViewModel.cache.invalidate(note.id)
+                if is_updated is None:
+                    view.show(f"Заметка {note.id} была изменена или удалена"
+                              " другим пользователем. Изменения не сохранены.")
+                elif is_updated:
                     view.show(
                         f"Изменения заметки {note.id} успешно сохранены.")
                 else:
@@ -477,7 +544,15 @@ def __delete(note: Optional[Note] = None):
     if note and note.id is not None:
 
         if view.ask_yes_no(f"Удалить заметку {note.id} (д/Н)(y/N)? ", False):
-            if notes_repo.delete_note(note.id):
+            try:
+                is_deleted = notes_repo.delete_note(note.id, note.last_change_date)
+            except NoteConflictError:
+                is_deleted = None
+            NoteViewModel.cache.invalidate(note.id)
+            if is_deleted is None:
+                view.show(f"Заметка {note.id} была изменена или удалена"
+                          " другим пользователем. Удаление отменено.")
+            elif is_deleted:
                 view.show(f"Заметка {note.id} успешно удалена.")
             else:
                 view.show(f"Не удалось удалить заметку {note.id}!"
@@ -0,0 +1,457 @@
+"""HTTP-сервис JSON поверх NotesRepository (только стандартная библиотека).
+
+Ресурсы:
+    GET    /notes?sort=&reverse=&limit=&offset=    страница заметок (см. NotesRepository.query)
+    POST   /notes                                  {"title", "body"} - добавить заметку
+    GET    /notes/{id}                             заметка
+    PUT    /notes/{id}                             {"title" и/или "body"} - изменить заметку
+    DELETE /notes/{id}                             удалить заметку
+    GET    /notes/by-title?q=                      поиск по вхождению текста в заголовок
+    GET    /notes/by-date?from=&to=&kind=          по диапазону дат (ГГГГ-ММ-ДД)
+    GET    /notes/by-daytime?from=&to=&kind=       по диапазону времени суток (ЧЧ:ММ[:СС])
+
+Выборки возвращаются страницами: {"items": [...], "offset", "limit", "next"},
+где next - адрес следующей страницы (null - страница последняя); параметр
+body=0 исключает текст заметок из ответа. Соединения поддерживаются
+открытыми (HTTP/1.1 keep-alive).
+
+Ответы с заметкой содержат ETag и Last-Modified, вычисленные по времени
+последнего изменения заметки, страницы выборок - ETag по id и времени
+изменения входящих в них заметок; повторный запрос с If-None-Match
+(для заметки - также If-Modified-Since) получает 304 без тела.
+If-Match в PUT и DELETE отклоняет изменение (412), если заметка
+изменилась с момента её получения клиентом.
+"""
+import itertools
+import json
+import threading
+import zlib
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from domain.entities import SORT_KEYS, Note, NoteConflictError
+from domain.repository import AttributeKind, NotesRepository
+from domain.transfer import note_to_dict
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# наибольший размер тела запроса, байт
+MAX_REQUEST_SIZE = 1024 * 1024
+# простаивающее соединение keep-alive закрывается через это время
+KEEP_ALIVE_TIMEOUT_S = 30
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+ENCODING = 'UTF-8'
+
+KINDS = {
+    'creation': AttributeKind.CREATION,
+    'change': AttributeKind.LAST_CHANGE,
+}
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status: HTTPStatus, message: Optional[str] = None) -> None:
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+
+
+class Response:
+    """Ответ обработчика: тело (JSON-совместимый объект или None)
+    и заголовки кэширования."""
+
+    def __init__(self, payload, status: HTTPStatus = HTTPStatus.OK,
+                 etag: Optional[str] = None, last_modified: Optional[datetime] = None,
+                 headers: Optional[dict[str, str]] = None) -> None:
+        self.payload = payload
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers or {}
+
+
+# caching
+
+def note_etag(note: Note) -> str:
+    return f'"{note.id}-{note.last_change_date:%Y%m%d%H%M%S%f}"'
+
+
+def page_etag(notes: list[Note]) -> str:
+    """ETag страницы: контрольная сумма id и времени изменения
+    её заметок (меняется при изменении, добавлении и удалении)."""
+    digest = zlib.crc32(' '.join(f"{n.id}:{n.last_change_date:%Y%m%d%H%M%S%f}"
+                                 for n in notes).encode(ENCODING))
+    return f'W/"{len(notes)}-{digest:08x}"'
+
+
+def to_utc(dt: datetime) -> datetime:
+    """Время заметок хранится без часового пояса (местное время)."""
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Сравнение по списку меток заголовка If-None-Match/If-Match
+    (слабое сравнение: префикс W/ не учитывается)."""
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
+
+
+# parameters
+
+def first_param(params: dict[str, list[str]], name: str, default: Optional[str] = None) -> Optional[str]:
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def required_param(params: dict[str, list[str]], name: str) -> str:
+    value = first_param(params, name)
+    if value is None:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Не задан параметр '{name}'")
+    return value
+
+
+def int_param(params: dict[str, list[str]], name: str, default: int,
+              min_value: int = 0, max_value: Optional[int] = None) -> int:
+    raw = first_param(params, name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Параметр '{name}' должен быть целым числом")
+    if value < min_value or (max_value is not None and value > max_value):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Параметр '{name}' вне допустимых пределов")
+    return value
+
+
+def parsed_param(params: dict[str, list[str]], name: str, parse):
+    try:
+        return parse(required_param(params, name))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Некорректное значение параметра '{name}'")
+
+
+def kind_param(params: dict[str, list[str]]) -> AttributeKind:
+    kind = KINDS.get(first_param(params, 'kind', 'creation'))  # type: ignore
+    if kind is None:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр 'kind': creation или change")
+    return kind
+
+
+def note_id_param(raw: str) -> int:
+    try:
+        note_id = int(raw)
+    except ValueError:
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+    if note_id < NotesRepository.NOTES_MIN_ID:
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+    return note_id
+
+
+# server
+
+class NotesHTTPServer(ThreadingHTTPServer):
+    """Многопоточный сервер; NotesRepository не потокобезопасен,
+    поэтому обращения к нему выполняются под общей блокировкой."""
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], repo: NotesRepository,
+                 access_log: bool = False) -> None:
+        super().__init__(address, NotesRequestHandler)
+        self.repo = repo
+        self.repo_lock = threading.Lock()
+        self.access_log = access_log
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class NotesRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "NotesHTTP/1.0"
+    timeout = KEEP_ALIVE_TIMEOUT_S
+    # заголовки и тело ответа отправляются отдельными вызовами: без этого
+    # на соединении keep-alive алгоритм Нейгла вместе с отложенным
+    # подтверждением задерживает каждый ответ на десятки миллисекунд
+    disable_nagle_algorithm = True
+    server: NotesHTTPServer
+
+    def log_message(self, format: str, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+    def log_error(self, format: str, *args):
+        # ошибки выводятся и без журнала запросов
+        super().log_message(format, *args)
+
+    # dispatch
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def do_PUT(self):
+        self.__handle('PUT')
+
+    def do_DELETE(self):
+        self.__handle('DELETE')
+
+    def __handle(self, method: str):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        segments = [s for s in url.path.split('/') if s]
+        try:
+            body = self.__read_body()
+            response = self.__route(method, segments, params, body)
+        except HTTPError as e:
+            response = Response({'error': e.message}, e.status)
+        except Exception as e:
+            self.log_error("%s %s: %r", method, self.path, e)
+            response = Response({'error': "Ошибка хранилища"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        self.__send(response)
+
+    def __route(self, method: str, segments: list[str], params: dict[str, list[str]],
+                body: Optional[dict]) -> Response:
+        if not segments or segments[0] != 'notes' or len(segments) > 2:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+
+        if len(segments) == 1:
+            handlers = {'GET': lambda: self.__list(params),
+                        'POST': lambda: self.__create(body)}
+        elif segments[1] in QUERIES:
+            handlers = {'GET': lambda: self.__search(QUERIES[segments[1]], params)}
+        else:
+            note_id = note_id_param(segments[1])
+            handlers = {'GET': lambda: self.__get(note_id),
+                        'PUT': lambda: self.__update(note_id, body),
+                        'DELETE': lambda: self.__delete(note_id)}
+
+        handler = handlers.get(method)
+        if handler is None:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        return handler()
+
+    # io
+
+    def __read_body(self) -> Optional[dict]:
+        if self.command not in ('POST', 'PUT'):
+            return None
+        raw_length = self.headers.get('Content-Length')
+        if raw_length is None:
+            self.close_connection = True
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        length = int(raw_length) if raw_length.isdigit() else -1
+        if not 0 <= length <= MAX_REQUEST_SIZE:
+            self.close_connection = True
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        try:
+            body = json.loads(self.rfile.read(length).decode(ENCODING))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Тело запроса должно быть объектом JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Тело запроса должно быть объектом JSON")
+        return body
+
+    def __is_not_modified(self, response: Response) -> bool:
+        """Условный GET: If-None-Match имеет приоритет над If-Modified-Since."""
+        if self.command != 'GET' or response.status != HTTPStatus.OK:
+            return False
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return response.etag is not None and etag_matches(if_none_match, response.etag)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None and response.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return to_utc(response.last_modified) <= since
+        return False
+
+    def __send(self, response: Response):
+        not_modified = self.__is_not_modified(response)
+        self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else response.status)
+        if response.etag is not None:
+            self.send_header('ETag', response.etag)
+        if response.last_modified is not None:
+            self.send_header('Last-Modified',
+                             format_datetime(to_utc(response.last_modified), usegmt=True))
+        if response.etag is not None or response.last_modified is not None:
+            # ответ можно кэшировать, но перед использованием - проверять
+            self.send_header('Cache-Control', 'no-cache')
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+
+        if not_modified or response.payload is None:
+            if not not_modified:
+                self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        data = json.dumps(response.payload, ensure_ascii=False).encode(ENCODING)
+        self.send_header('Content-Type', JSON_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # handlers
+
+    def __check_if_match(self, note: Note):
+        if_match = self.headers.get('If-Match')
+        if if_match is not None and not etag_matches(if_match, note_etag(note)):
+            raise HTTPError(HTTPStatus.PRECONDITION_FAILED, "Заметка была изменена")
+
+    def __guarded(self, change, *args) -> bool:
+        """Изменение с проверкой времени изменения прочитанной заметки:
+        сервер согласован с собой блокировкой, но хранилище могут
+        одновременно изменять другие процессы."""
+        try:
+            return change(*args)
+        except NoteConflictError:
+            raise HTTPError(HTTPStatus.CONFLICT, "Заметка была изменена другим процессом")
+
+    def __get(self, note_id: int) -> Response:
+        repo = self.server.repo
+        with self.server.repo_lock:
+            note = repo.get_note_by_id(note_id)
+            if note is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"Заметка {note_id} не найдена")
+            payload = note_to_dict(note)
+        return Response(payload, etag=note_etag(note), last_modified=note.last_change_date)
+
+    def __create(self, body: Optional[dict]) -> Response:
+        assert body is not None
+        title, text = body.get('title'), body.get('body', '')
+        if not isinstance(title, str) or not isinstance(text, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Требуются строковые поля 'title' и 'body'")
+
+        dt = datetime.now()
+        with self.server.repo_lock:
+            note = self.server.repo.add_note(Note(None, dt, dt, title, text))
+        if note is None:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Не удалось добавить заметку")
+        return Response(note_to_dict(note), HTTPStatus.CREATED,
+                        etag=note_etag(note), last_modified=note.last_change_date,
+                        headers={'Location': f"/notes/{note.id}"})
+
+    def __update(self, note_id: int, body: Optional[dict]) -> Response:
+        assert body is not None
+        title, text = body.get('title'), body.get('body')
+        if title is None and text is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Требуется поле 'title' и/или 'body'")
+        if not isinstance(title, (str, type(None))) or not isinstance(text, (str, type(None))):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Поля 'title' и 'body' должны быть строками")
+
+        repo = self.server.repo
+        with self.server.repo_lock:
+            note = repo.get_note_by_id(note_id)
+            if note is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"Заметка {note_id} не найдена")
+            self.__check_if_match(note)
+            read_change_date = note.last_change_date
+            if title is not None:
+                note.title = title
+            if text is not None:
+                note.body = text
+            note.last_change_date = datetime.now()
+            if not self.__guarded(repo.update_note, note, read_change_date):
+                raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Не удалось сохранить заметку")
+            payload = note_to_dict(note)
+        return Response(payload, etag=note_etag(note), last_modified=note.last_change_date)
+
+    def __delete(self, note_id: int) -> Response:
+        repo = self.server.repo
+        with self.server.repo_lock:
+            note = repo.get_note_by_id(note_id)
+            if note is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"Заметка {note_id} не найдена")
+            self.__check_if_match(note)
+            if not self.__guarded(repo.delete_note, note_id, note.last_change_date):
+                raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Не удалось удалить заметку")
+        return Response(None, HTTPStatus.NO_CONTENT)
+
+    def __list(self, params: dict[str, list[str]]) -> Response:
+        sort_by = first_param(params, 'sort', 'creation_date')
+        if sort_by not in SORT_KEYS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Параметр 'sort': {', '.join(SORT_KEYS)}")
+        reverse = first_param(params, 'reverse', '0') not in FALSE_VALUES
+        offset, limit = self.__page_params(params)
+        # на одну заметку больше, чтобы узнать, есть ли следующая страница
+        return self.__page(params, offset, limit,
+                           lambda: self.server.repo.query(sort_by, reverse, limit + 1, offset))
+
+    def __search(self, query, params: dict[str, list[str]]) -> Response:
+        offset, limit = self.__page_params(params)
+        make_query = query(self.server.repo, params)
+        return self.__page(params, offset, limit,
+                           lambda: itertools.islice(make_query(), offset, offset + limit + 1))
+
+    def __page_params(self, params: dict[str, list[str]]) -> tuple[int, int]:
+        offset = int_param(params, 'offset', 0)
+        limit = int_param(params, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        return offset, limit
+
+    def __page(self, params: dict[str, list[str]], offset: int, limit: int,
+               select) -> Response:
+        with_body = first_param(params, 'body', '1') not in FALSE_VALUES
+        with self.server.repo_lock:
+            notes = list(select())
+            has_next = len(notes) > limit
+            notes = notes[:limit]
+            items = [note_to_dict(note, with_body) for note in notes]
+
+        next_url = None
+        if has_next:
+            next_params = {name: values[0] for name, values in params.items()}
+            next_params['offset'] = str(offset + limit)
+            next_params['limit'] = str(limit)
+            next_url = f"{urlsplit(self.path).path}?{urlencode(next_params)}"
+        return Response({'items': items, 'offset': offset, 'limit': limit, 'next': next_url},
+                        etag=page_etag(notes))
+
+
+# queries: по параметрам запроса строят функцию выборки
+
+def query_by_title(repo: NotesRepository, params: dict[str, list[str]]):
+    sample = required_param(params, 'q')
+    return lambda: repo.get_notes_by_title(sample)
+
+
+def query_by_date(repo: NotesRepository, params: dict[str, list[str]]):
+    date_from = parsed_param(params, 'from', date.fromisoformat)
+    date_to = parsed_param(params, 'to', date.fromisoformat)
+    kind = kind_param(params)
+    return lambda: repo.get_notes_by_date_range(date_from, date_to, kind)
+
+
+def query_by_daytime(repo: NotesRepository, params: dict[str, list[str]]):
+    time_from = parsed_param(params, 'from', time.fromisoformat)
+    time_to = parsed_param(params, 'to', time.fromisoformat)
+    kind = kind_param(params)
+    return lambda: repo.get_notes_by_daytime_range(time_from, time_to, kind)
+
+
+QUERIES = {
+    'by-title': query_by_title,
+    'by-date': query_by_date,
+    'by-daytime': query_by_daytime,
+}
+
+
+def make_server(repo: NotesRepository, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                access_log: bool = False) -> NotesHTTPServer:
+    """Создаёт сервер (port=0 - любой свободный порт); запуск - serve_forever()."""
+    return NotesHTTPServer((host, port), repo, access_log)
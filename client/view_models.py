@@ -1,7 +1,68 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
 from domain.entities import Note
 
 from .entities import MenuModel
 
+# предельный суммарный размер (в символах) кэша представлений заметок
+RENDER_CACHE_MAX_SIZE = 2_000_000
+
+
+class RenderCache:
+    """Кэш готовых текстовых представлений с вытеснением давно
+    не использованных (LRU) при превышении суммарного размера max_size.
+    Ключ - (id заметки, время последнего изменения); все записи заметки
+    удаляются методом invalidate. Ведёт счётчики попаданий и промахов.
+    """
+
+    def __init__(self, max_size: int = RENDER_CACHE_MAX_SIZE) -> None:
+        self.__max_size = max_size
+        self.__entries: OrderedDict[tuple[int, Hashable], str] = OrderedDict()
+        self.__size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def get(self, key: tuple[int, Hashable]) -> Optional[str]:
+        text = self.__entries.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return text
+
+    def put(self, key: tuple[int, Hashable], text: str):
+        if len(text) > self.__max_size:
+            return
+        self.__discard(key)
+        self.__entries[key] = text
+        self.__size += len(text)
+        while self.__size > self.__max_size:
+            _, evicted = self.__entries.popitem(last=False)
+            self.__size -= len(evicted)
+
+    def invalidate(self, note_id: int):
+        """Удаляет представления заметки note_id (всех её версий)."""
+        for key in [k for k in self.__entries if k[0] == note_id]:
+            self.__discard(key)
+
+    def clear(self):
+        self.__entries.clear()
+        self.__size = 0
+
+    def __discard(self, key: tuple[int, Hashable]):
+        text = self.__entries.pop(key, None)
+        if text is not None:
+            self.__size -= len(text)
+
 
 class NoteViewModel:
 
@@ -9,7 +70,24 @@ class NoteViewModel:
     DIVIDER_THIN = '\u2500'
     DT_FORMAT = '%Y-%m-%d %H:%M'
 
+    # представления сохранённых заметок повторно не строятся
+    # (и текст заметки не загружается), пока заметка не изменилась
+    cache = RenderCache()
+
     def __init__(self, note: Note) -> None:
+        if note.id is None:
+            self.repr_str = NoteViewModel.render(note)
+            return
+
+        key = (note.id, note.last_change_date)
+        repr_str = NoteViewModel.cache.get(key)
+        if repr_str is None:
+            repr_str = NoteViewModel.render(note)
+            NoteViewModel.cache.put(key, repr_str)
+        self.repr_str = repr_str
+
+    @staticmethod
+    def render(note: Note) -> str:
         header = f"\u25a4 Заметка {note.id if note.id else '-'} : {note.title}"
         c_datetime = f"Создана:             {note.creation_date.strftime(NoteViewModel.DT_FORMAT)}"
         m_datetime = f"Последнее изменение: {note.last_change_date.strftime(NoteViewModel.DT_FORMAT)}"
@@ -21,6 +99,34 @@ class NoteViewModel:
         repr_lines = [thick_div, header, thin_div, c_datetime,
                       m_datetime, thin_div, note.body, thick_div]
 
+        return '\n'.join(repr_lines)
+
+    def __str__(self) -> str:
+        return self.repr_str
+
+
+class MetricsViewModel:
+    """Таблица метрик операций (см. domain.metrics.snapshot)."""
+
+    COLUMNS = ("Операция", "Вызовов", "Среднее, мс", "p95, мс", "Макс., мс")
+
+    def __init__(self, snapshot: dict) -> None:
+        rows = [MetricsViewModel.COLUMNS]
+        rows.extend((name, str(op['count']), f"{op['mean_ms']:.3f}",
+                     f"{op['p95_ms']:.3f}", f"{op['max_ms']:.3f}")
+                    for name, op in snapshot['operations'].items())
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        repr_lines = ['  '.join(cell.ljust(widths[0]) if i == 0 else cell.rjust(widths[i])
+                                for i, cell in enumerate(row))
+                      for row in rows]
+        repr_lines.insert(1, NoteViewModel.DIVIDER_THIN * len(repr_lines[0]))
+
+        counters = snapshot['counters']
+        repr_lines.append('')
+        repr_lines.append(f"Прочитано байт: {counters.get('bytes_read', 0)},"
+                          f" записано байт: {counters.get('bytes_written', 0)}")
+        repr_lines.append(f"Время сбора: {snapshot['uptime_s']:.0f} с")
+
         self.repr_str = '\n'.join(repr_lines)
 
     def __str__(self) -> str:
@@ -0,0 +1,198 @@
+import asyncio
+import copy
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence, TypeVar
+
+from . import metrics
+from .entities import Note
+from .repository import AttributeKind, NotesRepository
+
+# число потоков исполнителя, выполняющих обращения к хранилищу
+ASYNC_MAX_WORKERS = 4
+# асинхронные итераторы получают заметки из исполнителя порциями
+ASYNC_CHUNK_SIZE = 256
+
+R = TypeVar('R')
+
+
+def load_bodies(notes: list[Note]) -> list[Note]:
+    """Загружает текст заметок с отложенной загрузкой (см. LazyNote),
+    чтобы обращение к body в цикле событий не читало файлы."""
+    for note in notes:
+        note.body
+    return notes
+
+
+class AsyncNotesRepository:
+    """Асинхронный интерфейс NotesRepository для встраивания в сервисы
+    на asyncio: методы репозитория - сопрограммы, выборки - асинхронные
+    итераторы.\n
+    Все обращения к хранилищу выполняются в ограниченном пуле потоков
+    (max_workers), цикл событий не блокируется. NotesRepository
+    не потокобезопасен, поэтому сами вызовы репозитория выполняются
+    по одному; текст заметок (чтение файлов) загружается параллельно,
+    вне этой очереди.\n
+    Одновременные запросы одной заметки по id объединяются: пока чтение
+    выполняется, новые запросы того же id ожидают его результат
+    (каждый получает свою копию заметки). Изменение или удаление заметки
+    отменяет объединение - последующие запросы читают её заново.
+    """
+
+    def __init__(self, repo: NotesRepository, max_workers: int = ASYNC_MAX_WORKERS) -> None:
+        if max_workers < 1:
+            raise ValueError(max_workers)
+        self.__repo = repo
+        self.__executor = ThreadPoolExecutor(max_workers, thread_name_prefix="notes-async")
+        self.__lock = threading.Lock()
+        self.__reads: dict[int, asyncio.Future] = {}
+
+    @classmethod
+    async def open(cls, path_str, engine: str = "files", max_workers: int = ASYNC_MAX_WORKERS,
+                   **engine_options) -> 'AsyncNotesRepository':
+        """Открывает хранилище (с восстановлением после сбоя) в потоке
+        исполнителя, см. NotesRepository."""
+        executor = ThreadPoolExecutor(1, thread_name_prefix="notes-async-open")
+        try:
+            repo = await asyncio.get_running_loop().run_in_executor(
+                executor, lambda: NotesRepository(path_str, engine, **engine_options))
+        finally:
+            executor.shutdown(wait=False)
+        return cls(repo, max_workers)
+
+    async def close(self):
+        try:
+            await self.__call(self.__repo.close)
+        finally:
+            self.__executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> 'AsyncNotesRepository':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # executor
+
+    def __run(self, fn: Callable[..., R], *args) -> 'asyncio.Future[R]':
+        return asyncio.get_running_loop().run_in_executor(self.__executor, fn, *args)
+
+    def __call(self, fn: Callable[..., R], *args) -> 'asyncio.Future[R]':
+        """Вызов репозитория в потоке исполнителя, по одному."""
+        return self.__run(self.__locked, fn, *args)
+
+    def __locked(self, fn: Callable[..., R], *args) -> R:
+        with self.__lock:
+            return fn(*args)
+
+    def __take(self, notes: Iterator[Note]) -> list[Note]:
+        with self.__lock:
+            return list(itertools.islice(notes, ASYNC_CHUNK_SIZE))
+
+    async def __iterate(self, fn: Callable[..., Iterator[Note]], *args,
+                        with_body: bool) -> AsyncIterator[Note]:
+        """Асинхронный итератор по выборке fn(*args): заметки читаются
+        в исполнителе порциями по ASYNC_CHUNK_SIZE.\n
+        with_body=False - текст не загружается заранее (обращение к body
+        у такой заметки выполнит чтение в вызывающем потоке)."""
+        notes = await self.__call(fn, *args)
+        while chunk := await self.__run(self.__take, notes):
+            if with_body:
+                await self.__run(load_bodies, chunk)
+            for note in chunk:
+                yield note
+
+    # create
+
+    async def add_note(self, note: Note):
+        return await self.__call(self.__repo.add_note, note)
+
+    async def add_many(self, notes: Sequence[Note]) -> list[Optional[Note]]:
+        return await self.__call(self.__repo.add_many, notes)
+
+    # read
+
+    async def get_note_by_id(self, note_id: int) -> Optional[Note]:
+        if note_id < NotesRepository.NOTES_MIN_ID:
+            raise ValueError(note_id)
+
+        read = self.__reads.get(note_id)
+        if read is None:
+            read = self.__run(self.__read_note, note_id)
+            self.__reads[note_id] = read
+            read.add_done_callback(lambda _: self.__forget_read(note_id, read))
+        elif metrics.enabled:
+            metrics.count('async.coalesced_reads')
+
+        # отмена одного из ожидающих не должна прерывать общее чтение
+        note = await asyncio.shield(read)
+        return copy.copy(note) if note is not None else None
+
+    def __read_note(self, note_id: int) -> Optional[Note]:
+        note = self.__locked(self.__repo.get_note_by_id, note_id)
+        if note is not None:
+            load_bodies([note])
+        return note
+
+    def __forget_read(self, note_id: int, read: asyncio.Future):
+        if self.__reads.get(note_id) is read:
+            del self.__reads[note_id]
+
+    def get_all_notes(self, with_body: bool = True) -> AsyncIterator[Note]:
+        return self.__iterate(self.__repo.get_all_notes, with_body=with_body)
+
+    def query(self, sort_by: str = 'creation_date', reverse: bool = False,
+              limit: Optional[int] = None, offset: int = 0,
+              with_body: bool = True) -> AsyncIterator[Note]:
+        """См. NotesRepository.query."""
+        return self.__iterate(self.__repo.query, sort_by, reverse, limit, offset,
+                              with_body=with_body)
+
+    def get_notes_by_title(self, title_sample: str,
+                           with_body: bool = True) -> AsyncIterator[Note]:
+        return self.__iterate(self.__repo.get_notes_by_title, title_sample,
+                              with_body=with_body)
+
+    def get_notes_by_date_range(self, date_from: date, date_to: date,
+                                kind=AttributeKind.CREATION,
+                                with_body: bool = True) -> AsyncIterator[Note]:
+        return self.__iterate(self.__repo.get_notes_by_date_range, date_from, date_to, kind,
+                              with_body=with_body)
+
+    def get_notes_by_daytime_range(self, time_from: time, time_to: time,
+                                   kind=AttributeKind.CREATION,
+                                   with_body: bool = True) -> AsyncIterator[Note]:
+        return self.__iterate(self.__repo.get_notes_by_daytime_range, time_from, time_to, kind,
+                              with_body=with_body)
+
+    def search_body(self, query: str, with_body: bool = True) -> AsyncIterator[Note]:
+        return self.__iterate(self.__repo.search_body, query, with_body=with_body)
+
+    # update
+
+    async def update_note(self, note: Note,
+                          expected_last_change_date: Optional[datetime] = None) -> bool:
+        if note is None:
+            raise TypeError(note)
+        self.__reads.pop(note.id, None)
+        return await self.__call(self.__repo.update_note, note, expected_last_change_date)
+
+    async def update_many(self, notes: Sequence[Note]) -> list[bool]:
+        for note in notes:
+            if note is not None:
+                self.__reads.pop(note.id, None)
+        return await self.__call(self.__repo.update_many, notes)
+
+    # delete
+
+    async def delete_note(self, note_id: int,
+                          expected_last_change_date: Optional[datetime] = None) -> bool:
+        self.__reads.pop(note_id, None)
+        return await self.__call(self.__repo.delete_note, note_id, expected_last_change_date)
+
+    async def delete_many(self, note_ids: Sequence[int]) -> list[bool]:
+        for note_id in note_ids:
+            self.__reads.pop(note_id, None)
+        return await self.__call(self.__repo.delete_many, note_ids)
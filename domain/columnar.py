@@ -0,0 +1,134 @@
+import sys
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from .entities import DATE_ATTRIBUTES, SORT_KEYS, LazyNote, Note
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000
+
+
+def to_epoch_us(dt: datetime) -> int:
+    return (dt - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(us: int) -> datetime:
+    return EPOCH + us * MICROSECOND
+
+
+class NoteColumns:
+    """Поколоночное представление набора заметок для фильтрации
+    и сортировки без создания объектов Note на каждую строку.\n
+    id и метки времени (микросекунды от EPOCH) хранятся в массивах
+    array('q'), заголовки - в списке интернированных строк, текст
+    не хранится вовсе. Выборки по диапазонам и сортировка возвращают
+    номера строк; при наличии NumPy они выполняются векторно.
+    Объекты заметок создаются только для запрошенных строк (row/rows),
+    а их текст загружается функцией body_loader по id при обращении.
+    """
+
+    def __init__(self, notes: Iterable[Note], body_loader: Callable[[int], str]) -> None:
+        self.__body_loader = body_loader
+        self.__ids = array('q')
+        self.__columns = {attribute: array('q') for attribute in DATE_ATTRIBUTES}
+        self.__titles: list[str] = []
+        creation_dates = self.__columns['creation_date']
+        last_change_dates = self.__columns['last_change_date']
+        for note in notes:
+            assert note.id is not None
+            self.__ids.append(note.id)
+            creation_dates.append(to_epoch_us(note.creation_date))
+            last_change_dates.append(to_epoch_us(note.last_change_date))
+            self.__titles.append(sys.intern(note.title))
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    # rows
+
+    def row(self, row: int) -> Note:
+        id = self.__ids[row]
+        return LazyNote(id,
+                        from_epoch_us(self.__columns['creation_date'][row]),
+                        from_epoch_us(self.__columns['last_change_date'][row]),
+                        self.__titles[row],
+                        lambda: self.__body_loader(id))
+
+    def rows(self, rows: Optional[Sequence[int]] = None) -> Iterator[Note]:
+        """Заметки для строк rows (по умолчанию - все в исходном порядке)."""
+        if rows is None:
+            rows = range(len(self))
+        return map(self.row, rows)
+
+    # filtering
+
+    def select_date_range(self, attribute: str,
+                          date_from: date, date_to: date) -> Sequence[int]:
+        """Номера строк, у которых дата атрибута attribute
+        лежит в диапазоне [date_from, date_to]."""
+        return self.__select_range(
+            self.__column(attribute),
+            to_epoch_us(datetime.combine(date_from, time.min)),
+            to_epoch_us(datetime.combine(date_to, time.max)))
+
+    def select_daytime_range(self, attribute: str,
+                             time_from: time, time_to: time) -> Sequence[int]:
+        """Номера строк, у которых время суток атрибута attribute
+        лежит в диапазоне [time_from, time_to] (при time_to < time_from
+        диапазон переходит через полночь)."""
+        column = self.__column(attribute)
+        lo = to_epoch_us(datetime.combine(EPOCH, time_from))
+        hi = to_epoch_us(datetime.combine(EPOCH, time_to))
+        wraps = hi < lo
+        if np is not None:
+            daytime = np.frombuffer(column, dtype=np.int64) % MICROSECONDS_PER_DAY
+            mask = (daytime >= lo) | (daytime <= hi) if wraps \
+                else (daytime >= lo) & (daytime <= hi)
+            return np.flatnonzero(mask).tolist()
+        if wraps:
+            return [i for i, us in enumerate(column)
+                    if us % MICROSECONDS_PER_DAY >= lo or us % MICROSECONDS_PER_DAY <= hi]
+        return [i for i, us in enumerate(column)
+                if lo <= us % MICROSECONDS_PER_DAY <= hi]
+
+    def __select_range(self, column: array, lo: int, hi: int) -> Sequence[int]:
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.int64)
+            return np.flatnonzero((values >= lo) & (values <= hi)).tolist()
+        return [i for i, us in enumerate(column) if lo <= us <= hi]
+
+    # sorting
+
+    def argsort(self, key: str, reverse: bool = False,
+                rows: Optional[Sequence[int]] = None) -> Sequence[int]:
+        """Номера строк (всех или из rows) в порядке сортировки
+        по атрибуту key ('creation_date', 'last_change_date' или 'title')."""
+        if key not in SORT_KEYS:
+            raise ValueError(key)
+        if rows is None:
+            rows = range(len(self))
+
+        if key == 'title':
+            return sorted(rows, key=self.__titles.__getitem__, reverse=reverse)
+
+        column = self.__columns[key]
+        if np is not None:
+            rows_arr = np.asarray(rows, dtype=np.int64)
+            values = np.frombuffer(column, dtype=np.int64)[rows_arr]
+            # при reverse равные значения сохраняют исходный порядок,
+            # как и в sorted(..., reverse=True)
+            order = np.argsort(-values if reverse else values, kind='stable')
+            return rows_arr[order].tolist()
+        return sorted(rows, key=column.__getitem__, reverse=reverse)
+
+    def __column(self, attribute: str) -> array:
+        if attribute not in DATE_ATTRIBUTES:
+            raise ValueError(attribute)
+        return self.__columns[attribute]
@@ -1,9 +1,15 @@
 import textwrap
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
+
+DATE_ATTRIBUTES = ('creation_date', 'last_change_date')
+# атрибуты, по которым можно упорядочить заметки
+SORT_KEYS = DATE_ATTRIBUTES + ('title',)
 
 
 class Note:
+    __slots__ = ('id', 'creation_date', 'last_change_date', 'title', 'body')
+
     def __init__(self, id: Optional[int], creation_date: datetime, last_change_date: datetime,  title: str,  body: str) -> None:
         self.id = id
         self.creation_date = creation_date
@@ -17,3 +23,63 @@ class Note:
                 f"\nChanged: {self.last_change_date}"
                 f"\n\"{self.body}\""
                 )
+
+
+class LazyNote(Note):
+    """Заметка с отложенной загрузкой текста: body загружается
+    функцией body_loader при первом обращении к нему.
+    Используется для выборок, которым достаточно заголовка и дат.
+    """
+    __slots__ = ('_body', '_body_loader')
+
+    def __init__(self, id: Optional[int], creation_date: datetime, last_change_date: datetime,  title: str,
+                 body_loader: Callable[[], str]) -> None:
+        self.id = id
+        self.creation_date = creation_date
+        self.last_change_date = last_change_date
+        self.title = title
+        self._body: Optional[str] = None
+        self._body_loader: Optional[Callable[[], str]] = body_loader
+
+    @property
+    def body(self) -> str:
+        if self._body_loader is not None:
+            self._body = self._body_loader()
+            self._body_loader = None
+        assert self._body is not None
+        return self._body
+
+    @body.setter
+    def body(self, value: str):
+        self._body = value
+        self._body_loader = None
+
+    @property
+    def is_body_loaded(self) -> bool:
+        return self._body_loader is None
+
+    def __copy__(self) -> 'LazyNote':
+        # копирование по умолчанию прочитало бы body и загрузило текст
+        clone = LazyNote(self.id, self.creation_date, self.last_change_date, self.title,
+                         self._body_loader)  # type: ignore
+        clone._body = self._body
+        return clone
+
+
+class NoteConflictError(Exception):
+    """Заметка изменена другим писателем: время её последнего изменения
+    в хранилище отличается от ожидаемого (оптимистическая проверка
+    при изменении и удалении, см. NotesRepository.update_note)."""
+
+    def __init__(self, id: int, expected: datetime, actual: Optional[datetime]) -> None:
+        super().__init__(f"Note {id} was changed at {actual}, expected {expected}")
+        self.id = id
+        self.expected = expected
+        self.actual = actual
+
+    @staticmethod
+    def check(id: int, expected: Optional[datetime], actual: Optional[datetime]):
+        """Ничего не делает, если expected не задано или совпадает с actual
+        (None - заметка удалена)."""
+        if expected is not None and actual != expected:
+            raise NoteConflictError(id, expected, actual)
@@ -1,26 +1,129 @@
+import contextlib
+import copy
+import fnmatch
+import functools
+import itertools
 import json
+import os
 import pathlib
+import re
+import time
 import warnings
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor,
+                                wait)
 from datetime import datetime
-from typing import Iterator, Optional
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Sequence, TypeVar
 
-from .entities import Note
+from . import metrics
+from .entities import LazyNote, Note, NoteConflictError
+from .idseq import IdSequence
+from .journal import JournalRecord, WriteAheadJournal, sync_files
+from .locking import RecordLocks
 
+# заметка id хранится в файле note<id>.json (ширина id не ограничена)
+# в директории шарда notes/<id // SHARD_SIZE>: в шарде не более SHARD_SIZE
+# файлов, поэтому поиск и просмотр директорий не замедляются с ростом
+# числа заметок, а заметки, добавленные подряд, попадают в один шард
 FILENAME_BLANK = "note{}.json"
-FILENAME_DIGITS = 5
-FILENAME_FILTER = FILENAME_BLANK.format('?'*FILENAME_DIGITS)
-FILENAME_TEMPLATE = FILENAME_BLANK.format(f"{{0:0{FILENAME_DIGITS}d}}")
-FILENAME_ID_SLICE = slice(4, 4+FILENAME_DIGITS)
-NOTE_ATTRIBUTES = set(
-    vars(Note(None, datetime.min, datetime.min, "", "")).keys())
+FILENAME_PATTERN = re.compile(r"note([0-9]+)\.json")
+SHARDS_DIRNAME = "notes"
+SHARD_SIZE = 1000
+# плоская раскладка прежних версий: файлы note00001.json в самой директории
+# данных; они читаются наравне с шардами и переносятся в шарды
+# при изменении заметки или методом QueryableNotes.migrate_layout
+LEGACY_FILENAME_DIGITS = 5
+LEGACY_FILENAME_FILTER = FILENAME_BLANK.format('?'*LEGACY_FILENAME_DIGITS)
+LEGACY_FILENAME_TEMPLATE = FILENAME_BLANK.format(f"{{0:0{LEGACY_FILENAME_DIGITS}d}}")
+LEGACY_MAX_ID = 10**LEGACY_FILENAME_DIGITS - 1
+# новое содержимое файла заметки записывается во временный файл рядом
+# (не подпадающий под FILENAME_PATTERN) и атомарно подменяет прежний
+TEMP_FILENAME_BLANK = ".{}.tmp"
+TEMP_FILENAME_FILTER = TEMP_FILENAME_BLANK.format(FILENAME_BLANK.format('*'))
+# файл блокировок заметок (байт с номером id - блокировка заметки id)
+LOCKS_FILENAME = ".locks"
+NOTE_ATTRIBUTES = set(Note.__slots__)
+NOTE_HEADER_ATTRIBUTES = NOTE_ATTRIBUTES - {'id', 'body'}
 ENCODING = 'UTF-8'
+# текст заметки кодируется последним, поэтому для чтения заголовка
+# и дат достаточно прочитать начало файла до ключа body
+BODY_KEY = b'"body":'
+HEADER_CHUNK_SIZE = 1024
+# параллельный просмотр: файлы читаются порциями по SCAN_CHUNK_SIZE,
+# на каждый поток запрашивается наперёд SCAN_WINDOW_PER_WORKER порций
+SCAN_CHUNK_SIZE = 32
+SCAN_WINDOW_PER_WORKER = 4
+# перестроение каталога в пуле процессов: минимальное число файлов,
+# ради которого стоит запускать процессы, и размер порций
+PROCESS_SCAN_MIN_FILES = 2000
+PROCESS_SCAN_MIN_CHUNK = 256
+PROCESS_SCAN_CHUNKS_PER_WORKER = 4
+# число потоков, просматривающих изменившиеся директории шардов
+SHARD_SCAN_WORKERS = 4
+# перенос плоской раскладки в шарды: заметок в пакете
+MIGRATION_BATCH_SIZE = 1000
+
+
+class CatalogEntry(NamedTuple):
+    """Запись каталога: заметка (с отложенной загрузкой текста)
+    и отметка состояния её файла."""
+    mtime_ns: int
+    size: int
+    note: Note
+
+
+class FileState(NamedTuple):
+    path: pathlib.Path
+    stat: os.stat_result
+
+
+class ScanDir(NamedTuple):
+    """Директория с файлами заметок: шард с номером shard или (shard None)
+    сама директория данных с файлами плоской раскладки; mtime_ns - на момент
+    просмотра (None - директория удалена)."""
+    path: pathlib.Path
+    shard: Optional[int]
+    mtime_ns: Optional[int]
 
 
 class QueryableNotes:
-    """Класс для низкоуровневой работы с файловой БД (только базовые CRUD).
+    """Класс для низкоуровневой работы с файловой БД (только базовые CRUD).\n
+    Заголовки и даты заметок хранятся в каталоге в памяти
+    (текст загружается из файла лишь при обращении к нему): каталог строится
+    при первом полном чтении, поддерживается методами add/update/delete,
+    а изменения файлов извне обнаруживаются по mtime и размеру файла
+    (перечитываются только изменившиеся файлы).\n
+    Файлы заметок разложены по директориям шардов (см. SHARD_SIZE);
+    при согласовании каталога список файлов перечитывается только
+    у шардов, изменившихся по mtime директории (несколько шардов -
+    параллельно), а у файлов остальных шардов, уже внесённых в каталог,
+    проверяются mtime и размер (файл мог быть перезаписан на месте).
+    Директории плоской раскладки прежних версий используются без
+    остановки работы: их файлы читаются наравне с шардами и переносятся
+    в шарды (см. migrate_layout).\n
+    Файлы заметок не перезаписываются на месте: новое содержимое пишется
+    во временный файл, который затем переименовывается. Сохранность
+    обеспечивается журналом упреждающей записи (см. WriteAheadJournal):
+    одиночные и пакетные изменения подтверждаются одним fsync журнала
+    на группу, а при открытии директории после сбоя журнал проигрывается.\n
+    Одновременная запись из нескольких процессов согласуется
+    рекомендательными блокировками: выделение id - коротким захватом
+    файла счётчика (см. IdSequence), добавление, изменение и удаление -
+    блокировками отдельных заметок (см. RecordLocks), поэтому писатели,
+    изменяющие разные заметки, не ждут друг друга. update и delete
+    с параметром expected_last_change_date дополнительно проверяют,
+    что заметка не была изменена с момента её чтения (иначе -
+    NoteConflictError).
     """
 
-    def __init__(self, path_str) -> None:
+    def __init__(self, path_str, scan_workers: int = 0, scan_processes: int = 0,
+                 journal: bool = True) -> None:
+        """scan_workers - число потоков для чтения файлов при полном
+        просмотре (0 - последовательное чтение),
+        scan_processes - число процессов для декодирования файлов
+        при перестроении каталога (0 - без пула процессов),
+        journal - вести журнал упреждающей записи (False - файлы
+        устанавливаются без гарантии сохранности при сбое)."""
         path = pathlib.Path(path_str)
         if path.exists():
             if not path.is_dir():
@@ -30,156 +133,955 @@ class QueryableNotes:
             path.mkdir(parents=True)
 
         self.__path = path
+        self.__shards_path = path.joinpath(SHARDS_DIRNAME)
+        self.__scan_workers = scan_workers
+        self.__scan_processes = scan_processes
+        self.__catalog: dict[int, CatalogEntry] = {}
+        # mtime директорий (шардов и директории данных) на момент
+        # их последнего согласования с каталогом
+        self.__dir_mtimes: dict[pathlib.Path, int] = {}
+        self.__shards: dict[int, pathlib.Path] = {}
+        self.__shards_mtime_ns: Optional[int] = None
+        # id заметок каталога, файлы которых лежат в плоской раскладке
+        self.__legacy_ids: set[int] = set()
+        self.__external_changes: set[int] = set()
+        self.__id_sequence = IdSequence(path, self.__scan_max_id,
+                                        lambda id: self.__find_path(id) is not None)
+        self.__locks = RecordLocks(path.joinpath(LOCKS_FILENAME))
+        self.__journal: Optional[WriteAheadJournal] = None
+        if journal:
+            self.__journal = WriteAheadJournal(path, self.__note_paths)
+            self.__recover()
+
+    def __recover(self):
+        """Проигрывает журнал, оставшийся после сбоя, и удаляет
+        недописанные временные файлы."""
+        assert self.__journal is not None
+        temp_paths = itertools.chain(self.__path.glob(TEMP_FILENAME_FILTER),
+                                     self.__shards_path.glob(f"*/{TEMP_FILENAME_FILTER}"))
+        for temp_path in temp_paths:
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+
+        self.__journal.recover(self.__install_record)
+
+    def __install_record(self, id: int, text: Optional[str]):
+        entry_path = self.__id_to_path(id)
+        if text is None:
+            entry_path.unlink(missing_ok=True)
+        else:
+            install_file(entry_path, text)
+        # файл плоской раскладки с тем же id устарел
+        legacy_path = self.__legacy_path(id)
+        if legacy_path is not None:
+            legacy_path.unlink(missing_ok=True)
+
+    def __journaled(self, records: Iterable[JournalRecord]):
+        """Контекст установки файлов: записи предварительно сохраняются
+        в журнале (если он ведётся)."""
+        if self.__journal is None:
+            return contextlib.nullcontext()
+        return self.__journal.write(records)
 
-    def __get_filepaths(self):
-        """Генератор выдаёт пути без сортировки по имени,
-        а в соответствии с их физическим расположением (см. ls -Ul)."""
-        return pathlib.Path(self.__path).glob(FILENAME_FILTER)
+    def __scan_max_id(self) -> int:
+        """Наибольший id среди файлов заметок: достаточно просмотреть
+        файлы плоской раскладки и последний непустой шард."""
+        max_id = max((id for id, _ in scan_notes_dir(self.__path, legacy=True)), default=0)
+        shards = list_shards(self.__shards_path)
+        for shard in sorted(shards, reverse=True):
+            found = scan_notes_dir(shards[shard])
+            if found:
+                return max(max_id, max(id for id, _ in found))
+        return max_id
 
     def __get_next_id(self):
-        filepaths = self.__get_filepaths()
-        id = max(map(lambda p: filename_to_id(p.name), filepaths), default=0)
-        return id + 1
+        return self.__id_sequence.allocate()[0]
+
+    def __id_to_path(self, id: int) -> pathlib.Path:
+        return note_path(self.__path, id)
+
+    def __note_paths(self, id: int) -> list[pathlib.Path]:
+        """Пути, по которым может находиться файл заметки id."""
+        legacy_path = self.__legacy_path(id)
+        entry_path = self.__id_to_path(id)
+        return [entry_path] if legacy_path is None else [entry_path, legacy_path]
+
+    def __shard_path(self, shard: int) -> pathlib.Path:
+        return self.__shards_path.joinpath(str(shard))
+
+    def __legacy_path(self, id: int) -> Optional[pathlib.Path]:
+        if id > LEGACY_MAX_ID:
+            return None
+        return self.__path.joinpath(LEGACY_FILENAME_TEMPLATE.format(id))
+
+    def __stat_note(self, id: int) -> Optional[FileState]:
+        """Находит файл заметки: в шарде, иначе - в плоской раскладке
+        (шард проверяется повторно, если файл перенесли между проверками)."""
+        entry_path = self.__id_to_path(id)
+        legacy_path = self.__legacy_path(id)
+        paths = (entry_path,) if legacy_path is None else (entry_path, legacy_path, entry_path)
+        for path in paths:
+            try:
+                return FileState(path, path.stat())
+            except FileNotFoundError:
+                pass
+        return None
+
+    def __find_path(self, id: int) -> Optional[pathlib.Path]:
+        state = self.__stat_note(id)
+        return state.path if state is not None else None
+
+    def __locate_for_write(self, id: int) -> Optional[pathlib.Path]:
+        """Путь файла существующей заметки для записи (вызывается
+        под блокировкой заметки): файл плоской раскладки предварительно
+        переносится в шард; None - заметки нет."""
+        entry_path = self.__id_to_path(id)
+        if entry_path.exists() or self.__migrate_note(id):
+            return entry_path
+        return None
+
+    def __migrate_note(self, id: int) -> bool:
+        """Переносит файл заметки плоской раскладки в шард (вызывается
+        под блокировкой заметки). Если в шарде файл уже есть (записан
+        при проигрывании журнала), прежний файл устарел и удаляется.
+        Возвращает True, если файл перенесён."""
+        legacy_path = self.__legacy_path(id)
+        if legacy_path is None or not legacy_path.exists():
+            return False
+        entry_path = self.__id_to_path(id)
+        try:
+            if entry_path.exists():
+                legacy_path.unlink()
+                moved = False
+            else:
+                entry_path.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(legacy_path, entry_path)
+                moved = True
+        except FileNotFoundError:
+            return False
+
+        self.__legacy_ids.discard(id)
+        catalog_entry = self.__catalog.get(id)
+        if moved and catalog_entry is not None:
+            # переименование сохраняет mtime и размер файла
+            self.__catalog[id] = catalog_entry._replace(
+                note=self.__make_lazy(catalog_entry.note, entry_path))
+        return moved
 
     def __write_json(self, entry: Note, entry_path: pathlib.Path):
         assert entry is not None
         assert entry_path is not None
-        with entry_path.open('w', encoding=ENCODING) as file:
-            json.dump(entry,
-                      file,
-                      ensure_ascii=False,
-                      indent=2,
-                      default=encode_note
-                      )
+        assert entry.id is not None
+        text = encode_note_text(entry)
+        with self.__journaled(((entry.id, text),)):
+            install_file(entry_path, text)
+
+    def __write_json_many(self, entries: Sequence[tuple[Note, pathlib.Path]]) -> list[bool]:
+        """Записывает пакет заметок с одним подтверждением журнала
+        (или, если журнал не ведётся, со сбросом на диск записанных файлов)."""
+        texts = [encode_note_text(entry) for entry, _ in entries]
+        results = []
+        with self.__journaled((entry.id, text) for (entry, _), text in zip(entries, texts)):
+            for (entry, entry_path), text in zip(entries, texts):
+                try:
+                    install_file(entry_path, text)
+                    results.append(True)
+                except Exception:
+                    warnings.warn(
+                        f"Ошибка: Не удалось записать файл заметки {entry_path.name}.")
+                    results.append(False)
+        if self.__journal is None:
+            sync_files(entry_path for (_, entry_path), ok in zip(entries, results) if ok)
+        return results
 
+    def __unlink(self, id: int, entry_path: pathlib.Path):
+        with self.__journaled(((id, None),)):
+            entry_path.unlink()
+
+    @metrics.timed('fsdb.read_json')
     def __read_json(self, entry_path: pathlib.Path) -> Optional[Note]:
-        with entry_path.open('r', encoding=ENCODING) as file:
-            return json.load(file, object_hook=decode_note)
+        with entry_path.open('rb') as file:
+            data = file.read()
+        metrics.bytes_read(len(data))
+        return json.loads(data.decode(ENCODING), object_hook=decode_note)
 
-    def add(self, entry: Note) -> Optional[Note]:
-        if entry is None:
-            raise TypeError(entry)
+    def __read_header(self, entry_path: pathlib.Path, id: int) -> Optional[Note]:
+        """Читает только заголовок и даты заметки; текст будет загружен
+        при первом обращении к нему."""
+        creation_date, last_change_date, title = read_note_header(entry_path)
+        return self.__make_header_note(id, creation_date, last_change_date, title, entry_path)
 
-        id = self.__get_next_id()
-        entry.id = id
-        filename = id_to_filename(id)
-        entry_path = self.__path.joinpath(filename)
-        assert not entry_path.exists()
+    def __make_header_note(self, id: int, creation_date: datetime, last_change_date: datetime,
+                           title: str, entry_path: pathlib.Path) -> Note:
+        return LazyNote(id, creation_date, last_change_date, title,
+                        functools.partial(self.__read_body, entry_path, id))
+
+    def __read_body(self, entry_path: pathlib.Path, id: int) -> str:
         try:
-            self.__write_json(entry, entry_path)
-            return entry
+            try:
+                entry = self.__read_json(entry_path)
+            except FileNotFoundError:
+                # файл перенесён в шард после чтения заголовка
+                moved_path = self.__find_path(id)
+                if moved_path is None or moved_path == entry_path:
+                    raise
+                entry = self.__read_json(moved_path)
+            if entry is not None:
+                return entry.body
+        except Exception:
+            pass
+        warnings.warn(f"Ошибка: Не удалось прочитать текст заметки {id}.")
+        return ''
+
+    def __make_lazy(self, entry: Note, entry_path: pathlib.Path) -> Note:
+        assert entry.id is not None
+        return self.__make_header_note(entry.id, entry.creation_date, entry.last_change_date,
+                                       entry.title, entry_path)
+
+    def __catalog_put(self, entry: Note, entry_path: pathlib.Path):
+        assert entry.id is not None
+        stat = entry_path.stat()
+        self.__catalog[entry.id] = CatalogEntry(
+            stat.st_mtime_ns, stat.st_size, self.__make_lazy(entry, entry_path))
+
+    def __changed_dirs(self) -> list[ScanDir]:
+        """Директории, изменившиеся (по mtime) с последнего согласования
+        с каталогом: директория данных (плоская раскладка) и шарды,
+        в т.ч. удалённые (с mtime_ns None). Список шардов перечитывается,
+        только если изменилась директория шардов."""
+        dirs = []
+        mtime_ns = get_mtime_ns(self.__path)
+        if self.__dir_mtimes.get(self.__path) != mtime_ns:
+            dirs.append(ScanDir(self.__path, None, mtime_ns))
+
+        shards_mtime_ns = get_mtime_ns(self.__shards_path)
+        if self.__shards_mtime_ns != shards_mtime_ns:
+            # удалённые шарды остаются в списке до согласования
+            self.__shards.update(list_shards(self.__shards_path))
+            self.__shards_mtime_ns = shards_mtime_ns
+        for shard, shard_path in self.__shards.items():
+            mtime_ns = get_mtime_ns(shard_path)
+            if mtime_ns is None or self.__dir_mtimes.get(shard_path) != mtime_ns:
+                dirs.append(ScanDir(shard_path, shard, mtime_ns))
+        return dirs
+
+    def __list_dirs(self, dirs: list[ScanDir]) -> list[list[tuple[int, FileState]]]:
+        """Просматривает директории; несколько директорий - в пуле потоков."""
+        def scan(scan_dir: ScanDir):
+            return scan_notes_dir(scan_dir.path, legacy=scan_dir.shard is None)
+
+        if len(dirs) < 2:
+            return list(map(scan, dirs))
+        workers = min(len(dirs), self.__scan_workers or SHARD_SCAN_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="notes-shards") as executor:
+            return list(executor.map(scan, dirs))
+
+    @metrics.timed('fsdb.scan_directory')
+    def __scan_directory(self, dirs: Optional[list[ScanDir]] = None) \
+            -> tuple[list[ScanDir], list[tuple[int, Optional[FileState]]]]:
+        """Просматривает изменившиеся директории (по умолчанию - см.
+        __changed_dirs) без чтения файлов: удаляет из каталога записи
+        исчезнувших файлов и возвращает просмотренные директории и план
+        чтения - пары (id, состояние файла) в порядке расположения файлов;
+        состояние None у неизменившихся файлов (по mtime и размеру),
+        которые повторно читать не нужно. Из непросмотренных директорий
+        в план входят лишь файлы каталога, изменившиеся на месте
+        (см. __stale_entries).
+        """
+        if dirs is None:
+            dirs = self.__changed_dirs()
+        catalog = self.__catalog
+        # файл, перенесённый в шард во время просмотра, может встретиться
+        # дважды: директория данных просматривается первой, шард - позже
+        found: dict[int, FileState] = {}
+        expected_ids = set()
+        scans_legacy = False
+        for scan_dir, listing in zip(dirs, self.__list_dirs(dirs)):
+            if scan_dir.shard is None:
+                scans_legacy = True
+                expected_ids.update(self.__legacy_ids)
+            else:
+                first_id = scan_dir.shard * SHARD_SIZE
+                expected_ids.update(id for id in range(first_id, first_id + SHARD_SIZE)
+                                    if id in catalog and id not in self.__legacy_ids)
+            found.update(listing)
+
+        plan = []
+        for id, state in found.items():
+            catalog_entry = catalog.get(id)
+            if catalog_entry is not None and is_same_state(catalog_entry, state.stat):
+                plan.append((id, None))
+            else:
+                self.__external_changes.add(id)
+                plan.append((id, state))
+
+        scanned_paths = {scan_dir.path for scan_dir in dirs}
+        for id, state in self.__stale_entries(scanned_paths):
+            if id in found:
+                continue
+            self.__external_changes.add(id)
+            plan.append((id, state))
+
+        for id in expected_ids - found.keys():
+            if id in self.__legacy_ids and self.__id_to_path(id).exists():
+                # перенесён в шард, который не изменился с просмотра
+                continue
+            if catalog.pop(id, None) is not None:
+                self.__external_changes.add(id)
+
+        if scans_legacy:
+            self.__legacy_ids = {id for id, state in found.items()
+                                 if state.path.parent == self.__path}
+
+        return dirs, plan
+
+    def __stale_entries(self, scanned_paths: set[pathlib.Path]) -> list[tuple[int, FileState]]:
+        """Файлы заметок каталога вне директорий scanned_paths, изменившиеся
+        по mtime или размеру: перезапись файла на месте не меняет mtime
+        директории. Исчезнувшие файлы пропускаются - их удаление
+        обнаруживается по mtime директории."""
+        stale = []
+        for id, catalog_entry in self.__catalog.items():
+            if id in self.__legacy_ids:
+                entry_path = self.__legacy_path(id)
+                assert entry_path is not None
+            else:
+                entry_path = self.__id_to_path(id)
+            if entry_path.parent in scanned_paths:
+                continue
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            if not is_same_state(catalog_entry, stat):
+                stale.append((id, FileState(entry_path, stat)))
+        return stale
+
+    def __mark_synced(self, dirs: list[ScanDir]):
+        """Отмечает директории согласованными с каталогом."""
+        for scan_dir in dirs:
+            if scan_dir.mtime_ns is not None:
+                self.__dir_mtimes[scan_dir.path] = scan_dir.mtime_ns
+                continue
+            self.__dir_mtimes.pop(scan_dir.path, None)
+            if scan_dir.shard is not None:
+                self.__shards.pop(scan_dir.shard, None)
+
+    @metrics.timed('fsdb.read_header')
+    def __load_entry(self, id: int, state: FileState) -> Optional[CatalogEntry]:
+        """Читает заголовок заметки; безопасно для вызова из разных потоков."""
+        try:
+            entry = self.__read_header(state.path, id)
+            if entry is not None:
+                return CatalogEntry(state.stat.st_mtime_ns, state.stat.st_size, entry)
 
         except Exception:
             warnings.warn(
-                f"Ошибка: Не удалось создать файл заметки {filename}.")
+                f"Ошибка: Не удалось прочитать заметку {id}.")
 
         return None
 
-    def queryAll(self) -> Iterator[Note]:
-        """Внимание: генератор выдаёт пути без сортировки по имени,
-        а в соответствии с их физическим расположением (см. ls -Ul)."""
-        filepaths = self.__get_filepaths()
-        # return NotesIterator(filepaths_gen)
+    def __apply_loaded(self, id: int, catalog_entry: Optional[CatalogEntry]):
+        if catalog_entry is None:
+            self.__catalog.pop(id, None)
+        else:
+            self.__catalog[id] = catalog_entry
 
-        def step():
-            nonlocal filepaths
-            while not (entry_path := next(filepaths)).is_file() or entry_path.stat().st_size == 0:
-                pass
-            id = filename_to_id(entry_path.name)
+    @metrics.timed('fsdb.sync_catalog')
+    def __sync_catalog(self, processes: int = 0, dirs: Optional[list[ScanDir]] = None):
+        """Сверяет каталог с содержимым изменившихся директорий: новые
+        и изменившиеся (по mtime и размеру) файлы перечитываются, записи
+        исчезнувших файлов удаляются. Неизменившиеся файлы повторно
+        не читаются.\n
+        processes - число процессов для декодирования; используется,
+        только если перечитать нужно не менее PROCESS_SCAN_MIN_FILES файлов.
+        """
+        dirs, plan = self.__scan_directory(dirs)
+        to_read = [(id, state) for id, state in plan if state is not None]
+        if processes > 0 and len(to_read) >= PROCESS_SCAN_MIN_FILES:
+            self.__load_in_processes(to_read, processes)
+        else:
+            for id, state in to_read:
+                self.__apply_loaded(id, self.__load_entry(id, state))
+
+        self.__mark_synced(dirs)
+
+    def __load_in_processes(self, to_read: list[tuple[int, FileState]], processes: int):
+        """Декодирует заголовки файлов порциями в пуле процессов.
+        Процессы возвращают компактные кортежи полей (а не объекты Note),
+        из которых заметки собираются в основном процессе."""
+        # пул процессов нужен редко, а его импорт заметно замедляет запуск
+        from concurrent.futures import ProcessPoolExecutor
+
+        states = dict(to_read)
+        chunk_size = max(PROCESS_SCAN_MIN_CHUNK,
+                         len(to_read) // (processes * PROCESS_SCAN_CHUNKS_PER_WORKER) + 1)
+        chunks = [[(id, str(state.path)) for id, state in to_read[i:i + chunk_size]]
+                  for i in range(0, len(to_read), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for decoded in executor.map(decode_headers_chunk, chunks):
+                for id, fields in decoded:
+                    state = states[id]
+                    if fields is None:
+                        warnings.warn(
+                            f"Ошибка: Не удалось прочитать заметку {id}.")
+                        self.__apply_loaded(id, None)
+                        continue
+                    note = self.__make_header_note(id, *fields, state.path)
+                    self.__apply_loaded(id, CatalogEntry(
+                        state.stat.st_mtime_ns, state.stat.st_size, note))
+
+    def __query_parallel(self, workers: int, ordered: bool) -> Iterator[Note]:
+        """Согласует каталог, читая файлы пулом из workers потоков,
+        и выдаёт заметки по мере готовности порций (ordered=False) или
+        в порядке расположения файлов (ordered=True). Число одновременно
+        запрошенных чтений ограничено, поэтому память не растёт
+        с размером директории. Заметки неизменившихся директорий
+        выдаются из каталога сразу."""
+        dirs, plan = self.__scan_directory()
+        planned_ids = {id for id, _ in plan}
+        unchanged = [ce.note for id, ce in self.__catalog.items() if id not in planned_ids]
+        yield from map(copy.copy, unchanged)
+
+        def load(chunk: list[tuple[int, Optional[FileState]]]):
+            return [(id, state, self.__load_entry(id, state) if state else None)
+                    for id, state in chunk]
+
+        chunks = (plan[i:i + SCAN_CHUNK_SIZE]
+                  for i in range(0, len(plan), SCAN_CHUNK_SIZE))
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="notes-scan") as executor:
+            for loaded in bounded_map(executor, load, chunks,
+                                      workers * SCAN_WINDOW_PER_WORKER, ordered):
+                for id, state, catalog_entry in loaded:
+                    if state is not None:
+                        self.__apply_loaded(id, catalog_entry)
+                    catalog_entry = self.__catalog.get(id)
+                    if catalog_entry is not None:
+                        yield copy.copy(catalog_entry.note)
+
+        # каталог согласован полностью, только если выдача дочитана до конца
+        self.__mark_synced(dirs)
+
+    @contextlib.contextmanager
+    def __own_changes(self, ids: Iterable[int], legacy: bool = False):
+        """Контекст собственной записи заметок ids: изменение их шардов
+        (и директории данных, если legacy) не требует повторного
+        просмотра, если до записи директория была согласована с каталогом."""
+        dirs = {self.__shard_path(shard_of(id)) for id in ids}
+        if legacy:
+            dirs.add(self.__path)
+        mtimes_before = {dir: get_mtime_ns(dir) for dir in dirs}
+        try:
+            yield
+        finally:
+            for dir, mtime_ns in mtimes_before.items():
+                if mtime_ns is None or self.__dir_mtimes.get(dir) != mtime_ns:
+                    continue
+                mtime_ns = get_mtime_ns(dir)
+                if mtime_ns is not None:
+                    self.__dir_mtimes[dir] = mtime_ns
+
+    @metrics.timed('fsdb.refresh')
+    def refresh(self) -> set[int]:
+        """Согласует каталог с изменившимися (по mtime) директориями
+        шардов и файлами заметок (в т.ч. перезаписанными на месте)
+        и возвращает id заметок, изменённых или удалённых извне
+        с момента предыдущего вызова."""
+        self.__sync_catalog()
+        changes, self.__external_changes = self.__external_changes, set()
+        return changes
+
+    @metrics.timed('fsdb.add')
+    def add(self, entry: Note) -> Optional[Note]:
+        if entry is None:
+            raise TypeError(entry)
+
+        id = self.__get_next_id()
+        entry.id = id
+        filename = id_to_filename(id)
+        entry_path = self.__id_to_path(id)
+        with self.__locks.locked((id,)), self.__own_changes((id,)):
+            if entry_path.exists():
+                # файл создан в обход счётчика id
+                warnings.warn(
+                    f"Ошибка: Файл заметки {filename} уже существует.")
+                return None
             try:
-                entry = self.__read_json(entry_path)
-                if entry is None:
-                    return step()
-                entry.id = id
+                self.__write_json(entry, entry_path)
+                self.__catalog_put(entry, entry_path)
+                return entry
 
-            except Exception as e:
-                warnings.warn(f"Ошибка: Не удалось прочитать заметку {id}.")
-                # print(e)
-                return step()
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось создать файл заметки {filename}.")
 
-            return entry
+        return None
+
+    def reserve_ids(self, count: int) -> range:
+        """Резервирует непрерывный блок идентификаторов для пакетной вставки."""
+        return self.__id_sequence.allocate(count)
+
+    @metrics.timed('fsdb.queryAll')
+    def queryAll(self, workers: Optional[int] = None, ordered: bool = True,
+                 processes: Optional[int] = None) -> Iterator[Note]:
+        """Внимание: генератор выдаёт заметки без сортировки по имени файла,
+        а в порядке их появления в каталоге (при первом построении каталога
+        — в соответствии с физическим расположением файлов, см. ls -Ul).\n
+        Выдаются копии заметок, поэтому их изменение не затрагивает каталог.
+        Текст заметки читается из файла лишь при обращении к нему.\n
+        workers - число потоков для чтения файлов (по умолчанию - заданное
+        при создании scan_workers; 0 - последовательное чтение),
+        ordered - при параллельном чтении сохранять порядок файлов,
+        processes - число процессов для декодирования при перестроении
+        каталога (по умолчанию - заданное при создании scan_processes);
+        имеет приоритет над workers.
+        """
+        if processes is None:
+            processes = self.__scan_processes
+        if workers is None:
+            workers = self.__scan_workers
+        if workers > 0 and not processes:
+            return self.__query_parallel(workers, ordered)
 
-        return iter(step, None)
+        self.__sync_catalog(processes)
+        notes = [ce.note for ce in self.__catalog.values()]
+        return map(copy.copy, notes)
 
+    @metrics.timed('fsdb.get')
     def get(self, id: int) -> Optional[Note]:
         if id <= 0:
             raise ValueError(id)
 
-        filename = id_to_filename(id)
-        entry_path = self.__path.joinpath(filename)
-        if entry_path.exists():
-            try:
-                entry = self.__read_json(entry_path)
-                if entry is not None:
-                    entry.id = id
+        state = self.__stat_note(id)
+        if state is None:
+            if self.__catalog.pop(id, None) is not None:
+                self.__external_changes.add(id)
+            return None
+        entry_path, stat = state
 
-                return entry
+        catalog_entry = self.__catalog.get(id)
+        if catalog_entry is not None:
+            if is_same_state(catalog_entry, stat):
+                return copy.copy(catalog_entry.note)
+            self.__external_changes.add(id)
 
-            except Exception:
-                warnings.warn(f"Ошибка: Не удалось прочитать заметку {id}.")
+        try:
+            entry = self.__read_json(entry_path)
+            if entry is not None:
+                entry.id = id
+                self.__catalog[id] = CatalogEntry(
+                    stat.st_mtime_ns, stat.st_size, self.__make_lazy(entry, entry_path))
+
+            return entry
+
+        except Exception:
+            self.__catalog.pop(id, None)
+            warnings.warn(f"Ошибка: Не удалось прочитать заметку {id}.")
 
         return None
 
-    def update(self, entry: Note) -> bool:
+    @metrics.timed('fsdb.update')
+    def update(self, entry: Note, expected_last_change_date: Optional[datetime] = None) -> bool:
+        """expected_last_change_date - время изменения заметки, которое
+        должно быть в хранилище (значение на момент её чтения); если
+        заметку с тех пор изменили или удалили, ничего не записывается
+        и возбуждается NoteConflictError."""
         if entry is None:
             raise TypeError(entry)
         if entry.id is None or entry.id <= 0:
             raise ValueError(entry.id)
 
         filename = id_to_filename(entry.id)
-        entry_path = self.__path.joinpath(filename)
-        assert entry_path.exists()
-        try:
-            self.__write_json(entry, entry_path)
-            return True
+        with self.__locks.locked((entry.id,)), \
+                self.__own_changes((entry.id,), legacy=entry.id in self.__legacy_ids):
+            entry_path = self.__locate_for_write(entry.id)
+            if expected_last_change_date is not None:
+                NoteConflictError.check(
+                    entry.id, expected_last_change_date,
+                    self.__read_last_change_date(entry_path) if entry_path else None)
+            if entry_path is None:
+                warnings.warn(
+                    f"Ошибка: Не удалось обновить файл заметки {filename}.")
+                return False
+            try:
+                self.__write_json(entry, entry_path)
+                self.__catalog_put(entry, entry_path)
+                return True
 
-        except Exception:
-            warnings.warn(
-                f"Ошибка: Не удалось обновить файл заметки {filename}.")
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось обновить файл заметки {filename}.")
 
         return False
 
-    def delete(self, id: int) -> Optional[Note]:
+    def __read_last_change_date(self, entry_path: pathlib.Path) -> Optional[datetime]:
+        """Время изменения заметки по её файлу (None - файла нет
+        или его не удалось прочитать)."""
+        try:
+            return read_note_header(entry_path)[1]
+        except Exception:
+            return None
+
+    @metrics.timed('fsdb.delete')
+    def delete(self, id: int, expected_last_change_date: Optional[datetime] = None) -> Optional[Note]:
+        """expected_last_change_date - см. update."""
         if id <= 0:
             raise ValueError(id)
 
-        filename = id_to_filename(id)
-        entry_path = self.__path.joinpath(filename)
-        if not entry_path.exists():
-            return None
+        with self.__locks.locked((id,)), \
+                self.__own_changes((id,), legacy=id in self.__legacy_ids):
+            entry_path = self.__find_path(id)
+            if entry_path is None:
+                NoteConflictError.check(id, expected_last_change_date, None)
+                return None
 
-        entry = None
-        try:
-            entry = self.__read_json(entry_path)
-            if entry is not None:
-                entry.id = id
+            entry = None
+            try:
+                entry = self.__read_json(entry_path)
+                if entry is not None:
+                    entry.id = id
 
-        except Exception:
-            warnings.warn(
-                f"Ошибка: Не удалось прочитать удаляемую заметку {id}.")
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось прочитать удаляемую заметку {id}.")
 
-        try:
-            entry_path.unlink()
+            NoteConflictError.check(id, expected_last_change_date,
+                                    entry.last_change_date if entry is not None else None)
 
-        except Exception:
-            warnings.warn(
-                f"Ошибка: Не удалось удалить файл заметки {id}.")
+            self.__catalog.pop(id, None)
+            self.__legacy_ids.discard(id)
+            try:
+                self.__unlink(id, entry_path)
+
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось удалить файл заметки {id}.")
 
         return entry
 
+    # batch
+
+    @metrics.timed('fsdb.add_many')
+    def add_many(self, entries: Sequence[Note]) -> list[Optional[Note]]:
+        """Пакетное добавление: блок id выделяется один раз, все файлы
+        подтверждаются одной группой записей журнала (одним fsync),
+        каталог обновляется после записи всего пакета.
+        Возвращает результат для каждой заметки (None - не удалось)."""
+        if not entries:
+            return []
+
+        ids = self.reserve_ids(len(entries))
+        to_write = []
+        for id, entry in zip(ids, entries):
+            entry.id = id
+            to_write.append((entry, self.__id_to_path(id)))
+        with self.__locks.locked(ids), self.__own_changes(ids):
+            try:
+                written = self.__write_json_many(to_write)
+            except Exception:
+                warnings.warn("Ошибка: Не удалось записать пакет заметок.")
+                return [None] * len(entries)
+
+            results: list[Optional[Note]] = []
+            for (entry, entry_path), ok in zip(to_write, written):
+                if ok:
+                    self.__catalog_put(entry, entry_path)
+                results.append(entry if ok else None)
+        return results
+
+    @metrics.timed('fsdb.update_many')
+    def update_many(self, entries: Sequence[Note]) -> list[bool]:
+        """Пакетное обновление (см. add_many)."""
+        if any(entry.id is None or entry.id <= 0 for entry in entries):
+            raise ValueError(entries)
+
+        results = [False] * len(entries)
+        positions = []
+        to_write = []
+        ids = [entry.id for entry in entries]
+        legacy = not self.__legacy_ids.isdisjoint(ids)
+        with self.__locks.locked(ids), self.__own_changes(ids, legacy):  # type: ignore
+            for pos, entry in enumerate(entries):
+                assert entry.id is not None
+                entry_path = self.__locate_for_write(entry.id)
+                if entry_path is not None:
+                    positions.append(pos)
+                    to_write.append((entry, entry_path))
+                else:
+                    warnings.warn(
+                        f"Ошибка: Не удалось обновить файл заметки {id_to_filename(entry.id)}.")
+            try:
+                written = self.__write_json_many(to_write)
+            except Exception:
+                warnings.warn("Ошибка: Не удалось записать пакет заметок.")
+                return results
+
+            for pos, (entry, entry_path), ok in zip(positions, to_write, written):
+                if ok:
+                    self.__catalog_put(entry, entry_path)
+                    results[pos] = True
+        return results
+
+    @metrics.timed('fsdb.delete_many')
+    def delete_many(self, ids: Sequence[int]) -> list[bool]:
+        """Пакетное удаление. В отличие от delete, удаляемые заметки
+        не читаются; для каждой возвращается признак успешного удаления."""
+        if any(id <= 0 for id in ids):
+            raise ValueError(ids)
+
+        results = []
+        legacy = not self.__legacy_ids.isdisjoint(ids)
+        with self.__locks.locked(ids), self.__own_changes(ids, legacy), \
+                self.__journaled((id, None) for id in ids):
+            for id in ids:
+                self.__catalog.pop(id, None)
+                self.__legacy_ids.discard(id)
+                entry_path = self.__find_path(id)
+                if entry_path is None:
+                    results.append(False)
+                    continue
+                try:
+                    entry_path.unlink()
+                    results.append(True)
+                except FileNotFoundError:
+                    results.append(False)
+                except Exception:
+                    warnings.warn(
+                        f"Ошибка: Не удалось удалить файл заметки {id}.")
+                    results.append(False)
+
+        if self.__journal is None:
+            sync_files(path for id in ids for path in self.__note_paths(id))
+        return results
+
+    @metrics.timed('fsdb.migrate_layout')
+    def migrate_layout(self, batch_size: int = MIGRATION_BATCH_SIZE, pause_s: float = 0) -> int:
+        """Переносит файлы плоской раскладки прежних версий в шарды,
+        не останавливая работу с директорией: файлы переименовываются
+        пакетами по batch_size под блокировками заметок, а остальные
+        процессы в это время находят заметки в любой из раскладок.
+        pause_s - пауза между пакетами (ограничивает нагрузку на диск).
+        Прерванный перенос продолжается повторным вызовом.
+        Возвращает число перенесённых заметок."""
+        if batch_size < 1:
+            raise ValueError(batch_size)
+
+        count = 0
+        while ids := sorted(id for id, _ in scan_notes_dir(self.__path, legacy=True)):
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                with self.__locks.locked(batch), self.__own_changes(batch, legacy=True):
+                    count += sum(self.__migrate_note(id) for id in batch)
+                if pause_s > 0:
+                    time.sleep(pause_s)
+        return count
+
+    def close(self):
+        if self.__journal is not None:
+            self.__journal.close()
+        self.__locks.close()
+
 
 # module utils
 
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def bounded_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T],
+                window: int, ordered: bool = True) -> Iterator[R]:
+    """Аналог Executor.map, который держит в работе не более window
+    заданий одновременно и может выдавать результаты по мере готовности
+    (ordered=False)."""
+    if window < 1:
+        raise ValueError(window)
+
+    if ordered:
+        queue: deque[Future] = deque()
+        for item in items:
+            queue.append(executor.submit(fn, item))
+            if len(queue) >= window:
+                yield queue.popleft().result()
+        while queue:
+            yield queue.popleft().result()
+        return
+
+    pending: set[Future] = set()
+    for item in items:
+        pending.add(executor.submit(fn, item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
 def id_to_filename(id: int) -> str:
-    return FILENAME_TEMPLATE.format(id)
+    return FILENAME_BLANK.format(id)
 
 
 def filename_to_id(filename: str) -> int:
-    try:
-        id_str = filename[FILENAME_ID_SLICE]
-        return int(id_str)
-    except:
+    """id по имени файла заметки (в т.ч. плоской раскладки)."""
+    match = FILENAME_PATTERN.fullmatch(filename)
+    if match is None:
         raise ValueError("Bad Note filename")
+    return int(match[1])
+
+
+def shard_of(id: int) -> int:
+    return id // SHARD_SIZE
+
+
+def note_path(path: pathlib.Path, id: int) -> pathlib.Path:
+    """Путь файла заметки id в директории данных path."""
+    return path.joinpath(SHARDS_DIRNAME, str(shard_of(id)), id_to_filename(id))
+
+
+def get_mtime_ns(path: pathlib.Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def list_shards(shards_path: pathlib.Path) -> dict[int, pathlib.Path]:
+    """Директории шардов: номер шарда - путь."""
+    shards = {}
+    try:
+        with os.scandir(shards_path) as dir_entries:
+            for dir_entry in dir_entries:
+                name = dir_entry.name
+                if name.isascii() and name.isdigit() and dir_entry.is_dir():
+                    shards[int(name)] = pathlib.Path(dir_entry.path)
+    except FileNotFoundError:
+        pass
+    return shards
+
+
+def scan_notes_dir(path: pathlib.Path, legacy: bool = False) -> list[tuple[int, FileState]]:
+    """Файлы заметок директории без их чтения: пары (id, состояние
+    файла) в порядке расположения файлов (см. ls -Ul); пустые файлы
+    пропускаются. legacy - только имена плоской раскладки."""
+    found = []
+    try:
+        with os.scandir(path) as dir_entries:
+            for dir_entry in dir_entries:
+                if legacy and not fnmatch.fnmatchcase(dir_entry.name, LEGACY_FILENAME_FILTER):
+                    continue
+                try:
+                    id = filename_to_id(dir_entry.name)
+                    if not dir_entry.is_file():
+                        continue
+                    stat = dir_entry.stat()
+                except (ValueError, OSError):
+                    continue
+                if stat.st_size > 0:
+                    found.append((id, FileState(pathlib.Path(dir_entry.path), stat)))
+    except FileNotFoundError:
+        pass
+    return found
+
+
+def read_note_files(path: pathlib.Path) -> Iterator[Note]:
+    """Читает заметки директории данных (в любой раскладке), ничего
+    в ней не изменяя: без журнала, блокировок и счётчика id (например,
+    для переноса заметок в другое хранилище). Записи журнала, оставшиеся
+    после сбоя, не проигрываются. Нечитаемые файлы пропускаются."""
+    found = dict(scan_notes_dir(path, legacy=True))
+    for shard_path in list_shards(path.joinpath(SHARDS_DIRNAME)).values():
+        found.update(scan_notes_dir(shard_path))
+    for id, state in found.items():
+        try:
+            with state.path.open('rb') as file:
+                entry = json.loads(file.read().decode(ENCODING), object_hook=decode_note)
+        except Exception:
+            warnings.warn(f"Ошибка: Не удалось прочитать заметку {id}.")
+            continue
+        entry.id = id
+        yield entry
+
+
+def has_note_files(path: pathlib.Path) -> bool:
+    """Есть ли в директории данных файлы заметок (в любой раскладке)."""
+    if scan_notes_dir(path, legacy=True):
+        return True
+    return any(scan_notes_dir(shard_path)
+               for shard_path in list_shards(path.joinpath(SHARDS_DIRNAME)).values())
+
+
+def read_note_header(entry_path: pathlib.Path) -> tuple[datetime, datetime, str]:
+    """Читает из файла заметки только даты и заголовок: файл читается
+    до ключа body (он кодируется последним). Если ключ не найден
+    или предшествующая ему часть не декодируется (например, файл
+    отредактирован вручную и ключи идут в другом порядке),
+    файл декодируется целиком."""
+    data = b''
+    with entry_path.open('rb') as file:
+        while chunk := file.read(HEADER_CHUNK_SIZE):
+            search_from = max(0, len(data) - len(BODY_KEY))
+            data += chunk
+            body_pos = data.find(BODY_KEY, search_from)
+            if body_pos >= 0:
+                try:
+                    header = decode_note_header(
+                        json.loads(data[:body_pos].rstrip().rstrip(b',') + b'}'))
+                except ValueError:
+                    data += file.read()
+                    break
+                metrics.bytes_read(len(data))
+                return header
+
+    metrics.bytes_read(len(data))
+    entry = json.loads(data.decode(ENCODING), object_hook=decode_note)
+    return entry.creation_date, entry.last_change_date, entry.title
+
+
+def decode_headers_chunk(chunk: list[tuple[int, str]]) \
+        -> list[tuple[int, Optional[tuple[datetime, datetime, str]]]]:
+    """Задание для пула процессов: декодирует заголовки порции файлов
+    [(id, путь)] в кортежи (id, (дата создания, дата изменения, заголовок))
+    или (id, None) при ошибке чтения."""
+    decoded = []
+    for id, path_str in chunk:
+        try:
+            decoded.append((id, read_note_header(pathlib.Path(path_str))))
+        except Exception:
+            decoded.append((id, None))
+    return decoded
+
+
+def install_file(entry_path: pathlib.Path, text: str):
+    """Атомарно устанавливает содержимое файла: текст записывается
+    во временный файл, который затем подменяет целевой (os.replace),
+    поэтому файл заметки никогда не бывает записан частично."""
+    temp_path = entry_path.with_name(TEMP_FILENAME_BLANK.format(entry_path.name))
+    data = text.encode(ENCODING)
+    try:
+        try:
+            file = temp_path.open('wb')
+        except FileNotFoundError:
+            # первая заметка шарда: директория создаётся при записи
+            temp_path.parent.mkdir(parents=True, exist_ok=True)
+            file = temp_path.open('wb')
+        with file:
+            file.write(data)
+        os.replace(temp_path, entry_path)
+        metrics.bytes_written(len(data))
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def is_same_state(catalog_entry: CatalogEntry, stat: os.stat_result) -> bool:
+    return (catalog_entry.mtime_ns == stat.st_mtime_ns
+            and catalog_entry.size == stat.st_size)
 
 
 def encode_note(obj: Note):
@@ -201,6 +1103,20 @@ def encode_note(obj: Note):
             f"Object of type '{type_name}' is not JSON serializable")
 
 
+def encode_note_text(entry: Note) -> str:
+    return json.dumps(entry, ensure_ascii=False, indent=2, default=encode_note)
+
+
+def decode_note_header(dct: dict) -> tuple[datetime, datetime, str]:
+    """Де-сериализация заголовка и дат заметки (JSON без текста)."""
+    if dct.keys() != NOTE_HEADER_ATTRIBUTES:
+        raise ValueError(
+            f"Deserialized dictionary {dct} does not correspond Note header")
+    return (datetime.fromisoformat(dct['creation_date']),
+            datetime.fromisoformat(dct['last_change_date']),
+            dct['title'])
+
+
 def decode_note(dct: dict):
     """Де-сериализация JSON в экземпляр Note
     (без инициализации атрибута id, поскольку он не кодируется в JSON,
@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import pathlib
+import re
+import warnings
+from typing import Iterable, Optional
+
+from .entities import Note
+
+SNAPSHOT_FILENAME = "fulltext.snapshot.json"
+JOURNAL_FILENAME = "fulltext.journal"
+JOURNAL_MIN_RECORDS_TO_COMPACT = 1000
+ENCODING = 'UTF-8'
+TOKEN_PATTERN = re.compile(r"\w+")
+# параметры ранжирования BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class FullTextIndex:
+    """Инвертированный индекс текста заметок с ранжированием BM25.\n
+    Индекс хранится рядом с данными: снимок (SNAPSHOT_FILENAME)
+    и журнал изменений (JOURNAL_FILENAME), в который каждая запись
+    дописывается инкрементально. При открытии снимок загружается,
+    а журнал проигрывается поверх него; когда журнал становится
+    больше снимка, он сворачивается в новый снимок.\n
+    Для каждой заметки запоминается отметка версии (время последнего
+    изменения), по которой reconcile находит устаревшие записи.
+    """
+
+    def __init__(self, dir_path: pathlib.Path) -> None:
+        self.__snapshot_path = dir_path.joinpath(SNAPSHOT_FILENAME)
+        self.__journal_path = dir_path.joinpath(JOURNAL_FILENAME)
+        self.__doc_terms: dict[int, dict[str, int]] = {}
+        self.__doc_lengths: dict[int, int] = {}
+        self.__stamps: dict[int, str] = {}
+        self.__postings: dict[str, dict[int, int]] = {}
+        self.__total_length = 0
+        self.__journal_records = 0
+
+        is_journal_intact = self.__load()
+        self.__journal = self.__journal_path.open('a', encoding=ENCODING)
+        if not is_journal_intact:
+            self.__write_snapshot()
+
+    def __len__(self) -> int:
+        return len(self.__doc_terms)
+
+    # persistence
+
+    def __load(self) -> bool:
+        """Загружает снимок и проигрывает журнал. Возвращает False,
+        если журнал оборван (недописанная при сбое запись)."""
+        if self.__snapshot_path.exists():
+            try:
+                with self.__snapshot_path.open('r', encoding=ENCODING) as file:
+                    for id, (stamp, terms) in json.load(file).items():
+                        self.__apply(int(id), stamp, terms)
+            except Exception:
+                warnings.warn("Ошибка: Не удалось прочитать снимок"
+                              " полнотекстового индекса, он будет перестроен.")
+                self.__clear()
+
+        if self.__journal_path.exists():
+            with self.__journal_path.open('r', encoding=ENCODING) as file:
+                for line in file:
+                    try:
+                        id, stamp, terms = json.loads(line)
+                    except ValueError:
+                        return False
+                    self.__apply(id, stamp, terms)
+                    self.__journal_records += 1
+
+        return True
+
+    def __clear(self):
+        self.__doc_terms.clear()
+        self.__doc_lengths.clear()
+        self.__stamps.clear()
+        self.__postings.clear()
+        self.__total_length = 0
+
+    def __write_journal(self, id: int, stamp: Optional[str],
+                        terms: Optional[dict[str, int]]):
+        self.__journal.write(json.dumps([id, stamp, terms], ensure_ascii=False))
+        self.__journal.write('\n')
+        self.__journal_records += 1
+
+    def flush(self):
+        """Сбрасывает журнал на диск, сворачивая его в снимок,
+        если он стал больше индексированных данных."""
+        self.__journal.flush()
+        if self.__journal_records > max(JOURNAL_MIN_RECORDS_TO_COMPACT, len(self)):
+            self.__write_snapshot()
+
+    def __write_snapshot(self):
+        tmp_path = self.__snapshot_path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding=ENCODING) as file:
+            json.dump({id: [self.__stamps[id], terms]
+                       for id, terms in self.__doc_terms.items()},
+                      file, ensure_ascii=False)
+        os.replace(tmp_path, self.__snapshot_path)
+        self.__journal.close()
+        self.__journal = self.__journal_path.open('w', encoding=ENCODING)
+        self.__journal_records = 0
+
+    # in-memory index
+
+    def __apply(self, id: int, stamp: Optional[str],
+                terms: Optional[dict[str, int]]):
+        old_terms = self.__doc_terms.pop(id, None)
+        if old_terms is not None:
+            for term in old_terms:
+                posting = self.__postings[term]
+                del posting[id]
+                if not posting:
+                    del self.__postings[term]
+            self.__total_length -= self.__doc_lengths.pop(id)
+            del self.__stamps[id]
+
+        if terms is None:
+            return
+
+        assert stamp is not None
+        self.__doc_terms[id] = terms
+        self.__stamps[id] = stamp
+        length = sum(terms.values())
+        self.__doc_lengths[id] = length
+        self.__total_length += length
+        for term, tf in terms.items():
+            self.__postings.setdefault(term, {})[id] = tf
+
+    # api
+
+    def insert(self, note: Note):
+        assert note.id is not None
+        terms: dict[str, int] = {}
+        for token in tokenize(note.body):
+            terms[token] = terms.get(token, 0) + 1
+        stamp = str(note.last_change_date)
+        self.__apply(note.id, stamp, terms)
+        self.__write_journal(note.id, stamp, terms)
+
+    def remove(self, id: int):
+        if id in self.__doc_terms:
+            self.__apply(id, None, None)
+            self.__write_journal(id, None, None)
+
+    def reconcile(self, notes: Iterable[Note]):
+        """Приводит индекс в соответствие с полным набором заметок:
+        переиндексируются только новые и изменившиеся (по отметке версии)
+        заметки, записи отсутствующих заметок удаляются."""
+        seen_ids = set()
+        for note in notes:
+            seen_ids.add(note.id)
+            if self.__stamps.get(note.id) != str(note.last_change_date):
+                self.insert(note)
+        for id in self.__doc_terms.keys() - seen_ids:
+            self.remove(id)
+        self.flush()
+
+    def search(self, query: str) -> list[tuple[int, float]]:
+        """Заметки, содержащие все слова запроса, в порядке убывания
+        релевантности (BM25): список пар (id, оценка)."""
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        postings = []
+        for term in query_terms:
+            posting = self.__postings.get(term)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        docs_count = len(self.__doc_terms)
+        avg_length = self.__total_length / docs_count if docs_count else 0
+        scores = []
+        for id in candidates:
+            length_norm = 1 - BM25_B + BM25_B * \
+                (self.__doc_lengths[id] / avg_length if avg_length else 0)
+            score = 0.0
+            for posting in postings:
+                df = len(posting)
+                idf = math.log(1 + (docs_count - df + 0.5) / (df + 0.5))
+                tf = posting[id]
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+            scores.append((id, score))
+
+        scores.sort(key=lambda p: (-p[1], p[0]))
+        return scores
+
+    def close(self):
+        self.flush()
+        self.__journal.close()
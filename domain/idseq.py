@@ -0,0 +1,51 @@
+import pathlib
+from typing import Callable
+
+from .locking import locked_open
+
+SEQUENCE_FILENAME = ".sequence"
+
+
+class IdSequence:
+    """Персистентный счётчик идентификаторов (high-water mark).\n
+    Хранит в небольшом файле рядом с данными последний выданный id,
+    поэтому выделение нового id не требует просмотра директории.
+    Полный просмотр (recover) выполняется, только если файл счётчика
+    отсутствует, повреждён или устарел (следующий id уже занят).
+    Выделение защищено блокировкой файла счётчика, что делает его
+    безопасным при одновременном добавлении из нескольких процессов.
+    """
+
+    def __init__(self, dir_path: pathlib.Path,
+                 recover: Callable[[], int],
+                 is_taken: Callable[[int], bool]) -> None:
+        """recover - возвращает максимальный занятый id полным просмотром,
+        is_taken - проверяет, занят ли данный id.
+        """
+        self.__path = dir_path.joinpath(SEQUENCE_FILENAME)
+        self.__recover = recover
+        self.__is_taken = is_taken
+
+    def allocate(self, count: int = 1) -> range:
+        """Выделяет непрерывный блок из count идентификаторов."""
+        if count < 1:
+            raise ValueError(count)
+
+        with locked_open(self.__path) as file:
+            last_id = self.__read_last_id(file.read())
+            if last_id is None or self.__is_taken(last_id + 1):
+                last_id = max(self.__recover(), last_id or 0)
+
+            file.seek(0)
+            file.truncate()
+            file.write(str(last_id + count))
+
+        return range(last_id + 1, last_id + count + 1)
+
+    @staticmethod
+    def __read_last_id(raw: str):
+        try:
+            last_id = int(raw.strip())
+        except ValueError:
+            return None
+        return last_id if last_id >= 0 else None
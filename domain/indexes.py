@@ -0,0 +1,146 @@
+import bisect
+from datetime import time
+from typing import Any, Iterable, Optional
+
+
+def seconds_of_day(t: time) -> float:
+    """Время суток в секундах с полуночи (с долями секунды)."""
+    return t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
+
+
+class SortedIndex:
+    """Вторичный индекс: отсортированный по ключу список пар (ключ, id)
+    и словарь id -> ключ для удаления и замены записей.\n
+    Выборка диапазона выполняется двумя двоичными поисками,
+    результат упорядочен по ключу (а при равных ключах - по id).
+    """
+
+    def __init__(self, items: Iterable[tuple[Any, int]] = ()) -> None:
+        """items - пары (id, ключ)."""
+        self.__keys: dict[int, Any] = dict(items)
+        self.__entries = sorted((key, id) for id, key in self.__keys.items())
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def insert(self, id: int, key):
+        if id in self.__keys:
+            self.remove(id)
+        self.__keys[id] = key
+        bisect.insort(self.__entries, (key, id))
+
+    def insert_many(self, items: Iterable[tuple[int, Any]]):
+        """Пакетная вставка пар (id, ключ): вместо вставки каждой пары
+        со сдвигом списка новые пары добавляются в конец, а список
+        пересортировывается (слияние отсортированных участков)."""
+        for id, key in items:
+            self.remove(id)
+            self.__keys[id] = key
+            self.__entries.append((key, id))
+        self.__entries.sort()
+
+    def ordered(self, reverse: bool = False,
+                offset: int = 0, limit: Optional[int] = None) -> list[int]:
+        """Идентификаторы в порядке ключа (reverse - в обратном),
+        начиная с позиции offset, не более limit штук: срез списка,
+        без просмотра остальных записей."""
+        stop = None if limit is None else offset + limit
+        if not reverse:
+            return [id for _, id in self.__entries[offset:stop]]
+        count = len(self.__entries)
+        lo = 0 if stop is None else max(0, count - stop)
+        hi = max(0, count - offset)
+        return [id for _, id in reversed(self.__entries[lo:hi])]
+
+    def remove(self, id: int):
+        key = self.__keys.pop(id, None)
+        if key is None:
+            return
+        pos = bisect.bisect_left(self.__entries, (key, id))
+        assert self.__entries[pos] == (key, id)
+        del self.__entries[pos]
+
+    def range(self, key_from, key_to) -> list[int]:
+        """Идентификаторы с ключами из диапазона [key_from, key_to]."""
+        lo = bisect.bisect_left(self.__entries, (key_from,))
+        hi = bisect.bisect_right(self.__entries, (key_to, float('inf')))
+        return [id for _, id in self.__entries[lo:hi]]
+
+    def wrapped_range(self, key_from, key_to) -> list[int]:
+        """Как range, но при key_to < key_from диапазон считается
+        циклическим: [key_from, максимум] + [минимум, key_to]
+        (например, время суток 22:00\u201402:00)."""
+        if key_from <= key_to:
+            return self.range(key_from, key_to)
+        lo = bisect.bisect_left(self.__entries, (key_from,))
+        hi = bisect.bisect_right(self.__entries, (key_to, float('inf')))
+        return [id for _, id in self.__entries[lo:]] \
+            + [id for _, id in self.__entries[:hi]]
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм заголовков (в нижнем регистре)
+    для поиска по вхождению подстроки.\n
+    Пересечение списков триграмм образца сужает множество кандидатов,
+    которые затем проверяются на точное вхождение. Образцы короче
+    трёх символов проверяются перебором заголовков, хранящихся в индексе
+    (без чтения заметок из хранилища).
+    """
+
+    N = 3
+
+    def __init__(self, items: Iterable[tuple[int, str]] = ()) -> None:
+        """items - пары (id, заголовок)."""
+        self.__titles: dict[int, str] = {}
+        self.__postings: dict[str, set[int]] = {}
+        for id, title in items:
+            self.insert(id, title)
+
+    def __len__(self) -> int:
+        return len(self.__titles)
+
+    def insert(self, id: int, title: str):
+        if id in self.__titles:
+            self.remove(id)
+        title = title.lower()
+        self.__titles[id] = title
+        for trigram in trigrams(title):
+            self.__postings.setdefault(trigram, set()).add(id)
+
+    def insert_many(self, items: Iterable[tuple[int, str]]):
+        for id, title in items:
+            self.insert(id, title)
+
+    def remove(self, id: int):
+        title = self.__titles.pop(id, None)
+        if title is None:
+            return
+        for trigram in trigrams(title):
+            posting = self.__postings[trigram]
+            posting.discard(id)
+            if not posting:
+                del self.__postings[trigram]
+
+    def search(self, sample: str) -> list[int]:
+        """Идентификаторы заметок, заголовки которых содержат sample
+        (без учёта регистра), в порядке возрастания."""
+        sample = sample.lower()
+        titles = self.__titles
+        if len(sample) < TrigramIndex.N:
+            candidates = titles.keys()
+        else:
+            postings = []
+            for trigram in trigrams(sample):
+                posting = self.__postings.get(trigram)
+                if not posting:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = set.intersection(*postings)
+
+        return sorted(id for id in candidates if sample in titles[id])
+
+
+def trigrams(text: str) -> set[str]:
+    n = TrigramIndex.N
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
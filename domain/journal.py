@@ -0,0 +1,234 @@
+import json
+import os
+import pathlib
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+from . import metrics
+from .locking import lock_file, try_lock_file, unlock_file
+
+JOURNAL_FILENAME = ".journal"
+# журнал сворачивается (контрольная точка), когда его размер превышает
+# JOURNAL_CHECKPOINT_SIZE байт и нет незавершённых установок файлов
+JOURNAL_CHECKPOINT_SIZE = 4 * 1024 * 1024
+ENCODING = 'UTF-8'
+
+# запись журнала: id и новое содержимое файла заметки (None - удаление)
+JournalRecord = tuple[int, Optional[str]]
+
+
+def sync_files(paths: Iterable[pathlib.Path]):
+    """Сбрасывает на диск содержимое файлов paths (отсутствующие
+    пропускаются) и записи их директорий - создание, переименование
+    и удаление файлов."""
+    dir_paths = set()
+    for path in paths:
+        dir_paths.add(path.parent)
+        fsync_path(path)
+    for dir_path in dir_paths:
+        sync_dir(dir_path)
+
+
+def sync_dir(dir_path: pathlib.Path):
+    """Сбрасывает на диск записи директории (создание, переименование
+    и удаление файлов); в Windows директорию нельзя открыть для fsync."""
+    if os.name != 'nt':
+        fsync_path(dir_path)
+
+
+def fsync_path(path: pathlib.Path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadJournal:
+    """Журнал упреждающей записи для файловой БД.\n
+    Перед установкой файлов заметок их новое содержимое (или признак
+    удаления) дописывается в журнал и сбрасывается на диск одним fsync
+    на группу записей: записи, поступившие из других потоков, пока
+    выполняется fsync, подтверждаются следующим общим fsync (group commit).
+    Сами файлы заметок после этого записываются без fsync.\n
+    Журнал сворачивается в контрольной точке: на диск сбрасываются файлы
+    заметок, упомянутых в журнале (см. sync_files), в т.ч. установленные
+    другими процессами, после чего журнал очищается. При открытии после сбоя записи журнала
+    проигрываются (см. recover), оборванная последняя запись отбрасывается.\n
+    Журнал может вестись одновременно несколькими процессами: на время
+    от записи группы до установки её файлов процесс удерживает разделяемую
+    блокировку файла журнала, а контрольная точка и восстановление -
+    исключительную, поэтому журнал не очищается, пока чужие записи
+    не установлены (контрольная точка в этом случае откладывается).
+    """
+
+    def __init__(self, dir_path: pathlib.Path,
+                 paths_of: Callable[[int], Iterable[pathlib.Path]],
+                 checkpoint_size: int = JOURNAL_CHECKPOINT_SIZE) -> None:
+        """paths_of - пути файлов, в которые устанавливаются записи
+        с данным id (сбрасываются на диск в контрольной точке)."""
+        self.__path = dir_path.joinpath(JOURNAL_FILENAME)
+        self.__paths_of = paths_of
+        self.__checkpoint_size = checkpoint_size
+        self.__lock = threading.Lock()
+        self.__synced = threading.Condition(self.__lock)
+        self.__file = self.__path.open('ab')
+        self.__size = self.__file.tell()
+        # номера групп: последняя дописанная и последняя сброшенная на диск
+        self.__written_group = 0
+        self.__synced_group = 0
+        self.__is_syncing = False
+        # число групп, подтверждённых, но ещё не установленных в файлы
+        self.__pending = 0
+
+    def recover(self, install: Callable[[int, Optional[str]], None]):
+        """Проигрывает записи журнала, оставшиеся после сбоя: для каждой
+        вызывает install(id, текст), после чего очищает журнал.
+        Выполняется под исключительной блокировкой журнала."""
+        with self.__lock:
+            lock_file(self.__file)
+            try:
+                for id, text in self.__replay():
+                    install(id, text)
+                self.__checkpoint(locked=True)
+            finally:
+                unlock_file(self.__file)
+
+    def __replay(self) -> list[JournalRecord]:
+        """Записи журнала (по одной - последней - на каждый id).
+        Оборванный хвост журнала отбрасывается."""
+        records: dict[int, Optional[str]] = {}
+        valid_size = 0
+        with self.__path.open('rb') as file:
+            for line in file:
+                record = decode_journal_record(line)
+                if record is None:
+                    break
+                id, text = record
+                records.pop(id, None)
+                records[id] = text
+                valid_size += len(line)
+
+        self.__size = self.__file.seek(0, os.SEEK_END)
+        if valid_size < self.__size:
+            self.__file.truncate(valid_size)
+            self.__size = valid_size
+        return list(records.items())
+
+    @contextmanager
+    def write(self, records: Iterable[JournalRecord]) -> Iterator[None]:
+        """Дописывает группу записей в журнал и дожидается их сохранения
+        на диске; в теле блока with записи устанавливаются в файлы.
+        По выходе из блока при необходимости выполняется контрольная точка."""
+        self.__commit(records)
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__pending -= 1
+                if self.__pending == 0:
+                    unlock_file(self.__file)
+                    if self.__size > self.__checkpoint_size:
+                        self.__checkpoint()
+
+    @metrics.timed('journal.commit')
+    def __commit(self, records: Iterable[JournalRecord]):
+        data = b''.join(encode_journal_record(id, text) for id, text in records)
+        metrics.bytes_written(len(data))
+        with self.__lock:
+            if self.__pending == 0:
+                lock_file(self.__file, shared=True)
+            self.__pending += 1
+            try:
+                self.__file.write(data)
+                self.__size += len(data)
+                self.__written_group += 1
+                group = self.__written_group
+                while self.__synced_group < group:
+                    if self.__is_syncing:
+                        self.__synced.wait()
+                        continue
+                    self.__sync()
+            except BaseException:
+                self.__pending -= 1
+                if self.__pending == 0:
+                    unlock_file(self.__file)
+                raise
+
+    def __sync(self):
+        """Сбрасывает на диск все дописанные группы; вызывается
+        под блокировкой, сам fsync выполняется без неё, чтобы другие
+        потоки могли дописывать следующую группу."""
+        self.__is_syncing = True
+        group = self.__written_group
+        try:
+            self.__file.flush()
+            self.__lock.release()
+            try:
+                self.__fsync()
+            finally:
+                self.__lock.acquire()
+            self.__synced_group = group
+        finally:
+            self.__is_syncing = False
+            self.__synced.notify_all()
+
+    @metrics.timed('journal.fsync')
+    def __fsync(self):
+        os.fsync(self.__file.fileno())
+
+    def checkpoint(self):
+        """Сбрасывает на диск установленные файлы и очищает журнал."""
+        with self.__lock:
+            if self.__pending == 0:
+                self.__checkpoint()
+
+    @metrics.timed('journal.checkpoint')
+    def __checkpoint(self, locked: bool = False):
+        """locked - исключительная блокировка журнала уже удерживается;
+        иначе, если журнал занят другими процессами, контрольная точка
+        откладывается до следующей попытки."""
+        if self.__size == 0:
+            return
+        if not locked and not try_lock_file(self.__file):
+            return
+        try:
+            # повторный просмотр журнала под исключительной блокировкой
+            # учитывает и записи других процессов
+            ids = [id for id, _ in self.__replay()]
+            sync_files(path for id in ids for path in self.__paths_of(id))
+            self.__file.truncate(0)
+            self.__file.seek(0)
+            self.__size = 0
+        finally:
+            if not locked:
+                unlock_file(self.__file)
+
+    def close(self):
+        self.checkpoint()
+        self.__file.close()
+
+
+def encode_journal_record(id: int, text: Optional[str]) -> bytes:
+    """Запись журнала - строка: контрольная сумма CRC32 и JSON [id, текст]."""
+    payload = json.dumps([id, text], ensure_ascii=False).encode(ENCODING)
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def decode_journal_record(line: bytes) -> Optional[JournalRecord]:
+    """Декодирует строку журнала; None - запись оборвана или повреждена."""
+    if not line.endswith(b'\n') or line[8:9] != b' ':
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        id, text = json.loads(payload.decode(ENCODING))
+    except ValueError:
+        return None
+    return id, text
@@ -0,0 +1,141 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import IO, Iterable, Iterator
+
+if os.name == 'nt':
+    import msvcrt
+
+    # блокировка диапазона в Windows берётся от текущей позиции файла,
+    # поэтому позиционирование и захват выполняются под этой блокировкой
+    __seek_lock = threading.Lock()
+
+    def lock_file(file: IO, shared: bool = False):
+        """Блокирующий захват рекомендательной блокировки файла
+        (в Windows блокировка всегда исключительная)."""
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def try_lock_file(file: IO, shared: bool = False) -> bool:
+        """Захват блокировки файла без ожидания; False - файл заблокирован."""
+        file.seek(0)
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def unlock_file(file: IO):
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def lock_range(file: IO, start: int, length: int):
+        """Блокирующий исключительный захват байтов [start, start + length)."""
+        with __seek_lock:
+            file.seek(start)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, length)
+
+    def unlock_range(file: IO, start: int, length: int):
+        with __seek_lock:
+            file.seek(start)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, length)
+
+else:
+    import fcntl
+
+    def lock_file(file: IO, shared: bool = False):
+        """Блокирующий захват рекомендательной блокировки файла."""
+        fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def try_lock_file(file: IO, shared: bool = False) -> bool:
+        """Захват блокировки файла без ожидания; False - файл заблокирован."""
+        try:
+            fcntl.flock(file.fileno(),
+                        (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def unlock_file(file: IO):
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def lock_range(file: IO, start: int, length: int):
+        """Блокирующий исключительный захват байтов [start, start + length)
+        (блокировка записи POSIX, принадлежит процессу)."""
+        fcntl.lockf(file.fileno(), fcntl.LOCK_EX, length, start, os.SEEK_SET)
+
+    def unlock_range(file: IO, start: int, length: int):
+        fcntl.lockf(file.fileno(), fcntl.LOCK_UN, length, start, os.SEEK_SET)
+
+
+@contextmanager
+def locked_open(path, shared: bool = False):
+    """Открывает (создавая при необходимости) файл на чтение и запись
+    и удерживает на нём блокировку до выхода из контекста."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+', encoding='UTF-8') as file:
+        lock_file(file, shared)
+        try:
+            yield file
+        finally:
+            file.flush()
+            unlock_file(file)
+
+
+def contiguous_runs(numbers: Iterable[int]) -> Iterator[tuple[int, int]]:
+    """Разбивает возрастающую последовательность чисел на непрерывные
+    отрезки (начало, длина)."""
+    start = length = 0
+    for number in numbers:
+        if length and number == start + length:
+            length += 1
+            continue
+        if length:
+            yield start, length
+        start, length = number, 1
+    if length:
+        yield start, length
+
+
+class RecordLocks:
+    """Рекомендательные блокировки отдельных записей (например, заметок
+    по id) между процессами и потоками без отдельного файла на запись:
+    записи с номером n соответствует байт n общего файла блокировок.\n
+    Блокировки записей POSIX принадлежат процессу, поэтому потоки одного
+    процесса дополнительно исключают друг друга по множеству захваченных
+    номеров. Номера захватываются в порядке возрастания (непрерывные
+    отрезки - одним вызовом), что исключает взаимоблокировку писателей.
+    Закрытие любого дескриптора файла снимает блокировки процесса,
+    поэтому в процессе на одну директорию должен приходиться
+    один экземпляр.
+    """
+
+    def __init__(self, path) -> None:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.__file = os.fdopen(fd, 'r+b', buffering=0)
+        self.__held: set[int] = set()
+        self.__released = threading.Condition()
+
+    @contextmanager
+    def locked(self, numbers: Iterable[int]) -> Iterator[None]:
+        numbers = sorted(set(numbers))
+        with self.__released:
+            while not self.__held.isdisjoint(numbers):
+                self.__released.wait()
+            self.__held.update(numbers)
+
+        locked_runs = []
+        try:
+            for start, length in contiguous_runs(numbers):
+                lock_range(self.__file, start, length)
+                locked_runs.append((start, length))
+            yield
+        finally:
+            for start, length in locked_runs:
+                unlock_range(self.__file, start, length)
+            with self.__released:
+                self.__held.difference_update(numbers)
+                self.__released.notify_all()
+
+    def close(self):
+        self.__file.close()
@@ -0,0 +1,485 @@
+import copy
+import functools
+import json
+import os
+import pathlib
+import re
+import threading
+import warnings
+from datetime import datetime
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+from .entities import LazyNote, Note, NoteConflictError
+from .fsdb import BODY_KEY, ENCODING, decode_note, decode_note_header, encode_note
+from .journal import sync_dir
+
+SEGMENT_BLANK = "segment{}.log"
+SEGMENT_DIGITS = 6
+SEGMENT_TEMPLATE = SEGMENT_BLANK.format(f"{{0:0{SEGMENT_DIGITS}d}}")
+SEGMENT_PATTERN = re.compile(r"^segment(\d{%d})\.log$" % SEGMENT_DIGITS)
+SEGMENT_MAX_SIZE = 64 * 1024 * 1024
+COMPACTION_TMP_FILENAME = "compaction.tmp"
+# уплотнение запускается, когда мусор составляет заданную долю
+# закрытых сегментов и при этом превышает минимальный объём
+COMPACTION_GARBAGE_RATIO = 0.5
+COMPACTION_MIN_GARBAGE = 4 * 1024 * 1024
+
+
+class RecordLocation(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+class LogNotes:
+    """Хранилище заметок в виде журнала (лога) только на добавление.\n
+    Каждая запись (новая версия заметки или отметка об удалении)
+    дописывается одной строкой JSON в конец активного сегмента;
+    по достижении SEGMENT_MAX_SIZE открывается новый сегмент.
+    В памяти поддерживается индекс id -> (сегмент, смещение),
+    который при открытии восстанавливается последовательным чтением
+    сегментов. Место, занятое устаревшими записями, освобождается
+    уплотнением закрытых сегментов в фоновом потоке.\n
+    Предназначено для использования одним процессом.
+    """
+
+    def __init__(self, path_str, segment_max_size: int = SEGMENT_MAX_SIZE) -> None:
+        path = pathlib.Path(path_str)
+        if path.exists():
+            if not path.is_dir():
+                raise FileExistsError(
+                    f"Path '{path_str}' must be a directory, not a file.")
+        else:
+            path.mkdir(parents=True)
+
+        self.__path = path
+        self.__segment_max_size = segment_max_size
+        self.__lock = threading.RLock()
+        self.__index: dict[int, RecordLocation] = {}
+        self.__garbage: dict[int, int] = {}
+        self.__sizes: dict[int, int] = {}
+        self.__last_id = 0
+        self.__compaction_thread: Optional[threading.Thread] = None
+
+        self.__path.joinpath(COMPACTION_TMP_FILENAME).unlink(missing_ok=True)
+        for segment in self.__list_segments():
+            self.__replay_segment(segment)
+
+        segments = self.__list_segments()
+        self.__active_segment = segments[-1] if segments else 1
+        self.__sizes.setdefault(self.__active_segment, 0)
+        self.__garbage.setdefault(self.__active_segment, 0)
+        self.__active_file = self.__segment_path(
+            self.__active_segment).open('ab')
+
+    # segments
+
+    def __segment_path(self, segment: int) -> pathlib.Path:
+        return self.__path.joinpath(SEGMENT_TEMPLATE.format(segment))
+
+    def __list_segments(self) -> list[int]:
+        segments = []
+        for name in os.listdir(self.__path):
+            if match := SEGMENT_PATTERN.match(name):
+                segments.append(int(match.group(1)))
+        segments.sort()
+        return segments
+
+    def __replay_segment(self, segment: int):
+        """Восстанавливает индекс по записям сегмента. Недописанная
+        (повреждённая при сбое) последняя запись отбрасывается."""
+        segment_path = self.__segment_path(segment)
+        offset = 0
+        with segment_path.open('rb') as file:
+            for line in file:
+                try:
+                    id, has_note = parse_record_header(line)
+                except ValueError:
+                    warnings.warn(
+                        f"Ошибка: Повреждённая запись в сегменте {segment_path.name}"
+                        f" (смещение {offset}), хвост сегмента отброшен.")
+                    break
+                self.__apply(id, RecordLocation(segment, offset, len(line))
+                             if has_note else None, len(line), segment)
+                offset += len(line)
+
+        if offset < segment_path.stat().st_size:
+            os.truncate(segment_path, offset)
+        self.__sizes[segment] = offset
+
+    def __apply(self, id: int, location: Optional[RecordLocation],
+                record_length: int, segment: int):
+        """Учитывает в индексе запись длиной record_length в сегменте segment:
+        location - положение новой версии заметки, либо None для удаления."""
+        self.__last_id = max(self.__last_id, id)
+        self.__garbage.setdefault(segment, 0)
+        previous = self.__index.pop(id, None)
+        if previous is not None:
+            self.__garbage[previous.segment] = \
+                self.__garbage.get(previous.segment, 0) + previous.length
+        if location is None:
+            # отметка об удалении сама по себе тоже мусор
+            self.__garbage[segment] += record_length
+        else:
+            self.__index[id] = location
+
+    def __append(self, id: int, note: Optional[Note]):
+        self.__append_many([(id, note)])
+
+    def __append_many(self, items: list[tuple[int, Optional[Note]]], sync: bool = False):
+        """Дописывает записи в журнал одной серией с одним сбросом буфера
+        (и, если sync, одним fsync) в конце."""
+        records = [(id, note is not None, encode_record(id, note)) for id, note in items]
+        with self.__lock:
+            for id, has_note, record in records:
+                if self.__sizes[self.__active_segment] + len(record) > self.__segment_max_size \
+                        and self.__sizes[self.__active_segment] > 0:
+                    self.__roll_segment()
+                segment = self.__active_segment
+                offset = self.__sizes[segment]
+                self.__active_file.write(record)
+                self.__sizes[segment] = offset + len(record)
+                self.__apply(id, RecordLocation(segment, offset, len(record))
+                             if has_note else None, len(record), segment)
+            self.__active_file.flush()
+            if sync:
+                os.fsync(self.__active_file.fileno())
+
+        self.__maybe_compact()
+
+    def __roll_segment(self):
+        self.__active_file.flush()
+        os.fsync(self.__active_file.fileno())
+        self.__active_file.close()
+        self.__active_segment += 1
+        self.__sizes[self.__active_segment] = 0
+        self.__garbage[self.__active_segment] = 0
+        self.__active_file = self.__segment_path(
+            self.__active_segment).open('ab')
+
+    def __read_record(self, location: RecordLocation) -> Optional[Note]:
+        with self.__segment_path(location.segment).open('rb') as file:
+            file.seek(location.offset)
+            line = file.read(location.length)
+        return decode_record(line)[1]
+
+    def __decode_lazy(self, id: int, line: bytes) -> Note:
+        """Декодирует только заголовок и даты записи заметки,
+        текст загружается при первом обращении к нему."""
+        body_pos = line.find(BODY_KEY)
+        if body_pos < 0:
+            return decode_record(line)[1]
+        creation_date, last_change_date, title = decode_note_header(
+            json.loads(line[:body_pos].rstrip(b',') + b'}}')['note'])
+        return LazyNote(id, creation_date, last_change_date, title,
+                        functools.partial(self.__read_body, id))
+
+    def __read_body(self, id: int) -> str:
+        entry = self.get(id)
+        if entry is None:
+            warnings.warn(f"Ошибка: Не удалось прочитать текст заметки {id}.")
+            return ''
+        return entry.body
+
+    # compaction
+
+    def __maybe_compact(self):
+        with self.__lock:
+            if self.__compaction_thread is not None and self.__compaction_thread.is_alive():
+                return
+            sealed = [s for s in self.__sizes if s != self.__active_segment]
+            garbage = sum(self.__garbage[s] for s in sealed)
+            total = sum(self.__sizes[s] for s in sealed)
+            if garbage < COMPACTION_MIN_GARBAGE or garbage < total * COMPACTION_GARBAGE_RATIO:
+                return
+            self.__compaction_thread = threading.Thread(
+                target=self.compact, name="notes-log-compaction", daemon=True)
+            self.__compaction_thread.start()
+
+    def compact(self):
+        """Уплотняет закрытые сегменты: живые записи переписываются
+        в один сегмент (с номером последнего из них), остальные удаляются.
+        Запись в активный сегмент во время уплотнения не блокируется.\n
+        Порядок действий устойчив к сбою: сначала атомарно подменяется
+        последний сегмент, затем в порядке возрастания удаляются более
+        старые (каждый шаг закрепляется fsync директории). Поэтому
+        отметки об удалении сохраняются в уплотнённом сегменте: пока
+        после сбоя может остаться более старый сегмент с версией
+        удалённой заметки, её удаление должно проигрываться позже.
+        Отбрасываются только отметки самого старого сегмента - более
+        ранних версий их заметок нет; из них сохраняется лишь отметка
+        с наибольшим id, по которой при открытии восстанавливается
+        верхняя граница выделенных id (id не используются повторно).
+        """
+        with self.__lock:
+            sealed = sorted(s for s in self.__sizes if s != self.__active_segment)
+            if not sealed:
+                return
+            sealed_set = set(sealed)
+            live = sorted((loc for loc in self.__index.values()
+                           if loc.segment in sealed_set),
+                          key=lambda loc: (loc.segment, loc.offset))
+            live_ids = {loc: id for id, loc in self.__index.items()
+                        if loc.segment in sealed_set}
+
+        target = sealed[-1]
+        tmp_path = self.__path.joinpath(COMPACTION_TMP_FILENAME)
+        moved: list[tuple[int, RecordLocation, RecordLocation]] = []
+        tombstones = self.__read_tombstones(sealed[1:])
+        oldest_tombstones = self.__read_tombstones(sealed[:1])
+        if oldest_tombstones:
+            tombstones.insert(0, max(oldest_tombstones,
+                                     key=lambda line: parse_record_header(line)[0]))
+        offset = sum(map(len, tombstones))
+        with tmp_path.open('wb') as out:
+            out.writelines(tombstones)
+            current_segment, current_file = None, None
+            try:
+                for loc in live:
+                    if loc.segment != current_segment:
+                        if current_file is not None:
+                            current_file.close()
+                        current_segment = loc.segment
+                        current_file = self.__segment_path(
+                            loc.segment).open('rb')
+                    current_file.seek(loc.offset)
+                    out.write(current_file.read(loc.length))
+                    moved.append((live_ids[loc], loc,
+                                  RecordLocation(target, offset, loc.length)))
+                    offset += loc.length
+            finally:
+                if current_file is not None:
+                    current_file.close()
+            out.flush()
+            os.fsync(out.fileno())
+
+        with self.__lock:
+            garbage = offset - sum(new_loc.length for _, _, new_loc in moved)
+            for id, old_loc, new_loc in moved:
+                if self.__index.get(id) == old_loc:
+                    self.__index[id] = new_loc
+                else:
+                    # заметка изменена или удалена во время уплотнения
+                    garbage += new_loc.length
+            os.replace(tmp_path, self.__segment_path(target))
+            sync_dir(self.__path)
+            for segment in sealed:
+                if segment != target:
+                    self.__segment_path(segment).unlink(missing_ok=True)
+                    del self.__sizes[segment]
+                    del self.__garbage[segment]
+            sync_dir(self.__path)
+            self.__sizes[target] = offset
+            self.__garbage[target] = garbage
+
+    def __read_tombstones(self, segments: list[int]) -> list[bytes]:
+        """Записи отметок об удалении из сегментов segments."""
+        tombstones = []
+        for segment in segments:
+            with self.__segment_path(segment).open('rb') as file:
+                for line in file:
+                    if not parse_record_header(line)[1]:
+                        tombstones.append(line)
+        return tombstones
+
+    # crud
+
+    def refresh(self) -> set[int]:
+        """Журнал изменяется только данным процессом, поэтому
+        изменений извне не бывает."""
+        return set()
+
+    def reserve_ids(self, count: int) -> range:
+        """Резервирует непрерывный блок идентификаторов для пакетной вставки."""
+        if count < 1:
+            raise ValueError(count)
+        with self.__lock:
+            first_id = self.__last_id + 1
+            self.__last_id += count
+        return range(first_id, first_id + count)
+
+    def add(self, entry: Note) -> Optional[Note]:
+        if entry is None:
+            raise TypeError(entry)
+
+        entry.id = self.reserve_ids(1)[0]
+        try:
+            self.__append(entry.id, entry)
+            return entry
+
+        except Exception:
+            warnings.warn(
+                f"Ошибка: Не удалось записать заметку {entry.id} в журнал.")
+
+        return None
+
+    def queryAll(self) -> Iterator[Note]:
+        """Генератор выдаёт заметки в порядке их расположения в журнале;
+        каждый сегмент читается последовательно за один проход.
+        Текст заметки декодируется лишь при обращении к нему."""
+        with self.__lock:
+            segments = sorted(self.__sizes)
+
+        for segment in segments:
+            with self.__lock:
+                segment_path = self.__segment_path(segment)
+                if not segment_path.exists():
+                    continue
+                notes = []
+                with segment_path.open('rb') as file:
+                    offset = 0
+                    for line in file:
+                        location = RecordLocation(segment, offset, len(line))
+                        offset += len(line)
+                        id, has_note = parse_record_header(line)
+                        if has_note and self.__index.get(id) == location:
+                            notes.append(self.__decode_lazy(id, line))
+
+            yield from notes
+
+    def get(self, id: int) -> Optional[Note]:
+        if id <= 0:
+            raise ValueError(id)
+
+        with self.__lock:
+            location = self.__index.get(id)
+            if location is None:
+                return None
+            try:
+                return self.__read_record(location)
+            except Exception:
+                warnings.warn(f"Ошибка: Не удалось прочитать заметку {id}.")
+
+        return None
+
+    def update(self, entry: Note, expected_last_change_date: Optional[datetime] = None) -> bool:
+        """expected_last_change_date - см. QueryableNotes.update."""
+        if entry is None:
+            raise TypeError(entry)
+        if entry.id is None or entry.id <= 0:
+            raise ValueError(entry.id)
+
+        with self.__lock:
+            if expected_last_change_date is not None:
+                current = self.get(entry.id)
+                NoteConflictError.check(entry.id, expected_last_change_date,
+                                        current.last_change_date if current is not None else None)
+            elif entry.id not in self.__index:
+                return False
+            try:
+                self.__append(entry.id, entry)
+                return True
+
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось записать изменения заметки {entry.id} в журнал.")
+
+        return False
+
+    def delete(self, id: int, expected_last_change_date: Optional[datetime] = None) -> Optional[Note]:
+        if id <= 0:
+            raise ValueError(id)
+
+        with self.__lock:
+            entry = self.get(id)
+            NoteConflictError.check(id, expected_last_change_date,
+                                    entry.last_change_date if entry is not None else None)
+            if entry is None:
+                return None
+
+            try:
+                self.__append(id, None)
+
+            except Exception:
+                warnings.warn(
+                    f"Ошибка: Не удалось записать удаление заметки {id} в журнал.")
+                return None
+
+        return entry
+
+    # batch
+
+    def add_many(self, entries: Sequence[Note]) -> list[Optional[Note]]:
+        """Пакетное добавление: блок id выделяется один раз, записи
+        дописываются одной серией с одним fsync в конце."""
+        if not entries:
+            return []
+        for id, entry in zip(self.reserve_ids(len(entries)), entries):
+            entry.id = id
+        try:
+            self.__append_many([(entry.id, entry) for entry in entries], sync=True)
+            return list(entries)
+
+        except Exception:
+            warnings.warn("Ошибка: Не удалось записать пакет заметок в журнал.")
+
+        return [None] * len(entries)
+
+    def update_many(self, entries: Sequence[Note]) -> list[bool]:
+        try:
+            with self.__lock:
+                results = [entry.id is not None and entry.id in self.__index
+                           for entry in entries]
+                self.__append_many([(entry.id, entry)
+                                    for entry, ok in zip(entries, results) if ok], sync=True)
+            return results
+
+        except Exception:
+            warnings.warn("Ошибка: Не удалось записать пакет изменений в журнал.")
+
+        return [False] * len(entries)
+
+    def delete_many(self, ids: Sequence[int]) -> list[bool]:
+        try:
+            with self.__lock:
+                results = [id in self.__index for id in ids]
+                self.__append_many([(id, None) for id, ok in zip(ids, results) if ok], sync=True)
+            return results
+
+        except Exception:
+            warnings.warn("Ошибка: Не удалось записать пакет удалений в журнал.")
+
+        return [False] * len(ids)
+
+    def close(self):
+        thread = self.__compaction_thread
+        if thread is not None:
+            thread.join()
+        with self.__lock:
+            self.__active_file.close()
+
+
+# module utils
+
+def encode_record(id: int, note: Optional[Note]) -> bytes:
+    """Запись журнала: одна строка компактного JSON, id идёт первым,
+    а отсутствие заметки (note: null) означает её удаление."""
+    if note is not None:
+        note = copy.copy(note)
+        note.id = None
+    line = json.dumps({'id': id, 'note': note},
+                      ensure_ascii=False,
+                      separators=(',', ':'),
+                      default=encode_note)
+    return (line + '\n').encode(ENCODING)
+
+
+def parse_record_header(line: bytes) -> tuple[int, bool]:
+    """Быстрый разбор записи без декодирования заметки:
+    возвращает id и признак наличия заметки (не удаления)."""
+    if not line.endswith(b'\n') or not line.startswith(b'{"id":'):
+        raise ValueError("Bad log record")
+    id_end = line.index(b',', 6)
+    id = int(line[6:id_end])
+    return id, not line.startswith(b'"note":null}', id_end + 1)
+
+
+def decode_record(line: bytes) -> tuple[int, Optional[Note]]:
+    record = json.loads(line)
+    id = record['id']
+    raw_note = record['note']
+    if raw_note is None:
+        return id, None
+    note = decode_note(raw_note)
+    note.id = id
+    return id, note
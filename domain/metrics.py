@@ -0,0 +1,219 @@
+"""Необязательный сбор метрик операций хранилища: счётчики вызовов,
+гистограммы длительности и объём прочитанных и записанных данных.
+
+По умолчанию сбор выключен, и инструментированные функции лишь
+проверяют флаг enabled. Включается функцией enable (см. main.py:
+параметр metrics файла настроек или переменная окружения ENV_VAR).
+Накопленные данные доступны через snapshot() и, если задан файл,
+периодически сохраняются в него в формате JSON.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+# "1"/"true" - включить, "0"/"false" - выключить, иное - путь к файлу метрик
+ENV_VAR = "NOTES_METRICS"
+DEFAULT_FLUSH_INTERVAL_S = 10.0
+# гистограмма: корзина i содержит длительности до 2**i мкс
+HISTOGRAM_BUCKETS = 40
+BYTES_READ = 'bytes_read'
+BYTES_WRITTEN = 'bytes_written'
+
+enabled = False
+
+__lock = threading.Lock()
+__histograms: dict[str, 'Histogram'] = {}
+__counters: dict[str, int] = {}
+__started = time.time()
+__flusher: Optional['Flusher'] = None
+
+
+class Histogram:
+    """Гистограмма длительностей с корзинами по степеням двойки
+    (в микросекундах): константная память и дешёвое обновление."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def add(self, elapsed_s: float):
+        bucket = min(int(elapsed_s * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total_s += elapsed_s
+        if elapsed_s > self.max_s:
+            self.max_s = elapsed_s
+
+    def percentile(self, fraction: float) -> float:
+        """Оценка перцентиля сверху (граница корзины), в секундах."""
+        rank = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min((1 << bucket) / 1e6, self.max_s)
+        return self.max_s
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_s': self.total_s,
+            'mean_ms': self.total_s / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max_s * 1000,
+            'buckets_us': {f"<={1 << i}": n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+# recording
+
+def observe(name: str, elapsed_s: float):
+    with __lock:
+        histogram = __histograms.get(name)
+        if histogram is None:
+            histogram = __histograms[name] = Histogram()
+        histogram.add(elapsed_s)
+
+
+def count(name: str, amount: int = 1):
+    """Увеличивает счётчик name (вызывать под проверкой enabled)."""
+    with __lock:
+        __counters[name] = __counters.get(name, 0) + amount
+
+
+def bytes_read(amount: int):
+    if enabled:
+        count(BYTES_READ, amount)
+
+
+def bytes_written(amount: int):
+    if enabled:
+        count(BYTES_WRITTEN, amount)
+
+
+F = TypeVar('F', bound=Callable)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Декоратор: число вызовов и длительность функции под именем name.
+    Для функций, возвращающих генератор, измеряется только вызов."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# reporting
+
+def snapshot() -> dict:
+    with __lock:
+        return {
+            'enabled': enabled,
+            'uptime_s': time.time() - __started,
+            'counters': dict(__counters),
+            'operations': {name: histogram.to_dict()
+                           for name, histogram in sorted(__histograms.items())},
+        }
+
+
+def reset():
+    global __started
+    with __lock:
+        __histograms.clear()
+        __counters.clear()
+        __started = time.time()
+
+
+def write_file(path: str):
+    """Атомарно записывает snapshot() в файл path."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='UTF-8') as file:
+        json.dump(snapshot(), file, indent=2)
+    os.replace(temp_path, path)
+
+
+class Flusher:
+    """Фоновый поток, сохраняющий метрики в файл раз в interval_s
+    секунд и при завершении процесса."""
+
+    def __init__(self, path: str, interval_s: float) -> None:
+        self.path = path
+        self.__interval_s = interval_s
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="metrics-flush",
+                                         daemon=True)
+        self.__thread.start()
+        atexit.register(self.stop)
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval_s):
+            self.flush()
+
+    def flush(self):
+        try:
+            write_file(self.path)
+        except OSError:
+            pass
+
+    def stop(self):
+        if not self.__stopped.is_set():
+            self.__stopped.set()
+            self.flush()
+
+
+# switch
+
+def enable(file: Optional[str] = None,
+           flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S):
+    """Включает сбор метрик; file - файл для периодического сохранения."""
+    global enabled, __flusher
+    enabled = True
+    if file and (__flusher is None or __flusher.path != file):
+        if __flusher is not None:
+            __flusher.stop()
+        __flusher = Flusher(file, flush_interval_s)
+
+
+def disable():
+    global enabled, __flusher
+    enabled = False
+    if __flusher is not None:
+        __flusher.stop()
+        __flusher = None
+
+
+def options_from_environment() -> dict:
+    """Параметры сбора метрик из переменной окружения ENV_VAR
+    (пустой словарь, если она не задана)."""
+    value = os.environ.get(ENV_VAR, '').strip()
+    if not value:
+        return {}
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return {'enabled': False}
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return {'enabled': True}
+    return {'enabled': True, 'file': value}
+
+
+def configure(enabled: bool = False, file: Optional[str] = None,
+              flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S):
+    if enabled:
+        enable(file, flush_interval_s)
+    else:
+        disable()
@@ -1,104 +1,380 @@
-from datetime import date, time
+import heapq
+import importlib
+import pathlib
+from datetime import date, datetime, time
 from enum import Enum, auto
-from typing import Iterator, Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, Sequence
 
-from .entities import Note
-from .fsdb import QueryableNotes
+from . import metrics
+from .entities import SORT_KEYS, Note
+from .fsdb import MIGRATION_BATCH_SIZE
+from .indexes import SortedIndex, TrigramIndex, seconds_of_day
+
+if TYPE_CHECKING:
+    from .columnar import NoteColumns
+    from .fulltext import FullTextIndex
+
+# механизмы хранения: модуль и класс. Модуль импортируется только
+# при открытии хранилища (а полнотекстовый индекс и поколоночное
+# представление - при первом обращении), поэтому одиночный запрос
+# из командной строки не загружает ненужных ему модулей
+STORAGE_ENGINES = {
+    "files": ('.fsdb', 'QueryableNotes'),
+    "log": ('.logdb', 'LogNotes'),
+    "sqlite": ('.sqlitedb', 'SqliteNotes'),
+}
+# механизм хранения, выполняющий выборки запросами SQL
+SQL_ENGINE = "sqlite"
 
 
 class AttributeKind(Enum):
     CREATION = auto()
     LAST_CHANGE = auto()
 
+    @property
+    def attribute_name(self) -> str:
+        return 'creation_date' if self == AttributeKind.CREATION else 'last_change_date'
+
+    def get_value(self, note: Note) -> datetime:
+        return note.creation_date if self == AttributeKind.CREATION else note.last_change_date
+
+    def get_daytime_seconds(self, note: Note) -> float:
+        return seconds_of_day(self.get_value(note).time())
+
+
+# атрибуты, по которым упорядочивают вторичные индексы дат
+SORTED_ATTRIBUTES = {kind.attribute_name: kind for kind in AttributeKind}
+
+DAYTIME_INDEX = 'daytime'
+TITLE_INDEX = 'title'
+
+# вторичные индексы репозитория: тип индекса и ключевая функция.
+# Метка времени и время суток (в секундах с полуночи) для каждого атрибута,
+# триграммы заголовка
+INDEX_DEFINITIONS: dict[Any, tuple[type, Callable[[Note], Any]]] = {
+    AttributeKind.CREATION:
+        (SortedIndex, AttributeKind.CREATION.get_value),
+    AttributeKind.LAST_CHANGE:
+        (SortedIndex, AttributeKind.LAST_CHANGE.get_value),
+    (DAYTIME_INDEX, AttributeKind.CREATION):
+        (SortedIndex, AttributeKind.CREATION.get_daytime_seconds),
+    (DAYTIME_INDEX, AttributeKind.LAST_CHANGE):
+        (SortedIndex, AttributeKind.LAST_CHANGE.get_daytime_seconds),
+    TITLE_INDEX:
+        (TrigramIndex, lambda n: n.title),
+}
+
 
 class NotesRepository:
     NOTES_MIN_ID = 1
 
-    def __init__(self, path_str) -> None:
-        self.__notes_table = QueryableNotes(path_str)
+    def __init__(self, path_str, engine: str = "files", **engine_options) -> None:
+        """engine - имя механизма хранения (см. STORAGE_ENGINES),
+        engine_options - параметры, передаваемые механизму хранения."""
+        engine_location = STORAGE_ENGINES.get(engine)
+        if engine_location is None:
+            raise ValueError(f"Unknown storage engine '{engine}'")
+        module_name, class_name = engine_location
+        engine_type = getattr(importlib.import_module(module_name, __package__), class_name)
+        self.__notes_table = engine_type(path_str, **engine_options)
+        self.__is_sql = engine == SQL_ENGINE
+        self.__path = pathlib.Path(path_str)
+        self.__indexes: Optional[dict[Any, Any]] = None
+        self.__fulltext: Optional['FullTextIndex'] = None
+
+    def close(self):
+        """Сбрасывает на диск индексы и освобождает ресурсы хранилища."""
+        if self.__fulltext is not None:
+            self.__fulltext.close()
+            self.__fulltext = None
+        self.__indexes = None
+        close = getattr(self.__notes_table, 'close', None)
+        if close is not None:
+            close()
+
+    def migrate_layout(self, batch_size: int = MIGRATION_BATCH_SIZE, pause_s: float = 0) -> int:
+        """Переносит файлы заметок плоской раскладки прежних версий
+        в шарды без остановки работы с хранилищем (см.
+        QueryableNotes.migrate_layout). Для механизмов хранения без
+        файлов заметок ничего не делает. Возвращает число перенесённых
+        заметок."""
+        migrate = getattr(self.__notes_table, 'migrate_layout', None)
+        if migrate is None:
+            return 0
+        return migrate(batch_size, pause_s)
+
+    # indexes
+
+    def __get_indexes(self) -> dict[Any, Any]:
+        """Вторичные индексы строятся при первом обращении
+        и далее поддерживаются инкрементально, в т.ч. с учётом
+        изменений, внесённых в хранилище извне."""
+        if self.__indexes is None:
+            self.__build_indexes()
+        else:
+            changed_ids = self.__notes_table.refresh()
+            for note_id in changed_ids:
+                self.__unindex(note_id)
+                note = self.__notes_table.get(note_id)
+                if note is not None:
+                    self.__index(note)
+            if changed_ids:
+                self.__flush_indexes()
+
+        assert self.__indexes is not None
+        return self.__indexes
+
+    @metrics.timed('repository.build_indexes')
+    def __build_indexes(self):
+        notes = list(self.get_all_notes())
+        self.__notes_table.refresh()
+        self.__indexes = {name: index_type((n.id, key(n)) for n in notes)
+                          for name, (index_type, key) in INDEX_DEFINITIONS.items()}
+
+    def __get_fulltext(self) -> 'FullTextIndex':
+        """Полнотекстовый индекс хранится на диске и открывается лишь
+        при первом поиске по тексту: тогда он согласуется с хранилищем
+        (см. FullTextIndex.reconcile), а далее поддерживается вместе
+        с остальными индексами."""
+        self.__get_indexes()
+        if self.__fulltext is None:
+            self.__fulltext = self.__open_fulltext()
+        return self.__fulltext
+
+    @metrics.timed('repository.build_fulltext')
+    def __open_fulltext(self) -> 'FullTextIndex':
+        from .fulltext import FullTextIndex
+        fulltext = FullTextIndex(self.__path)
+        fulltext.reconcile(self.get_all_notes())
+        return fulltext
+
+    def __index(self, note: Note):
+        self.__index_many((note,))
+
+    def __index_many(self, notes: Iterable[Note]):
+        if self.__indexes is None:
+            return
+        notes = list(notes)
+        for name, (_, key) in INDEX_DEFINITIONS.items():
+            self.__indexes[name].insert_many((n.id, key(n)) for n in notes)
+        if self.__fulltext is not None:
+            for note in notes:
+                self.__fulltext.insert(note)
+
+    def __unindex(self, note_id: int):
+        if self.__indexes is not None:
+            for index in self.__indexes.values():
+                index.remove(note_id)
+        if self.__fulltext is not None:
+            self.__fulltext.remove(note_id)
+
+    def __flush_indexes(self):
+        if self.__fulltext is not None:
+            self.__fulltext.flush()
+
+    def __load_notes(self, note_ids: Iterable[int]) -> Iterator[Note]:
+        notes = map(self.__notes_table.get, note_ids)
+        return filter(None, notes)
 
     # create
 
+    @metrics.timed('repository.add_note')
     def add_note(self, note: Note):
         if note is None:
             raise TypeError(note)
 
-        return self.__notes_table.add(note)
+        result = self.__notes_table.add(note)
+        if result is not None:
+            self.__index(result)
+            self.__flush_indexes()
+        return result
+
+    @metrics.timed('repository.add_many')
+    def add_many(self, notes: Sequence[Note]) -> list[Optional[Note]]:
+        """Пакетное добавление: блок id выделяется один раз, запись
+        выполняется за один проход с одним подтверждением журнала,
+        индексы обновляются один раз на пакет.
+        Возвращает результат для каждой заметки (None - не удалось)."""
+        if any(note is None for note in notes):
+            raise TypeError(notes)
+
+        results = self.__notes_table.add_many(notes)
+        self.__index_many(filter(None, results))
+        self.__flush_indexes()
+        return results
 
     # read
 
+    @metrics.timed('repository.get_note_by_id')
     def get_note_by_id(self, note_id: int) -> Optional[Note]:
         if note_id < NotesRepository.NOTES_MIN_ID:
             raise ValueError(note_id)
 
         return self.__notes_table.get(note_id)
 
+    @metrics.timed('repository.get_all_notes')
     def get_all_notes(self) -> Iterator[Note]:
         return self.__notes_table.queryAll()
 
+    @metrics.timed('repository.query')
+    def query(self, sort_by: str = 'creation_date', reverse: bool = False,
+              limit: Optional[int] = None, offset: int = 0) -> Iterator[Note]:
+        """Заметки, упорядоченные по атрибуту sort_by ('creation_date',
+        'last_change_date' или 'title'; при равенстве - по id), начиная
+        с позиции offset, не более limit штук (None - все).\n
+        Для дат используется срез вторичного индекса, для заголовка -
+        выбор limit + offset наименьших (наибольших) заголовков (heapq),
+        поэтому первая страница не требует сортировки всех заметок,
+        а их текст не читается.
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(sort_by)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError((limit, offset))
+
+        if self.__is_sql:
+            return self.__notes_table.query_sorted(sort_by, reverse, limit, offset)
+
+        kind = SORTED_ATTRIBUTES.get(sort_by)
+        if kind is not None:
+            note_ids = self.__get_indexes()[kind].ordered(reverse, offset, limit)
+            return self.__load_notes(note_ids)
+
+        def key(note: Note):
+            return note.title, note.id
+
+        notes = self.get_all_notes()
+        if limit is None:
+            selected = sorted(notes, key=key, reverse=reverse)
+        else:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            selected = select(offset + limit, notes, key=key)
+        return iter(selected[offset:])
+
+    @metrics.timed('repository.get_notes_table')
+    def get_notes_table(self, notes: Optional[Iterable[Note]] = None) -> 'NoteColumns':
+        """Поколоночное представление заметок (по умолчанию - всех)
+        для сортировки и фильтрации; текст заметок загружается
+        из хранилища лишь для тех строк, к которым обращаются."""
+        from .columnar import NoteColumns
+        if notes is None:
+            notes = self.get_all_notes()
+        return NoteColumns(notes, self.__load_body)
+
+    def __load_body(self, note_id: int) -> str:
+        note = self.__notes_table.get(note_id)
+        return note.body if note is not None else ''
+
+    @metrics.timed('repository.get_notes_by_title')
     def get_notes_by_title(self, title_sample: str) -> Iterator[Note]:
         if not title_sample:
             return iter(())
 
-        title_sample = title_sample.lower()
-        notes_iter = self.get_all_notes()
-        return filter(lambda n: title_sample in n.title.lower(), notes_iter)
+        if self.__is_sql:
+            return self.__notes_table.query_by_title(title_sample)
+
+        note_ids = self.__get_indexes()[TITLE_INDEX].search(title_sample)
+        return self.__load_notes(note_ids)
 
+    @metrics.timed('repository.get_notes_by_date_range')
     def get_notes_by_date_range(self,
                                 date_from: date, date_to: date,
                                 kind=AttributeKind.CREATION,
                                 ) -> Iterator[Note]:
         """Выборка заметок по диапазону дат.\n
-        kind - временной атрибута: время создания или последнего изменения.
+        kind - временной атрибута: время создания или последнего изменения.\n
+        Заметки выдаются упорядоченными по значению этого атрибута.
         """
         if date_to < date_from:
             date_from, date_to = date_to, date_from
 
-        # get_date: Callable[[Note], datetime]
-        if kind == AttributeKind.CREATION:
-            def get_date(n: Note): return n.creation_date.date()
-        else:
-            def get_date(n: Note): return n.last_change_date.date()
+        if self.__is_sql:
+            return self.__notes_table.query_by_date_range(
+                kind.attribute_name, date_from, date_to)
 
-        def is_in_range(note: Note):
-            return date_from <= get_date(note) <= date_to
-
-        notes_iter = self.get_all_notes()
-        return filter(is_in_range, notes_iter)
+        index = self.__get_indexes()[kind]
+        note_ids = index.range(datetime.combine(date_from, time.min),
+                               datetime.combine(date_to, time.max))
+        return self.__load_notes(note_ids)
 
+    @metrics.timed('repository.get_notes_by_daytime_range')
     def get_notes_by_daytime_range(self,
                                    time_from: time, time_to: time,
                                    kind=AttributeKind.CREATION,
                                    ) -> Iterator[Note]:
         """Выборка заметок по диапазону времени суток.\n
-        kind - временной атрибута: время создания или последнего изменения.
+        kind - временной атрибута: время создания или последнего изменения.\n
+        Если time_to < time_from, диапазон переходит через полночь
+        (например, 22:00\u201402:00).
         """
-        if time_to < time_from:
-            time_from, time_to = time_to, time_from
+        if self.__is_sql:
+            return self.__notes_table.query_by_daytime_range(
+                kind.attribute_name, time_from, time_to)
 
-        # get_date: Callable[[Note], datetime]
-        if kind == AttributeKind.CREATION:
-            def get_time(n: Note): return n.creation_date.time()
-        else:
-            def get_time(n: Note): return n.last_change_date.time()
+        index = self.__get_indexes()[(DAYTIME_INDEX, kind)]
+        note_ids = index.wrapped_range(seconds_of_day(time_from),
+                                       seconds_of_day(time_to))
+        return self.__load_notes(note_ids)
 
-        def is_in_range(note: Note):
-            return time_from <= get_time(note) <= time_to
+    @metrics.timed('repository.search_body')
+    def search_body(self, query: str) -> Iterator[Note]:
+        """Полнотекстовый поиск по тексту заметок: выдаются заметки,
+        содержащие все слова запроса, в порядке убывания релевантности."""
+        if not query:
+            return iter(())
 
-        notes_iter = self.get_all_notes()
-        return filter(is_in_range, notes_iter)
+        fulltext = self.__get_fulltext()
+        note_ids = (note_id for note_id, _ in fulltext.search(query))
+        return self.__load_notes(note_ids)
 
     # update
 
-    def update_note(self, note: Note) -> bool:
+    @metrics.timed('repository.update_note')
+    def update_note(self, note: Note, expected_last_change_date: Optional[datetime] = None) -> bool:
+        """expected_last_change_date - время последнего изменения заметки
+        на момент её чтения (оптимистическая проверка): если другой
+        писатель успел изменить или удалить заметку, изменение
+        не записывается и возбуждается NoteConflictError."""
         if note is None:
             raise TypeError(note)
 
-        return self.__notes_table.update(note)
+        result = self.__notes_table.update(note, expected_last_change_date)
+        if result:
+            self.__index(note)
+            self.__flush_indexes()
+        return result
+
+    @metrics.timed('repository.update_many')
+    def update_many(self, notes: Sequence[Note]) -> list[bool]:
+        """Пакетное обновление (см. add_many)."""
+        if any(note is None for note in notes):
+            raise TypeError(notes)
+
+        results = self.__notes_table.update_many(notes)
+        self.__index_many(note for note, ok in zip(notes, results) if ok)
+        self.__flush_indexes()
+        return results
 
     # delete
 
-    def delete_note(self, note_id: int) -> bool:
+    @metrics.timed('repository.delete_note')
+    def delete_note(self, note_id: int, expected_last_change_date: Optional[datetime] = None) -> bool:
+        """expected_last_change_date - см. update_note."""
         if note_id < NotesRepository.NOTES_MIN_ID:
             raise ValueError(note_id)
-        return self.__notes_table.delete(note_id) is not None
+        result = self.__notes_table.delete(note_id, expected_last_change_date) is not None
+        self.__unindex(note_id)
+        self.__flush_indexes()
+        return result
+
+    @metrics.timed('repository.delete_many')
+    def delete_many(self, note_ids: Sequence[int]) -> list[bool]:
+        """Пакетное удаление (см. add_many)."""
+        if any(note_id < NotesRepository.NOTES_MIN_ID for note_id in note_ids):
+            raise ValueError(note_ids)
+
+        results = self.__notes_table.delete_many(note_ids)
+        for note_id in note_ids:
+            self.__unindex(note_id)
+        self.__flush_indexes()
+        return results
@@ -0,0 +1,342 @@
+import pathlib
+import sqlite3
+import threading
+import warnings
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, Optional, Sequence
+
+from .entities import Note, NoteConflictError
+from .fsdb import has_note_files, read_note_files
+
+DB_FILENAME = "notes.sqlite3"
+SCHEMA_VERSION = 2
+DATE_ATTRIBUTES = ('creation_date', 'last_change_date')
+# время суток извлекается из текстового представления datetime
+# ('ГГГГ-ММ-ДД ЧЧ:ММ:СС[.ffffff]'), начиная с 12-го символа
+DAYTIME_EXPR = "substr({0}, 12)"
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        creation_date TEXT NOT NULL,
+        last_change_date TEXT NOT NULL,
+        title TEXT NOT NULL,
+        title_lower TEXT NOT NULL,
+        body TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS notes_creation_date"
+    " ON notes (creation_date)",
+    "CREATE INDEX IF NOT EXISTS notes_last_change_date"
+    " ON notes (last_change_date)",
+    "CREATE INDEX IF NOT EXISTS notes_title"
+    " ON notes (title)",
+    "CREATE INDEX IF NOT EXISTS notes_creation_daytime"
+    f" ON notes ({DAYTIME_EXPR.format('creation_date')})",
+    "CREATE INDEX IF NOT EXISTS notes_last_change_daytime"
+    f" ON notes ({DAYTIME_EXPR.format('last_change_date')})",
+)
+
+COLUMNS = "id, creation_date, last_change_date, title, body"
+# полная выборка читается из курсора порциями, а не целиком
+QUERY_CHUNK_SIZE = 1000
+
+
+class SqliteNotes:
+    """Хранилище заметок в базе данных SQLite (файл DB_FILENAME
+    в директории данных).\n
+    Выборки по диапазону дат, времени суток и образцу заголовка
+    выполняются средствами SQL с использованием индексов.
+    При первом создании базы в неё однократно переносятся заметки
+    из JSON файлов, найденных в той же директории.
+    """
+
+    def __init__(self, path_str) -> None:
+        path = pathlib.Path(path_str)
+        if path.exists():
+            if not path.is_dir():
+                raise FileExistsError(
+                    f"Path '{path_str}' must be a directory, not a file.")
+        else:
+            path.mkdir(parents=True)
+
+        self.__path = path
+        self.__lock = threading.RLock()
+        self.__conn = sqlite3.connect(path.joinpath(DB_FILENAME),
+                                      check_same_thread=False,
+                                      isolation_level=None)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__init_schema()
+
+    def __init_schema(self):
+        with self.__lock:
+            version = self.__conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            self.__conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in SCHEMA:
+                    self.__conn.execute(statement)
+                if version == 0 and has_note_files(self.__path):
+                    self.__import_notes(read_note_files(self.__path))
+                self.__conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                self.__conn.execute("COMMIT")
+            except Exception:
+                self.__conn.execute("ROLLBACK")
+                raise
+
+    def __import_notes(self, notes: Iterator[Note]) -> int:
+        cursor = self.__conn.executemany(
+            "INSERT OR IGNORE INTO notes"
+            " (id, creation_date, last_change_date, title, title_lower, body)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            ((n.id, str(n.creation_date), str(n.last_change_date),
+              n.title, n.title.lower(), n.body) for n in notes))
+        return cursor.rowcount
+
+    def migrate_from(self, path_str) -> int:
+        """Переносит в базу заметки из JSON файловой БД по пути path_str
+        (с сохранением id; уже имеющиеся id пропускаются).
+        Возвращает число перенесённых заметок."""
+        notes = read_note_files(pathlib.Path(path_str))
+        with self.__lock, self.__conn:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            return self.__import_notes(notes)
+
+    def __query(self, where: str = "", params=()) -> Iterator[Note]:
+        with self.__lock:
+            rows = self.__conn.execute(
+                f"SELECT {COLUMNS} FROM notes {where}", params).fetchall()
+        return map(row_to_note, rows)
+
+    # crud
+
+    def refresh(self) -> set[int]:
+        """Изменения, внесённые в базу другими процессами, не отслеживаются
+        (выборки и так выполняются непосредственно в базе)."""
+        return set()
+
+    def reserve_ids(self, count: int) -> range:
+        """Резервирует непрерывный блок идентификаторов для пакетной вставки."""
+        if count < 1:
+            raise ValueError(count)
+
+        with self.__lock, self.__conn:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            return self.__reserve_ids_in_transaction(count)
+
+    def __reserve_ids_in_transaction(self, count: int) -> range:
+        row = self.__conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'notes'").fetchone()
+        max_id = self.__conn.execute(
+            "SELECT coalesce(max(id), 0) FROM notes").fetchone()[0]
+        last_id = max(row[0] if row else 0, max_id)
+        if row:
+            self.__conn.execute(
+                "UPDATE sqlite_sequence SET seq = ? WHERE name = 'notes'",
+                (last_id + count,))
+        else:
+            self.__conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('notes', ?)",
+                (last_id + count,))
+
+        return range(last_id + 1, last_id + count + 1)
+
+    def add(self, entry: Note) -> Optional[Note]:
+        if entry is None:
+            raise TypeError(entry)
+
+        try:
+            with self.__lock, self.__conn:
+                cursor = self.__conn.execute(
+                    "INSERT INTO notes"
+                    " (id, creation_date, last_change_date, title, title_lower, body)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (None, str(entry.creation_date), str(entry.last_change_date),
+                     entry.title, entry.title.lower(), entry.body))
+            entry.id = cursor.lastrowid
+            return entry
+
+        except sqlite3.Error:
+            warnings.warn("Ошибка: Не удалось добавить заметку в базу данных.")
+
+        return None
+
+    def queryAll(self) -> Iterator[Note]:
+        """Генератор читает заметки из курсора порциями по QUERY_CHUNK_SIZE,
+        поэтому память не растёт с размером базы."""
+        with self.__lock:
+            cursor = self.__conn.execute(f"SELECT {COLUMNS} FROM notes")
+        while True:
+            with self.__lock:
+                rows = cursor.fetchmany(QUERY_CHUNK_SIZE)
+            if not rows:
+                return
+            yield from map(row_to_note, rows)
+
+    def query_by_title(self, title_sample: str) -> Iterator[Note]:
+        """Выборка по вхождению образца в заголовок (без учёта регистра)."""
+        return self.__query("WHERE instr(title_lower, ?) > 0",
+                            (title_sample.lower(),))
+
+    def query_by_date_range(self, attribute: str,
+                            date_from: date, date_to: date) -> Iterator[Note]:
+        """Выборка по диапазону дат (включительно) атрибута attribute,
+        упорядоченная по его значению."""
+        assert attribute in DATE_ATTRIBUTES
+        return self.__query(
+            f"WHERE {attribute} >= ? AND {attribute} < ? ORDER BY {attribute}",
+            (str(date_from), str(date_to + timedelta(days=1))))
+
+    def query_by_daytime_range(self, attribute: str,
+                               time_from: time, time_to: time) -> Iterator[Note]:
+        """Выборка по диапазону времени суток (включительно)
+        атрибута attribute. Если time_to < time_from, диапазон
+        переходит через полночь."""
+        assert attribute in DATE_ATTRIBUTES
+        daytime = DAYTIME_EXPR.format(attribute)
+        operator = "AND" if time_from <= time_to else "OR"
+        return self.__query(
+            f"WHERE {daytime} >= ? {operator} {daytime} <= ? ORDER BY {attribute}",
+            (str(time_from), str(time_to)))
+
+    def query_sorted(self, key: str, reverse: bool = False,
+                     limit: Optional[int] = None, offset: int = 0) -> Iterator[Note]:
+        """Страница заметок, упорядоченных по атрибуту key
+        ('creation_date', 'last_change_date' или 'title'): обход индекса
+        с LIMIT/OFFSET, без сортировки всей таблицы."""
+        assert key in DATE_ATTRIBUTES or key == 'title'
+        order = "DESC" if reverse else "ASC"
+        return self.__query(
+            f"ORDER BY {key} {order}, id {order} LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset))
+
+    def get(self, id: int) -> Optional[Note]:
+        if id <= 0:
+            raise ValueError(id)
+
+        return next(self.__query("WHERE id = ?", (id,)), None)
+
+    def update(self, entry: Note, expected_last_change_date: Optional[datetime] = None) -> bool:
+        """expected_last_change_date - см. QueryableNotes.update; проверка
+        и изменение выполняются в одной транзакции."""
+        if entry is None:
+            raise TypeError(entry)
+        if entry.id is None or entry.id <= 0:
+            raise ValueError(entry.id)
+
+        try:
+            with self.__lock, self.__conn:
+                if expected_last_change_date is not None:
+                    self.__conn.execute("BEGIN IMMEDIATE")
+                    self.__check_last_change_date(entry.id, expected_last_change_date)
+                cursor = self.__conn.execute(
+                    "UPDATE notes SET creation_date = ?, last_change_date = ?,"
+                    " title = ?, title_lower = ?, body = ? WHERE id = ?",
+                    (str(entry.creation_date), str(entry.last_change_date),
+                     entry.title, entry.title.lower(), entry.body, entry.id))
+            return cursor.rowcount == 1
+
+        except sqlite3.Error:
+            warnings.warn(
+                f"Ошибка: Не удалось обновить заметку {entry.id} в базе данных.")
+
+        return False
+
+    def __check_last_change_date(self, id: int, expected: datetime):
+        row = self.__conn.execute(
+            "SELECT last_change_date FROM notes WHERE id = ?", (id,)).fetchone()
+        actual = datetime.fromisoformat(row[0]) if row is not None else None
+        NoteConflictError.check(id, expected, actual)
+
+    def delete(self, id: int, expected_last_change_date: Optional[datetime] = None) -> Optional[Note]:
+        if id <= 0:
+            raise ValueError(id)
+
+        try:
+            with self.__lock, self.__conn:
+                self.__conn.execute("BEGIN IMMEDIATE")
+                entry = self.get(id)
+                NoteConflictError.check(id, expected_last_change_date,
+                                        entry.last_change_date if entry is not None else None)
+                if entry is not None:
+                    self.__conn.execute("DELETE FROM notes WHERE id = ?", (id,))
+            return entry
+
+        except sqlite3.Error:
+            warnings.warn(
+                f"Ошибка: Не удалось удалить заметку {id} из базы данных.")
+
+        return None
+
+    # batch
+
+    def add_many(self, entries: Sequence[Note]) -> list[Optional[Note]]:
+        """Пакетное добавление одной транзакцией: блок id выделяется
+        один раз, ошибка отдельной вставки не отменяет остальные."""
+        if not entries:
+            return []
+
+        results: list[Optional[Note]] = []
+        with self.__lock, self.__conn:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            for id, entry in zip(self.__reserve_ids_in_transaction(len(entries)), entries):
+                try:
+                    self.__conn.execute(
+                        "INSERT INTO notes"
+                        " (id, creation_date, last_change_date, title, title_lower, body)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (id, str(entry.creation_date), str(entry.last_change_date),
+                         entry.title, entry.title.lower(), entry.body))
+                    entry.id = id
+                    results.append(entry)
+                except sqlite3.Error:
+                    warnings.warn("Ошибка: Не удалось добавить заметку в базу данных.")
+                    results.append(None)
+        return results
+
+    def update_many(self, entries: Sequence[Note]) -> list[bool]:
+        results = []
+        with self.__lock, self.__conn:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            for entry in entries:
+                if entry.id is None or entry.id <= 0:
+                    raise ValueError(entry.id)
+                try:
+                    cursor = self.__conn.execute(
+                        "UPDATE notes SET creation_date = ?, last_change_date = ?,"
+                        " title = ?, title_lower = ?, body = ? WHERE id = ?",
+                        (str(entry.creation_date), str(entry.last_change_date),
+                         entry.title, entry.title.lower(), entry.body, entry.id))
+                    results.append(cursor.rowcount == 1)
+                except sqlite3.Error:
+                    warnings.warn(
+                        f"Ошибка: Не удалось обновить заметку {entry.id} в базе данных.")
+                    results.append(False)
+        return results
+
+    def delete_many(self, ids: Sequence[int]) -> list[bool]:
+        results = []
+        with self.__lock, self.__conn:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            for id in ids:
+                if id <= 0:
+                    raise ValueError(id)
+                cursor = self.__conn.execute("DELETE FROM notes WHERE id = ?", (id,))
+                results.append(cursor.rowcount == 1)
+        return results
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+# module utils
+
+def row_to_note(row) -> Note:
+    id, creation_date, last_change_date, title, body = row
+    return Note(id,
+                datetime.fromisoformat(creation_date),
+                datetime.fromisoformat(last_change_date),
+                title,
+                body)
@@ -0,0 +1,239 @@
+import csv
+import io
+import itertools
+import json
+import os
+import pathlib
+import warnings
+from datetime import datetime
+from typing import IO, Iterable, Iterator, Optional
+
+from .entities import Note
+from .repository import NotesRepository
+
+JSONL_FORMAT = 'jsonl'
+CSV_FORMAT = 'csv'
+FORMATS = (JSONL_FORMAT, CSV_FORMAT)
+CSV_DELIMITER = ';'
+CSV_COLUMNS = ('id', 'creation_date', 'last_change_date', 'title', 'body')
+ENCODING = 'UTF-8'
+# импорт записывает заметки пакетами (см. NotesRepository.add_many)
+IMPORT_BATCH_SIZE = 1000
+# состояние прерванного импорта хранится рядом с исходным файлом
+PROGRESS_SUFFIX = '.progress'
+
+
+def guess_format(path_str: str) -> str:
+    """Формат по расширению файла: .csv - CSV, иначе JSON Lines."""
+    return CSV_FORMAT if path_str.lower().endswith('.csv') else JSONL_FORMAT
+
+
+def note_to_dict(note: Note, with_body: bool = True) -> dict:
+    dct = {
+        'id': note.id,
+        'creation_date': str(note.creation_date),
+        'last_change_date': str(note.last_change_date),
+        'title': note.title,
+    }
+    if with_body:
+        dct['body'] = note.body
+    return dct
+
+
+def note_from_dict(dct: dict) -> Note:
+    """Заметка из записи импорта; id исходного хранилища не сохраняется
+    (новые id выделяются при добавлении)."""
+    return Note(None,
+                datetime.fromisoformat(dct['creation_date']),
+                datetime.fromisoformat(dct['last_change_date']),
+                dct['title'],
+                dct.get('body') or '')
+
+
+# export
+
+def encode_jsonl(notes: Iterable[Note]) -> Iterator[str]:
+    for note in notes:
+        yield json.dumps(note_to_dict(note), ensure_ascii=False) + '\n'
+
+
+def encode_csv(notes: Iterable[Note]) -> Iterator[str]:
+    """Строки CSV с разделителем ';' и строкой заголовков столбцов
+    (многострочный текст заметки заключается в кавычки)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=CSV_DELIMITER, lineterminator='\n')
+    rows = itertools.chain((CSV_COLUMNS,),
+                           (note_to_dict(note).values() for note in notes))
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+ENCODERS = {
+    JSONL_FORMAT: encode_jsonl,
+    CSV_FORMAT: encode_csv,
+}
+
+
+def export_notes(notes: Iterable[Note], file: IO[str], format: str = JSONL_FORMAT) -> int:
+    """Записывает заметки в file по одной, не накапливая их в памяти
+    (текст каждой заметки загружается лишь на время её записи).
+    Возвращает число записанных заметок."""
+    count = 0
+
+    def counted() -> Iterator[Note]:
+        nonlocal count
+        for note in notes:
+            count += 1
+            yield note
+
+    file.writelines(ENCODERS[format](counted()))
+    return count
+
+
+# import
+
+def decode_jsonl(file: IO[str]) -> Iterator[Note]:
+    for line_no, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield note_from_dict(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            warnings.warn(f"Ошибка: Некорректная запись в строке {line_no}, пропущена.")
+
+
+def decode_csv(file: IO[str]) -> Iterator[Note]:
+    reader = csv.DictReader(file, delimiter=CSV_DELIMITER)
+    for row in reader:
+        try:
+            yield note_from_dict(row)
+        except (ValueError, KeyError, TypeError):
+            warnings.warn(
+                f"Ошибка: Некорректная запись в строке {reader.line_num}, пропущена.")
+
+
+DECODERS = {
+    JSONL_FORMAT: decode_jsonl,
+    CSV_FORMAT: decode_csv,
+}
+
+
+def read_notes(file: IO[str], format: str = JSONL_FORMAT) -> Iterator[Note]:
+    """Генератор заметок из file (по одной, по мере чтения)."""
+    return DECODERS[format](file)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class ImportProgress:
+    """Состояние импорта из файла: число уже записанных заметок источника
+    и id последней из них (до первого пакета - наибольший id хранилища).
+    Сохраняется (атомарно, через временный файл) перед первым пакетом
+    и после каждого следующего и удаляется по завершении импорта; если
+    источник с тех пор изменился (размер или mtime), состояние
+    не используется.
+    """
+
+    def __init__(self, source_path: pathlib.Path) -> None:
+        self.__path = source_path.with_name(source_path.name + PROGRESS_SUFFIX)
+        stat = source_path.stat()
+        self.__source = [stat.st_size, stat.st_mtime_ns]
+        self.done = 0
+        self.last_id: Optional[int] = None
+
+    def load(self) -> bool:
+        try:
+            with self.__path.open('r', encoding=ENCODING) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            warnings.warn(f"Ошибка: Не удалось прочитать состояние импорта '{self.__path}'.")
+            return False
+        if state.get('source') != self.__source:
+            warnings.warn(f"Предупреждение: Источник импорта изменился,"
+                          f" состояние '{self.__path}' не будет использовано.")
+            return False
+        self.done = state['done']
+        self.last_id = state['last_id']
+        return True
+
+    def save(self):
+        temp_path = self.__path.with_name(self.__path.name + '.tmp')
+        with temp_path.open('w', encoding=ENCODING) as file:
+            json.dump({'source': self.__source, 'done': self.done,
+                       'last_id': self.last_id}, file)
+        os.replace(temp_path, self.__path)
+
+    def remove(self):
+        self.__path.unlink(missing_ok=True)
+
+
+def import_notes(repo: NotesRepository, notes: Iterable[Note],
+                 batch_size: int = IMPORT_BATCH_SIZE,
+                 progress: Optional[ImportProgress] = None) -> int:
+    """Добавляет заметки в репозиторий пакетами по batch_size (память
+    ограничена одним пакетом). Возвращает число добавленных заметок.\n
+    progress - состояние для возобновления: уже записанные заметки
+    источника пропускаются. Пакет, записанный перед самым прерыванием
+    (когда состояние ещё не сохранено), распознаётся по совпадению
+    заметок, следующих в хранилище за last_id, и повторно не добавляется;
+    перед первым пакетом last_id - наибольший id хранилища.
+    """
+    if batch_size < 1:
+        raise ValueError(batch_size)
+
+    notes = iter(notes)
+    if progress is not None:
+        if progress.last_id is None:
+            # id, с которых начнётся первый пакет, фиксируются до его записи
+            progress.last_id = max((note.id for note in repo.get_all_notes()),
+                                   default=NotesRepository.NOTES_MIN_ID - 1)
+            progress.save()
+        for _ in itertools.islice(notes, progress.done):
+            pass
+        notes = skip_already_added(repo, notes, progress)
+
+    count = 0
+    for batch in batched(notes, batch_size):
+        results = repo.add_many(batch)
+        added = [note for note in results if note is not None]
+        count += len(added)
+        if len(added) < len(batch):
+            warnings.warn(
+                f"Ошибка: Не удалось добавить заметок: {len(batch) - len(added)}.")
+        if progress is not None:
+            progress.done += len(batch)
+            if added:
+                progress.last_id = added[-1].id
+            progress.save()
+
+    if progress is not None:
+        progress.remove()
+    return count
+
+
+def skip_already_added(repo: NotesRepository, notes: Iterator[Note],
+                       progress: ImportProgress) -> Iterator[Note]:
+    """Пропускает заметки источника, совпадающие с заметками хранилища
+    с id, следующими за progress.last_id (пакет, записанный до сбоя)."""
+    if progress.last_id is None:
+        return notes
+
+    next_id = progress.last_id + 1
+    for note in notes:
+        stored = repo.get_note_by_id(next_id)
+        if stored is None or (stored.title, stored.creation_date, stored.last_change_date) \
+                != (note.title, note.creation_date, note.last_change_date):
+            return itertools.chain((note,), notes)
+        progress.done += 1
+        progress.last_id = next_id
+        next_id += 1
+    return notes
@@ -1,13 +1,38 @@
+import sys
+
 import settings
-from client import controller
+from domain import metrics
 from domain.repository import NotesRepository
 
 
+def setup_metrics():
+    options = settings.get_metrics_options()
+    options.update(metrics.options_from_environment())
+    metrics.configure(**options)
+
+
+def make_repository() -> NotesRepository:
+    return NotesRepository(settings.get_data_path(),
+                           settings.get_storage_engine(),
+                           **settings.get_engine_options())
+
+
 def run_app():
-    data_path = settings.get_data_path()
-    notes_repo = NotesRepository(data_path)
-    controller.run_lifecycle(notes_repo)
+    from client import controller
+    notes_repo = make_repository()
+    try:
+        controller.run_lifecycle(notes_repo)
+    finally:
+        notes_repo.close()
+
+
+def run_cli(argv: list[str]) -> int:
+    from client import cli
+    return cli.run(argv, make_repository)
 
 
 if __name__ == '__main__':
+    setup_metrics()
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     run_app()
@@ -14,7 +14,19 @@ WARN_CANNOT_SAVE = ("Ошибка:"
                     "Возможно доступ к файлу заблокирован.")
 
 __settings = {
-    "data_path": ".data.d"
+    "data_path": ".data.d",
+    # "files" - файл JSON на каждую заметку, "log" - журнал только на добавление,
+    # "sqlite" - база данных SQLite
+    "storage_engine": "files",
+    # дополнительные параметры механизма хранения, например
+    # {"scan_workers": 8} - параллельное чтение файлов заметок ("files"),
+    # {"scan_processes": 16} - декодирование файлов пулом процессов
+    # при построении каталога ("files")
+    "engine_options": {},
+    # сбор метрик операций хранилища (см. domain.metrics; переменная
+    # окружения NOTES_METRICS имеет приоритет): файл, в который метрики
+    # сохраняются каждые flush_interval_s секунд (null - не сохранять)
+    "metrics": {"enabled": False, "file": None, "flush_interval_s": 10}
 }
 
 
@@ -24,6 +36,18 @@ def get_data_path():
     return __settings["data_path"]
 
 
+def get_storage_engine():
+    return __settings["storage_engine"]
+
+
+def get_engine_options() -> dict:
+    return dict(__settings["engine_options"])
+
+
+def get_metrics_options() -> dict:
+    return dict(__settings["metrics"])
+
+
 def save() -> bool:
     "Сохраняет настройки в файл. Возвращает False, если не удалось сохранить."
     try: